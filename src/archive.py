@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Archive des réponses brutes des sites (--archive) et relecture sans réseau (--reparse).
+
+Chaque réponse reçue pendant un run archivé est gardée avec son site, son URL, son
+statut et sa date: le corps est compressé (zstd si le module zstandard est installé,
+gzip sinon) dans un blob adressé par son empreinte SHA-1 (une page identique d'un run à
+l'autre n'est stockée qu'une fois), l'index est une base SQLite (data/archive/index.sqlite3).
+
+--reparse <run> rejoue un run archivé: les scrapers tournent normalement, mais chaque
+requête reçoit la réponse archivée de la même URL (transport.py) au lieu d'aller sur le
+réseau. Corriger un sélecteur ne coûte alors que le temps CPU d'une relecture. Le cache
+du run (index des URLs, cache négatif, catalogue) est archivé avec lui au début du run:
+la relecture part du même état et fait les mêmes requêtes.
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+from transport import Recorded
+
+
+DEFAULT_ARCHIVE_DIR = Path(__file__).parents[1] / "data" / "archive"
+
+# Site d'une réponse d'après l'hôte de l'URL
+ARCHIVE_SITE_HOSTS = {
+    'medi-market.be': 'medi_market',
+    'pharmacy-medi-market.be': 'medi_market',
+    'farmaline.be': 'farmaline',
+    'newpharma.be': 'newpharma',
+    'multipharma.be': 'multipharma',
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at REAL NOT NULL,
+    command TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS responses (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    site TEXT NOT NULL,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    final_url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    blob TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    elapsed REAL NOT NULL,
+    fetched_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_responses_url ON responses(run_id, method, url);
+CREATE TABLE IF NOT EXISTS cache_snapshots (
+    run_id INTEGER PRIMARY KEY REFERENCES runs(run_id),
+    blob TEXT NOT NULL
+);
+"""
+
+
+def site_of(url: str) -> str:
+    host = urlsplit(url).hostname or ''
+    host = host[4:] if host.startswith('www.') else host
+    return ARCHIVE_SITE_HOSTS.get(host, host)
+
+
+def body_codec():
+    """(extension, compresser, décompresseurs par extension): zstd si disponible."""
+    decoders = {'.gz': gzip.decompress}
+    try:
+        import zstandard
+        decoders['.zst'] = lambda data: zstandard.ZstdDecompressor().decompress(data)
+        return '.zst', lambda data: zstandard.ZstdCompressor(level=10).compress(data), decoders
+    except ImportError:
+        return '.gz', lambda data: gzip.compress(data, compresslevel=6), decoders
+
+
+class ResponseArchive:
+    """
+    Archive des réponses (blobs compressés + index). Ouverte en enregistrement par
+    start_run(), en relecture d'un run par open_run(). Partagée entre threads; une
+    connexion SQLite par processus (workers --workers).
+    """
+
+    def __init__(self, root=DEFAULT_ARCHIVE_DIR):
+        self.root = Path(root).expanduser()
+        self.blobs = self.root / "blobs"
+        self.blobs.mkdir(parents=True, exist_ok=True)
+        self.run_id: Optional[int] = None
+        self.replaying = False
+        self.recorded = 0
+        self.stored_bytes = 0
+        self.replayed = 0
+        self.missed = 0
+        self.latency = 0.0    # facteur des durées enregistrées réimposées en relecture
+        self.waited = 0.0
+        self._extension, self._compress, self._decoders = body_codec()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._db = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(str(self.root / "index.sqlite3"), timeout=60, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._pid = os.getpid()
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+        self._db = self._pid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # -- runs -----------------------------------------------------------------
+
+    def start_run(self, command: str = '') -> int:
+        """Nouveau run archivé: les réponses enregistrées lui sont rattachées."""
+        with self._lock, self.conn:
+            self.run_id = self.conn.execute(
+                "INSERT INTO runs (started_at, command) VALUES (?, ?)", (time.time(), command)
+            ).lastrowid
+        self.replaying = False
+        return self.run_id
+
+    def open_run(self, run_id: int) -> Dict[str, object]:
+        """Relecture d'un run archivé. KeyError si le run n'existe pas."""
+        row = self.conn.execute("SELECT started_at, command FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            raise KeyError(run_id)
+        self.run_id = run_id
+        self.replaying = True
+        return {'run_id': run_id, 'started_at': row[0], 'command': row[1], 'sites': self.site_counts(run_id)}
+
+    def runs(self, limit: int = 10) -> List[Tuple[int, float, str, int]]:
+        """Derniers runs archivés: (run, début, commande, nombre de réponses)."""
+        return self.conn.execute(
+            """SELECT r.run_id, r.started_at, r.command, COUNT(x.run_id) FROM runs r
+               LEFT JOIN responses x ON x.run_id = r.run_id
+               GROUP BY r.run_id ORDER BY r.run_id DESC LIMIT ?""",
+            (limit,)
+        ).fetchall()
+
+    def store_cache(self, data: bytes) -> None:
+        """Copie du cache (cache.snapshot()) au début du run enregistré."""
+        blob = self._write_blob(data)
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO cache_snapshots (run_id, blob) VALUES (?, ?)", (self.run_id, blob)
+            )
+
+    def cache_snapshot(self) -> Optional[bytes]:
+        """Copie du cache du run relu, None si le run a été enregistré sans cache."""
+        row = self.conn.execute("SELECT blob FROM cache_snapshots WHERE run_id = ?", (self.run_id,)).fetchone()
+        return None if row is None else self._read_blob(row[0])
+
+    def site_counts(self, run_id: int) -> Dict[str, int]:
+        return dict(self.conn.execute(
+            "SELECT site, COUNT(*) FROM responses WHERE run_id = ? GROUP BY site", (run_id,)
+        ).fetchall())
+
+    # -- blobs ----------------------------------------------------------------
+
+    def _blob_path(self, name: str) -> Path:
+        return self.blobs / name[:2] / name
+
+    def _write_blob(self, body: bytes) -> str:
+        digest = hashlib.sha1(body).hexdigest()
+        for extension in self._decoders:
+            if self._blob_path(digest + extension).exists():
+                return digest + extension
+        name = digest + self._extension
+        path = self._blob_path(name)
+        path.parent.mkdir(exist_ok=True)
+        data = self._compress(body)
+        tmp = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+        self.stored_bytes += len(data)
+        return name
+
+    def _read_blob(self, name: str) -> bytes:
+        return self._decoders[Path(name).suffix](self._blob_path(name).read_bytes())
+
+    # -- store du transport (transport.py) ---------------------------------------
+
+    def record(self, method: str, url: str, response: Recorded) -> None:
+        if self.run_id is None or self.replaying:
+            return
+        blob = self._write_blob(response.body)
+        with self._lock, self.conn:
+            self.conn.execute(
+                """INSERT INTO responses (run_id, site, method, url, final_url, status, headers, blob, size,
+                                          elapsed, fetched_at) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                (self.run_id, site_of(url), method, url, response.url, response.status,
+                 json.dumps(response.headers), blob, len(response.body), response.elapsed, time.time())
+            )
+            self.recorded += 1
+
+    def replay(self, method: str, url: str) -> Optional[Recorded]:
+        """Dernière réponse archivée du run pour (méthode, URL), None si absente."""
+        with self._lock:
+            row = self.conn.execute(
+                """SELECT final_url, status, headers, blob, elapsed FROM responses
+                   WHERE run_id = ? AND method = ? AND url = ? ORDER BY rowid DESC LIMIT 1""",
+                (self.run_id, method, url)
+            ).fetchone()
+            if row is None:
+                self.missed += 1
+                return None
+            self.replayed += 1
+            self.waited += row[4] * self.latency
+        final_url, status, headers, blob, elapsed = row
+        return Recorded(status, final_url, json.loads(headers), self._read_blob(blob), elapsed)
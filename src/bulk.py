@@ -0,0 +1,237 @@
+#!/usr/bin/env python3
+"""
+Mode --bulk: récolte des listings par marque au lieu d'une recherche par produit.
+
+Les grids sont très groupés par marque (data/input/grid.csv est presque entièrement
+Caudalie). Pour NewPharma et Multipharma, les lignes sont regroupées par marque
+détectée; les pages de résultats de chaque marque sont récupérées une fois (pagination
+suivie) pour construire un catalogue local (nom, prix, URL), puis tous les produits de
+la marque sont matchés hors ligne contre ce catalogue en une seule passe (matrice de
+scores rapidfuzz). Le nombre de requêtes dépend du nombre de marques et de pages, plus
+du nombre de produits.
+"""
+
+import re
+import time
+from difflib import SequenceMatcher
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Set, Tuple
+from urllib.parse import quote_plus, urljoin
+
+from bs4 import BeautifulSoup
+
+import extract
+
+
+# Nombre minimal de produits d'une marque pour récolter son listing (en dessous:
+# recherche produit par produit)
+BULK_MIN_GROUP = 3
+
+# Score minimal d'un match catalogue; en dessous, le produit est recherché individuellement
+BULK_MIN_SCORE = 85
+
+# Écart minimal avec le second candidat (comme catalog.CATALOG_MIN_MARGIN): deux formats
+# d'un même produit ne se départagent pas au score
+BULK_MIN_MARGIN = 3
+
+# Pages de listing récupérées au plus par marque et par site
+BULK_MAX_PAGES = 20
+
+# Produits par page de la grille Multipharma
+MULTIPHARMA_PAGE_SIZE = 48
+
+# Marques de plusieurs mots (sinon la marque est le premier mot du nom)
+MULTI_WORD_BRANDS = (
+    'la roche-posay', 'la roche posay', 'eau thermale avene', 'louis widmer', 'dr hauschka',
+    'nuxe bio', 'rene furterer', 'a-derma', 'ducray', 'pranarom', 'dr. theiss',
+)
+
+_WORD = re.compile(r"[\w'-]+", re.UNICODE)
+_NEXT_TAG = re.compile(rb'<(?:link|a)\b[^>]*\brel=["\']next["\'][^>]*>', re.IGNORECASE)
+_HREF = re.compile(rb'href=["\']([^"\']+)["\']')
+_PRICE = re.compile(r"(\d+\.?\d*)")
+_QUANTITY = re.compile(r"(\d+(?:[.,]\d+)?)\s*(ml|cl|l|g|gr|mg|kg)\b", re.IGNORECASE)
+
+
+class Candidate(NamedTuple):
+    name: str
+    price: float
+    url: str
+
+
+def quantities(name: str) -> Set[str]:
+    """Contenances d'un nom, normalisées ('30 ml' -> '30ml', '1,5 l' -> '1.5l')."""
+    return {f"{amount.replace(',', '.')}{unit.lower()}" for amount, unit in _QUANTITY.findall(name)}
+
+
+def detect_brand(name: str) -> Optional[str]:
+    """Marque d'un nom produit (minuscules), None si aucun mot exploitable."""
+    lowered = ' '.join(name.lower().split())
+    for brand in MULTI_WORD_BRANDS:
+        if lowered.startswith(brand + ' ') or lowered == brand:
+            return brand
+    words = _WORD.findall(lowered)
+    if not words or len(words[0]) < 3 or words[0].isdigit():
+        return None
+    return words[0]
+
+
+def group_by_brand(cnk_list: Iterable[str], product_names: Dict[str, str],
+                   min_group: int = BULK_MIN_GROUP) -> Tuple[Dict[str, List[str]], List[str]]:
+    """
+    Regroupe les CNK par marque détectée.
+
+    Returns:
+        ({marque: [cnk]} pour les marques d'au moins `min_group` produits, CNK restants)
+    """
+    groups: Dict[str, List[str]] = {}
+    rest = []
+    for cnk in cnk_list:
+        brand = detect_brand(product_names.get(cnk) or '')
+        if brand:
+            groups.setdefault(brand, []).append(cnk)
+        else:
+            rest.append(cnk)
+    for brand in [brand for brand, cnks in groups.items() if len(cnks) < min_group]:
+        rest.extend(groups.pop(brand))
+    return groups, rest
+
+
+def _parse_price(text) -> Optional[float]:
+    match = _PRICE.search(str(text).replace('€', '').replace(',', '.'))
+    return float(match.group(1)) if match else None
+
+
+# -- récolte des listings ------------------------------------------------------
+
+def _next_page(body: bytes, base_url: str) -> Optional[str]:
+    tag = _NEXT_TAG.search(body)
+    href = _HREF.search(tag.group(0)) if tag else None
+    if not href:
+        return None
+    return urljoin(base_url, href.group(1).decode('utf-8', 'replace').replace('&amp;', '&'))
+
+
+def harvest_newpharma(session, brand: str, pause: Callable[[], float] = lambda: 0.0,
+                      max_pages: int = BULK_MAX_PAGES,
+                      headers: Optional[Dict[str, str]] = None) -> Tuple[List[Candidate], int]:
+    """
+    Catalogue NewPharma d'une marque: résultats de recherche de la marque, page suivante
+    (rel="next") suivie jusqu'à `max_pages`.
+
+    Returns:
+        (candidats, pages récupérées)
+    """
+    base = "https://www.newpharma.be/"
+    url = f"{base}fr/search-results/search.html?q={quote_plus(brand)}"
+    candidates: Dict[str, Candidate] = {}
+    pages = 0
+    while url and pages < max_pages:
+        time.sleep(pause())
+        resp = session.get(url, headers=headers, timeout=30)
+        pages += 1
+        if resp.status_code != 200:
+            break
+        body = resp.content
+        blocks = extract.extract(
+            'newpharma', body,
+            [('google-360', extract.google_360_blocks)],
+            lambda soup: [],
+        )
+        for items, href in blocks:
+            for name, price in items:
+                price = _parse_price(price)
+                if price is not None:
+                    candidates.setdefault(name, Candidate(name, price, urljoin(base, href) if href else ''))
+        url = _next_page(body, url)
+    return list(candidates.values()), pages
+
+
+def _multipharma_tile(tile, base_url: str) -> Optional[Candidate]:
+    name_elem = tile.select_one("div.pdp-link") or tile.select_one("a.product-tile-title")
+    price_elem = (tile.select_one("span.sales") or tile.select_one("div.sales")
+                  or tile.select_one("div.price span.value") or tile.select_one("span[class*='price']"))
+    if not name_elem or not price_elem:
+        return None
+    price = _parse_price(price_elem.get_text(strip=True))
+    if price is None:
+        return None
+    link = tile.select_one("a[href]")
+    return Candidate(name_elem.get_text(strip=True), price, urljoin(base_url, link["href"]) if link else '')
+
+
+def harvest_multipharma(session, brand: str, pause: Callable[[], float] = lambda: 0.0,
+                        max_pages: int = BULK_MAX_PAGES, headers: Optional[Dict[str, str]] = None,
+                        page_size: int = MULTIPHARMA_PAGE_SIZE) -> Tuple[List[Candidate], int]:
+    """
+    Catalogue Multipharma d'une marque: fragments Search-UpdateGrid de `page_size`
+    produits, jusqu'à une page incomplète ou `max_pages`.
+
+    Returns:
+        (candidats, pages récupérées)
+    """
+    base = "https://www.multipharma.be"
+    grid_url = (f"{base}/on/demandware.store/Sites-Multipharma-Webshop-BE-Site/fr_BE/Search-UpdateGrid"
+                f"?q={quote_plus(brand)}&sz={page_size}&start=")
+    candidates: Dict[str, Candidate] = {}
+    pages = 0
+    while pages < max_pages:
+        time.sleep(pause())
+        resp = session.get(f"{grid_url}{pages * page_size}", headers=headers, timeout=30)
+        pages += 1
+        if resp.status_code != 200:
+            break
+        tiles = BeautifulSoup(resp.content, "lxml").select("div.product-tile")
+        extract.STATS.record('multipharma', 'dom' if tiles else 'aucun')
+        for tile in tiles:
+            candidate = _multipharma_tile(tile, base)
+            if candidate:
+                candidates.setdefault(candidate.name, candidate)
+        if len(tiles) < page_size:
+            break
+    return list(candidates.values()), pages
+
+
+# -- matching hors ligne ---------------------------------------------------------
+
+def _score_matrix(queries: List[str], choices: List[str]):
+    """Matrice de scores (0-100) requêtes × candidats, rapidfuzz si disponible."""
+    try:
+        from rapidfuzz import fuzz, process
+        return process.cdist(queries, choices, scorer=fuzz.ratio, workers=-1)
+    except ImportError:
+        return [[SequenceMatcher(None, q, c).ratio() * 100 for c in choices] for q in queries]
+
+
+def match_catalog(catalog: List[Candidate], queries: Dict[str, List[Tuple[str, str]]],
+                  min_score: float = BULK_MIN_SCORE) -> Dict[str, Tuple[float, float, str, Candidate]]:
+    """
+    Matche les produits d'une marque contre son catalogue en une passe.
+
+    Args:
+        catalog: Candidats récoltés pour la marque
+        queries: CNK -> [(nom recherché, source)] (nom du grid, nom Medi-Market...)
+
+    Returns:
+        CNK -> (prix, score, source du meilleur nom, candidat) pour les matchs >= min_score
+    """
+    rows = [(cnk, name, source) for cnk, names in queries.items() for name, source in names if name]
+    if not catalog or not rows:
+        return {}
+    scores = _score_matrix([name.lower() for _, name, _ in rows], [c.name.lower() for c in catalog])
+
+    matches: Dict[str, Tuple[float, float, str, Candidate]] = {}
+    for k, (cnk, name, source) in enumerate(rows):
+        row = list(scores[k])
+        ranked = sorted(range(len(row)), key=row.__getitem__, reverse=True)
+        best = ranked[0]
+        score = float(row[best])
+        runner_up = next((float(row[j]) for j in ranked[1:] if catalog[j].url != catalog[best].url), 0.0)
+        if score < min_score or (score < 100 and score - runner_up < BULK_MIN_MARGIN):
+            continue
+        # Seul l'autre format est listé (30ml / 50ml): pas de prix, recherche individuelle
+        wanted, offered = quantities(name), quantities(catalog[best].name)
+        if wanted and offered and wanted != offered:
+            continue
+        if cnk not in matches or score > matches[cnk][1]:
+            matches[cnk] = (catalog[best].price, score, source, catalog[best])
+    return matches
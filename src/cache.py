@@ -0,0 +1,525 @@
+#!/usr/bin/env python3
+"""
+Cache persistant des recherches LP_Pharma (SQLite, data/cache.sqlite3).
+
+Cache négatif: une bonne partie des CNK d'un grid n'est simplement pas vendue sur un
+site donné, et ces absences sont les recherches les plus coûteuses (Medi-Market essaie
+deux boutiques, Farmaline jusqu'à 8 URLs de catégories avec délais). Une absence
+prouvée (réponse du site sans le produit, jamais une erreur réseau ni un blocage) est
+mémorisée avec le nombre de recherches qui l'ont prouvée; le CNK n'est plus cherché sur
+ce site jusqu'à expiration de l'entrée. La durée de validité grandit avec le nombre de
+preuves.
+
+Index des URLs produit: la page produit canonique trouvée pour un (site, CNK) est
+mémorisée. Les runs suivants la lisent directement (une requête légère, sans recherche
+floue) et ne repassent par la recherche que si la page a disparu ou ne correspond plus.
+Pour Farmaline et Medi-Market, l'index peut aussi être rempli d'un coup depuis les
+sitemaps des sites (sous-commande sync, voir sitemap.py).
+
+Catégories Farmaline: la liste des catégories (page d'accueil) est gardée quelques
+jours, et le taux de succès de chaque catégorie est appris globalement et par préfixe
+CNK pour tester d'abord la catégorie la plus probable.
+
+Catalogue local (NewPharma, Multipharma): tous les produits vus (nom, tokens, CNK si
+connu, URL, dernier prix), matchés hors ligne avant toute recherche (voir catalog.py).
+
+Un run enregistré (--archive, --record) garde une copie du cache prise à son début
+(snapshot()); sa relecture travaille sur cette copie, horloge des expirations ramenée à
+la date d'enregistrement (CLOCK), et fait donc les mêmes requêtes que le run d'origine.
+"""
+
+import sqlite3
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+
+DEFAULT_CACHE_PATH = Path(__file__).parents[1] / "data" / "cache.sqlite3"
+
+# Durée de validité de base d'une absence (secondes), multipliée par le nombre de
+# confirmations, plafonné à NEGATIVE_TTL_MAX_FACTOR
+DEFAULT_NEGATIVE_TTL = 24 * 3600
+NEGATIVE_TTL_MAX_FACTOR = 4
+
+# Sites à recherche par CNK: une absence ne dépend pas du nom cherché
+NEGATIVE_CACHE_SITES = ('medi_market', 'farmaline')
+
+# Sites dont les pages produit sont indexées (Medi-Market: uniquement les pages
+# importées des sitemaps, la recherche par CNK étant déjà une requête par boutique)
+URL_INDEX_SITES = ('farmaline', 'newpharma', 'multipharma', 'medi_market')
+
+# Score de match minimal pour indexer l'URL d'un résultat de recherche par nom, et
+# similarité minimale entre le nom indexé et le nom de la page lue directement
+URL_INDEX_MIN_SCORE = 90
+
+# Catégories (Farmaline): validité de la liste, durée de vie des statistiques apprises,
+# longueur du préfixe CNK et poids du taux global dans le taux d'un préfixe
+CATEGORY_LIST_TTL = 7 * 24 * 3600
+CATEGORY_STATS_TTL = 90 * 24 * 3600
+CATEGORY_PREFIX_LENGTH = 3
+CATEGORY_PRIOR = 2.0
+
+# Catalogue local (sites à recherche par nom): un produit non revu depuis cette durée
+# est oublié
+CATALOG_TTL = 180 * 24 * 3600
+
+# Taille des lots pour les requêtes IN (limite de paramètres SQLite)
+_IN_BATCH = 500
+
+# Taille des lots d'écriture d'une synchronisation de sitemap
+_SYNC_BATCH = 2000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS negative (
+    site TEXT NOT NULL,
+    cnk TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    first_miss REAL NOT NULL,
+    last_miss REAL NOT NULL,
+    expires REAL NOT NULL,
+    PRIMARY KEY (site, cnk)
+);
+CREATE TABLE IF NOT EXISTS product_urls (
+    site TEXT NOT NULL,
+    cnk TEXT NOT NULL,
+    url TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    verified_at REAL NOT NULL,
+    PRIMARY KEY (site, cnk)
+);
+CREATE TABLE IF NOT EXISTS catalog (
+    site TEXT NOT NULL,
+    url TEXT NOT NULL,
+    name TEXT NOT NULL,
+    tokens TEXT NOT NULL,
+    cnk TEXT,
+    price REAL,
+    seen_at REAL NOT NULL,
+    PRIMARY KEY (site, url)
+);
+CREATE INDEX IF NOT EXISTS idx_catalog_cnk ON catalog(site, cnk);
+CREATE TABLE IF NOT EXISTS site_categories (
+    site TEXT NOT NULL,
+    category TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    fetched_at REAL NOT NULL,
+    PRIMARY KEY (site, category)
+);
+CREATE TABLE IF NOT EXISTS category_stats (
+    site TEXT NOT NULL,
+    prefix TEXT NOT NULL,
+    category TEXT NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    misses INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL,
+    PRIMARY KEY (site, prefix, category)
+);
+"""
+
+
+def _connect(path) -> sqlite3.Connection:
+    path = Path(path).expanduser()
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=60)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    return conn
+
+
+def _select_in(conn, query: str, params: list, values: List[str]):
+    """Exécute `query` (se terminant par IN ({})) par lots de valeurs."""
+    for start in range(0, len(values), _IN_BATCH):
+        batch = values[start:start + _IN_BATCH]
+        yield from conn.execute(query.format(",".join("?" * len(batch))), params + batch)
+
+
+# Décalage (secondes) de l'horloge des expirations: en relecture d'un run enregistré,
+# la copie du cache vieillit depuis la date d'enregistrement
+CLOCK = {
+    'offset': 0.0,
+}
+
+
+def clock() -> float:
+    """Horloge des dates et expirations du cache (time.time() moins CLOCK['offset'])."""
+    return time.time() - CLOCK['offset']
+
+
+def snapshot(path=DEFAULT_CACHE_PATH) -> bytes:
+    """
+    Copie cohérente du fichier cache (API backup de SQLite, journal WAL inclus),
+    b'' si le cache n'existe pas encore.
+    """
+    path = Path(path).expanduser()
+    if not path.exists():
+        return b''
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = Path(tmp) / path.name
+        source = sqlite3.connect(str(path), timeout=60)
+        target = sqlite3.connect(str(copy))
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+        return copy.read_bytes()
+
+
+class NegativeCache:
+    """Absences (site, CNK) confirmées, avec expiration."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl: float = DEFAULT_NEGATIVE_TTL):
+        self.path = Path(path).expanduser()
+        self.ttl = ttl
+        self.conn = _connect(self.path)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def absent(self, site: str, cnks: Iterable[str]) -> Set[str]:
+        """CNK connus comme absents du site (entrée non expirée)."""
+        return {row[0] for row in _select_in(
+            self.conn, "SELECT cnk FROM negative WHERE site = ? AND expires > ? AND cnk IN ({})",
+            [site, clock()], list(cnks)
+        )}
+
+    def record(self, site: str, missing: Iterable[str], found: Iterable[str] = ()) -> None:
+        """
+        Enregistre le résultat d'une recherche: `missing` non trouvés (confirmation +1),
+        `found` trouvés (entrée supprimée).
+        """
+        now = clock()
+        with self.conn:
+            self.conn.executemany(
+                f"""INSERT INTO negative (site, cnk, attempts, first_miss, last_miss, expires)
+                    VALUES (?, ?, 1, ?, ?, ?)
+                    ON CONFLICT(site, cnk) DO UPDATE SET
+                        attempts = attempts + 1, last_miss = excluded.last_miss,
+                        expires = excluded.last_miss + ? * MIN(attempts + 1, {NEGATIVE_TTL_MAX_FACTOR})""",
+                [(site, cnk, now, now, now + self.ttl, self.ttl) for cnk in missing]
+            )
+            self.conn.executemany(
+                "DELETE FROM negative WHERE site = ? AND cnk = ?",
+                [(site, cnk) for cnk in found]
+            )
+
+    def stats(self) -> Dict[str, int]:
+        """Nombre d'absences actives par site."""
+        return dict(self.conn.execute(
+            "SELECT site, COUNT(*) FROM negative WHERE expires > ? GROUP BY site", (clock(),)
+        ).fetchall())
+
+    def clear(self, sites: List[str] = None) -> None:
+        with self.conn:
+            if sites:
+                self.conn.executemany("DELETE FROM negative WHERE site = ?", [(site,) for site in sites])
+            else:
+                self.conn.execute("DELETE FROM negative")
+
+
+class ProductUrls:
+    """
+    URLs produit connues d'un site pour un run (chargées avant le scraping), et
+    résolutions / invalidations constatées pendant le run. Partagé entre les threads
+    d'un scraper.
+    """
+
+    def __init__(self, site: str, known: Optional[Dict[str, Tuple[str, str]]] = None):
+        self.site = site
+        self.known = dict(known or {})          # cnk -> (url, nom)
+        self.resolved: Dict[str, Tuple[str, str]] = {}
+        self.stale: Set[str] = set()
+        self.gone: Set[str] = set()               # URLs disparues (404)
+        self.suggested: Set[str] = set()          # CNK dont l'URL vient du catalogue local
+        self.observed: Dict[str, Tuple[str, Optional[float]]] = {}  # url -> (nom, prix)
+        self.direct_hits = 0
+        self._lock = threading.Lock()
+
+    def get(self, cnk: str) -> Optional[Tuple[str, str]]:
+        """(url, nom indexé) de la page produit du CNK, None si inconnue ou périmée."""
+        if cnk in self.stale:
+            return None
+        return self.known.get(cnk)
+
+    def hit(self, cnk: str) -> None:
+        """Page produit lue directement et toujours valide."""
+        with self._lock:
+            self.direct_hits += 1
+            self.resolved[cnk] = self.known[cnk]
+
+    def resolve(self, cnk: str, url: str, name: str = '') -> None:
+        """Page produit trouvée par la recherche."""
+        with self._lock:
+            self.resolved[cnk] = (url, name or '')
+
+    def invalidate(self, cnk: str, gone: bool = False) -> None:
+        """Page produit disparue (404, `gone`) ou ne correspondant plus au produit."""
+        with self._lock:
+            if cnk in self.known:
+                self.stale.add(cnk)
+                if gone:
+                    self.gone.add(self.known[cnk][0])
+            self.resolved.pop(cnk, None)
+
+    def suggest(self, cnk: str, url: str, name: str) -> None:
+        """Page produit d'un CNK déduite du catalogue local (lue comme une page connue)."""
+        with self._lock:
+            self.known[cnk] = (url, name)
+            self.suggested.add(cnk)
+
+    def observe(self, name: str, url: str, price=None) -> None:
+        """Produit vu sur le site (résultat de recherche, listing), pour le catalogue local."""
+        if not name or not url:
+            return
+        try:
+            price = float(price) if price is not None else None
+        except (TypeError, ValueError):
+            price = None
+        with self._lock:
+            self.observed[url] = (name, price)
+
+
+class UrlIndex:
+    """Index persistant (site, CNK) -> URL de la page produit."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path).expanduser()
+        self.conn = _connect(self.path)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load(self, site: str, cnks: Iterable[str]) -> ProductUrls:
+        return ProductUrls(site, {
+            cnk: (url, name) for cnk, url, name in _select_in(
+                self.conn, "SELECT cnk, url, name FROM product_urls WHERE site = ? AND cnk IN ({})",
+                [site], list(cnks)
+            )
+        })
+
+    def save(self, urls: ProductUrls) -> None:
+        """Enregistre les URLs résolues et supprime les URLs périmées non remplacées."""
+        now = clock()
+        with self.conn:
+            self.conn.executemany(
+                """INSERT INTO product_urls (site, cnk, url, name, verified_at) VALUES (?, ?, ?, ?, ?)
+                   ON CONFLICT(site, cnk) DO UPDATE SET
+                       url = excluded.url, name = excluded.name, verified_at = excluded.verified_at""",
+                [(urls.site, cnk, url, name, now) for cnk, (url, name) in urls.resolved.items()]
+            )
+            self.conn.executemany(
+                "DELETE FROM product_urls WHERE site = ? AND cnk = ?",
+                [(urls.site, cnk) for cnk in urls.stale if cnk not in urls.resolved]
+            )
+
+    def sync(self, site: str, pairs: Iterable[Tuple[str, str]], batch: int = _SYNC_BATCH) -> Tuple[int, int]:
+        """
+        Importe des paires (CNK, URL) lues en flux (sitemap), par lots. Une URL inchangée
+        garde son nom et sa date de vérification; une URL différente les remet à zéro.
+
+        Returns:
+            (paires lues, entrées ajoutées ou modifiées)
+        """
+        query = """INSERT INTO product_urls (site, cnk, url, name, verified_at) VALUES (?, ?, ?, '', ?)
+                   ON CONFLICT(site, cnk) DO UPDATE SET
+                       url = excluded.url, name = '', verified_at = excluded.verified_at
+                   WHERE url != excluded.url"""
+        seen = written = 0
+        rows = []
+        for cnk, url in pairs:
+            rows.append((site, cnk, url, clock()))
+            if len(rows) >= batch:
+                written += self._write_batch(query, rows)
+                seen += len(rows)
+                rows = []
+        if rows:
+            written += self._write_batch(query, rows)
+            seen += len(rows)
+        return seen, written
+
+    def _write_batch(self, query: str, rows: list) -> int:
+        with self.conn:
+            before = self.conn.total_changes
+            self.conn.executemany(query, rows)
+            return self.conn.total_changes - before
+
+    def stats(self) -> Dict[str, int]:
+        """Nombre d'URLs indexées par site."""
+        return dict(self.conn.execute("SELECT site, COUNT(*) FROM product_urls GROUP BY site").fetchall())
+
+
+class ProductCatalog:
+    """Catalogue local persistant des produits vus par site (URL -> nom, tokens, CNK, prix)."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path).expanduser()
+        self.conn = _connect(self.path)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def load(self, site: str, ttl: float = CATALOG_TTL) -> List[Tuple[str, str, str, Optional[str], Optional[float]]]:
+        """
+        Produits (url, nom, tokens normalisés, cnk, prix) du site vus depuis moins de
+        `ttl` secondes (tokens déjà calculés à l'enregistrement: pas de re-normalisation).
+        """
+        return self.conn.execute(
+            "SELECT url, name, tokens, cnk, price FROM catalog WHERE site = ? AND seen_at > ?",
+            (site, clock() - ttl)
+        ).fetchall()
+
+    def save(self, urls: ProductUrls, tokenize) -> None:
+        """
+        Enregistre les produits vus et les pages résolues d'un run: le CNK d'une page
+        résolue lui est attaché, celui d'une page périmée détaché, une page disparue oubliée.
+
+        Args:
+            tokenize: nom -> tokens normalisés (catalog.tokens)
+        """
+        now = clock()
+        rows = {url: (name, None, price) for url, (name, price) in urls.observed.items()}
+        for cnk, (url, name) in urls.resolved.items():
+            observed_name, _, price = rows.get(url, (name, None, None))
+            rows[url] = (name or observed_name, cnk, price)
+        with self.conn:
+            self.conn.executemany(
+                "UPDATE catalog SET cnk = NULL WHERE site = ? AND cnk = ?",
+                [(urls.site, cnk) for cnk in urls.stale if cnk not in urls.resolved]
+            )
+            self.conn.executemany(
+                "DELETE FROM catalog WHERE site = ? AND url = ?",
+                [(urls.site, url) for url in urls.gone if url not in rows]
+            )
+            self.conn.executemany(
+                """INSERT INTO catalog (site, url, name, tokens, cnk, price, seen_at) VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(site, url) DO UPDATE SET
+                       name = excluded.name, tokens = excluded.tokens, cnk = COALESCE(excluded.cnk, cnk),
+                       price = COALESCE(excluded.price, price), seen_at = excluded.seen_at""",
+                [(urls.site, url, name, ' '.join(tokenize(name)), cnk, price, now)
+                 for url, (name, cnk, price) in rows.items() if name]
+            )
+            self.conn.execute("DELETE FROM catalog WHERE site = ? AND seen_at <= ?", (urls.site, now - CATALOG_TTL))
+
+    def stats(self) -> Dict[str, int]:
+        """Nombre de produits catalogués par site."""
+        return dict(self.conn.execute("SELECT site, COUNT(*) FROM catalog GROUP BY site").fetchall())
+
+
+class CategoryStats:
+    """
+    Succès / échecs des catégories d'un site, globalement (préfixe '') et par préfixe
+    CNK. Le taux d'une catégorie pour un préfixe part du taux global et s'en écarte à
+    mesure que le préfixe accumule des essais.
+    """
+
+    def __init__(self, site: str, counts: Optional[Dict[Tuple[str, str], List[int]]] = None):
+        self.site = site
+        self.counts = {key: list(value) for key, value in (counts or {}).items()}  # (préfixe, cat) -> [hits, misses]
+        self.deltas: Dict[Tuple[str, str], List[int]] = {}
+
+    @staticmethod
+    def prefix(cnk: str) -> str:
+        return cnk[:CATEGORY_PREFIX_LENGTH]
+
+    def rate(self, cnk: str, category: str) -> float:
+        hits, misses = self.counts.get(('', category), (0, 0))
+        global_rate = (hits + 1) / (hits + misses + 2)
+        hits, misses = self.counts.get((self.prefix(cnk), category), (0, 0))
+        return (hits + CATEGORY_PRIOR * global_rate) / (hits + misses + CATEGORY_PRIOR)
+
+    def rank(self, cnk: str, categories: Iterable[str]) -> List[str]:
+        """Catégories par taux de succès décroissant (puis les plus spécifiques d'abord)."""
+        return sorted(categories, key=lambda cat: (-self.rate(cnk, cat), len(cat), cat))
+
+    def learned(self) -> List[str]:
+        """Catégories ayant déjà contenu au moins un produit."""
+        return sorted({cat for (prefix, cat), (hits, _) in self.counts.items() if not prefix and hits})
+
+    def has_prefix(self, cnk: str) -> bool:
+        prefix = self.prefix(cnk)
+        return any(p == prefix for p, _ in self.counts)
+
+    def record(self, cnk: str, category: str, hit: bool) -> None:
+        for prefix in ('', self.prefix(cnk)):
+            for counts in (self.counts, self.deltas):
+                counts.setdefault((prefix, category), [0, 0])[0 if hit else 1] += 1
+
+
+class CategoryIndex:
+    """Liste des catégories et statistiques apprises, persistées par site."""
+
+    def __init__(self, path=DEFAULT_CACHE_PATH):
+        self.path = Path(path).expanduser()
+        self.conn = _connect(self.path)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def categories(self, site: str, ttl: float = CATEGORY_LIST_TTL) -> Optional[List[str]]:
+        """Liste des catégories du site si récupérée depuis moins de `ttl` secondes."""
+        rows = self.conn.execute(
+            "SELECT category FROM site_categories WHERE site = ? AND fetched_at > ? ORDER BY position",
+            (site, clock() - ttl)
+        ).fetchall()
+        return [row[0] for row in rows] or None
+
+    def store_categories(self, site: str, categories: List[str]) -> None:
+        now = clock()
+        with self.conn:
+            self.conn.execute("DELETE FROM site_categories WHERE site = ?", (site,))
+            self.conn.executemany(
+                "INSERT INTO site_categories (site, category, position, fetched_at) VALUES (?, ?, ?, ?)",
+                [(site, cat, position, now) for position, cat in enumerate(categories)]
+            )
+
+    def load_stats(self, site: str) -> CategoryStats:
+        return CategoryStats(site, {
+            (prefix, cat): [hits, misses] for prefix, cat, hits, misses in self.conn.execute(
+                "SELECT prefix, category, hits, misses FROM category_stats WHERE site = ? AND updated_at > ?",
+                (site, clock() - CATEGORY_STATS_TTL)
+            )
+        })
+
+    def save_stats(self, stats: CategoryStats) -> None:
+        """Ajoute les essais du run (incréments: plusieurs processus peuvent écrire)."""
+        now = clock()
+        with self.conn:
+            self.conn.execute(
+                "DELETE FROM category_stats WHERE site = ? AND updated_at <= ?",
+                (stats.site, now - CATEGORY_STATS_TTL)
+            )
+            self.conn.executemany(
+                """INSERT INTO category_stats (site, prefix, category, hits, misses, updated_at)
+                   VALUES (?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(site, prefix, category) DO UPDATE SET
+                       hits = hits + excluded.hits, misses = misses + excluded.misses,
+                       updated_at = excluded.updated_at""",
+                [(stats.site, prefix, cat, hits, misses, now) for (prefix, cat), (hits, misses) in stats.deltas.items()]
+            )
+        stats.deltas.clear()
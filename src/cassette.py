@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+Cassette HTTP d'un run complet (--record / --replay), pour comparer les performances
+d'un run à l'autre sur des entrées identiques.
+
+--record <cassette> enregistre dans un seul fichier SQLite, dans l'ordre, chaque échange
+des scrapers: méthode, URL, rang de la requête parmi celles de même URL, statut,
+en-têtes, corps compressé et durée mesurée (envoi -> fin de lecture du corps).
+
+--replay <cassette> rejoue le run via le transport local (transport.py): la n-ième
+requête d'une URL reçoit la n-ième réponse enregistrée (la dernière au-delà), sans
+réseau. Avec --replay-latency, chaque réponse n'est rendue qu'après sa durée
+enregistrée: le run rejoué a le profil de latence du run d'origine, et un changement
+de concurrence ou d'analyse se mesure sur les mêmes réponses et les mêmes attentes.
+
+La cassette garde aussi une copie du cache prise au début de l'enregistrement: la
+relecture part du même état (pages produit connues, absences, catalogue) et fait la
+même suite de requêtes, quel que soit l'état du cache réel entre-temps.
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Optional, Tuple
+
+from archive import body_codec, site_of
+from transport import Recorded
+
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS interactions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    method TEXT NOT NULL,
+    url TEXT NOT NULL,
+    occurrence INTEGER NOT NULL,
+    site TEXT NOT NULL,
+    final_url TEXT NOT NULL,
+    status INTEGER NOT NULL,
+    headers TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    elapsed REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_interactions_url ON interactions(method, url, occurrence);
+CREATE TABLE IF NOT EXISTS cache_snapshot (
+    codec TEXT NOT NULL,
+    body BLOB NOT NULL
+);
+"""
+
+
+class Cassette:
+    """
+    Store du transport (transport.py) adossé à un fichier cassette. Ouverte en
+    enregistrement par record_to(), en relecture par open_replay(). Partagée entre
+    threads; une connexion SQLite par processus (workers --workers).
+    """
+
+    def __init__(self, path):
+        self.path = Path(path).expanduser()
+        self.replaying = False
+        self.latency = 0.0
+        self.recorded = 0
+        self.recorded_seconds = 0.0
+        self.replayed = 0
+        self.repeated = 0
+        self.missed = 0
+        self.waited = 0.0
+        self._codec, self._compress, self._decoders = body_codec()
+        self._occurrences: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._pid = None
+        self._db = None
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._pid != os.getpid():
+            self._db = sqlite3.connect(str(self.path), timeout=60, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(SCHEMA)
+            self._pid = os.getpid()
+            self._occurrences = {}
+        return self._db
+
+    def close(self) -> None:
+        if self._db is not None and self._pid == os.getpid():
+            self._db.close()
+        self._db = self._pid = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def record_to(self, command: str = '') -> None:
+        """Nouvel enregistrement: la cassette existante est vidée."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM interactions")
+            self.conn.execute("DELETE FROM meta")
+            self.conn.execute("DELETE FROM cache_snapshot")
+            self.conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)",
+                                  [('command', command), ('recorded_at', str(time.time()))])
+        self.replaying = False
+
+    def open_replay(self, latency: float = 0.0) -> Dict[str, object]:
+        """
+        Relecture de la cassette (FileNotFoundError si absente).
+
+        Args:
+            latency: facteur des durées enregistrées réimposées (0: réponses immédiates)
+        """
+        if not self.path.exists():
+            raise FileNotFoundError(str(self.path))
+        self.replaying = True
+        self.latency = latency
+        return self.info()
+
+    def info(self) -> Dict[str, object]:
+        """Commande et date d'enregistrement, échanges et durée cumulée par site."""
+        meta = dict(self.conn.execute("SELECT key, value FROM meta").fetchall())
+        sites = {site: (count, seconds) for site, count, seconds in self.conn.execute(
+            "SELECT site, COUNT(*), SUM(elapsed) FROM interactions GROUP BY site"
+        ).fetchall()}
+        return {
+            'command': meta.get('command', ''),
+            'recorded_at': float(meta.get('recorded_at', 0)),
+            'sites': sites,
+        }
+
+    def store_cache(self, data: bytes) -> None:
+        """Copie du cache (cache.snapshot()) au début de l'enregistrement."""
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM cache_snapshot")
+            self.conn.execute("INSERT INTO cache_snapshot (codec, body) VALUES (?, ?)",
+                              (self._codec, self._compress(data)))
+
+    def cache_snapshot(self) -> Optional[bytes]:
+        """Copie du cache enregistrée, None si la cassette a été enregistrée sans cache."""
+        row = self.conn.execute("SELECT codec, body FROM cache_snapshot").fetchone()
+        return None if row is None else self._decoders[row[0]](row[1])
+
+    # -- store du transport (transport.py) ---------------------------------------
+
+    def record(self, method: str, url: str, response: Recorded) -> None:
+        if self.replaying:
+            return
+        body = self._compress(response.body)
+        with self._lock, self.conn:
+            # Rang calculé dans la même transaction (plusieurs processus peuvent écrire)
+            self.conn.execute(
+                """INSERT INTO interactions (method, url, occurrence, site, final_url, status, headers,
+                                             codec, body, size, elapsed)
+                   SELECT ?, ?, COUNT(*), ?, ?, ?, ?, ?, ?, ?, ? FROM interactions
+                   WHERE method = ? AND url = ?""",
+                (method, url, site_of(url), response.url, response.status, json.dumps(response.headers),
+                 self._codec, body, len(response.body), response.elapsed, method, url)
+            )
+            self.recorded += 1
+            self.recorded_seconds += response.elapsed
+
+    def replay(self, method: str, url: str) -> Optional[Recorded]:
+        """n-ième réponse enregistrée pour (méthode, URL), la dernière au-delà, None si absente."""
+        with self._lock:
+            occurrence = self._occurrences.get((method, url), 0)
+            row = self.conn.execute(
+                """SELECT occurrence, final_url, status, headers, codec, body, elapsed FROM interactions
+                   WHERE method = ? AND url = ? AND occurrence <= ?
+                   ORDER BY occurrence DESC LIMIT 1""",
+                (method, url, occurrence)
+            ).fetchone()
+            if row is None:
+                self.missed += 1
+                return None
+            self._occurrences[(method, url)] = occurrence + 1
+            self.replayed += 1
+            if row[0] < occurrence:
+                self.repeated += 1
+            self.waited += row[6] * self.latency
+        _, final_url, status, headers, codec, body, elapsed = row
+        return Recorded(status, final_url, json.loads(headers), self._decoders[codec](body), elapsed)
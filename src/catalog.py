@@ -0,0 +1,206 @@
+#!/usr/bin/env python3
+"""
+Catalogue local des sites à recherche par nom (NewPharma, Multipharma).
+
+Chaque produit vu par le scraper (résultat de recherche, listing --bulk, page produit)
+est mémorisé par site dans le cache: nom, tokens normalisés, CNK si connu, URL et
+dernier prix. Avant de chercher un CNK sur le site, ses noms (grid, Medi-Market) sont
+matchés contre ce catalogue: blocage par marque puis par tokens communs (index inversé
+en mémoire), puis score flou (rapidfuzz) sur les seuls candidats retenus. Un match
+fiable donne directement l'URL de la page produit, lue comme une page déjà indexée;
+seuls les produits jamais vus passent par une recherche réseau.
+"""
+
+import re
+import unicodedata
+from difflib import SequenceMatcher
+from typing import Dict, Iterable, List, NamedTuple, Optional, Sequence, Set, Tuple
+
+from bulk import detect_brand
+
+
+# Sites dont le catalogue est mémorisé et consulté avant la recherche
+CATALOG_SITES = ('newpharma', 'multipharma')
+
+# Score minimal (ratio sur les noms normalisés) d'un match catalogue, et écart minimal
+# avec le second candidat (deux formats d'un même produit)
+CATALOG_MIN_SCORE = 90
+CATALOG_MIN_MARGIN = 3
+
+# Candidats gardés après blocage (les plus de tokens communs), puis résultats du top-k
+CATALOG_BLOCK_LIMIT = 200
+CATALOG_TOP_K = 5
+
+# Mots sans valeur de blocage
+_STOPWORDS = frozenset((
+    'de', 'des', 'du', 'la', 'le', 'les', 'et', 'en', 'pour', 'au', 'aux', 'avec', 'a',
+    'x', 'the', 'and', 'voor', 'met',
+))
+
+# Contenance collée à son unité ('30 ml' -> '30ml')
+_QUANTITY = re.compile(r'(\d)\s+(ml|cl|l|g|gr|mg|kg|caps|comp|pc|pcs)\b')
+
+
+def tokens(name: str) -> List[str]:
+    """
+    Tokens normalisés d'un nom: minuscules, sans accents, alphanumériques, contenance
+    collée à son unité, sans mots vides.
+    """
+    text = unicodedata.normalize('NFKD', name.lower())
+    text = ''.join(c if c.isalnum() else ' ' for c in text if not unicodedata.combining(c))
+    text = _QUANTITY.sub(r'\1\2', text)
+    return [word for word in text.split() if word not in _STOPWORDS and (len(word) > 1 or word.isdigit())]
+
+
+class CatalogEntry(NamedTuple):
+    url: str
+    name: str
+    cnk: Optional[str]
+    price: Optional[float]
+
+
+def _scorer():
+    try:
+        from rapidfuzz import fuzz, process
+        return lambda query, choices: [
+            (score, index) for _, score, index in
+            process.extract(query, choices, scorer=fuzz.ratio, limit=CATALOG_TOP_K)
+        ]
+    except ImportError:
+        return lambda query, choices: sorted(
+            ((SequenceMatcher(None, query, c).ratio() * 100, k) for k, c in enumerate(choices)),
+            reverse=True,
+        )[:CATALOG_TOP_K]
+
+
+class Catalog:
+    """
+    Catalogue d'un site en mémoire, indexé par URL, CNK, marque et token. Construit une
+    fois par processus (cache.ProductCatalog.load) puis tenu à jour avec les produits
+    vus à chaque lot (apply).
+    """
+
+    def __init__(self, site: str,
+                 entries: Iterable[Tuple[str, str, Optional[str], Optional[str], Optional[float]]] = ()):
+        """entries: (url, nom, tokens normalisés séparés par des espaces ou None, cnk, prix)"""
+        self.site = site
+        self.entries: List[CatalogEntry] = []
+        self.normalized: List[str] = []
+        self.by_url: Dict[str, int] = {}
+        self.by_cnk: Dict[str, int] = {}
+        self.by_brand: Dict[str, List[int]] = {}
+        self.by_token: Dict[str, List[int]] = {}
+        self.removed: Set[int] = set()
+        self._top_k = _scorer()
+        for url, name, name_tokens, cnk, price in entries:
+            self.add(url, name, cnk, price, name_tokens.split() if name_tokens is not None else None)
+
+    def __len__(self):
+        return len(self.entries) - len(self.removed)
+
+    def add(self, url: str, name: str, cnk: Optional[str] = None, price: Optional[float] = None,
+            name_tokens: Optional[List[str]] = None) -> None:
+        """Ajoute un produit, ou met à jour celui de même URL (CNK et prix gardés si absents)."""
+        if name_tokens is None:
+            name_tokens = tokens(name)
+        index = self.by_url.get(url)
+        if index is None:
+            index = len(self.entries)
+            self.entries.append(CatalogEntry(url, name, cnk, price))
+            self.normalized.append(' '.join(name_tokens))
+            self.by_url[url] = index
+            brand = detect_brand(name)
+            if brand:
+                self.by_brand.setdefault(brand, []).append(index)
+        else:
+            previous = self.entries[index]
+            self.entries[index] = CatalogEntry(url, name, cnk or previous.cnk,
+                                               price if price is not None else previous.price)
+            self.normalized[index] = ' '.join(name_tokens)
+            self.removed.discard(index)
+            brand = detect_brand(name)
+            if brand and index not in self.by_brand.get(brand, ()):
+                self.by_brand.setdefault(brand, []).append(index)
+        if cnk:
+            self.by_cnk[cnk] = index
+        for token in set(name_tokens):
+            postings = self.by_token.setdefault(token, [])
+            if not postings or postings[-1] != index:
+                postings.append(index)
+
+    def remove(self, url: str) -> None:
+        index = self.by_url.get(url)
+        if index is None:
+            return
+        self.removed.add(index)
+        cnk = self.entries[index].cnk
+        if cnk and self.by_cnk.get(cnk) == index:
+            del self.by_cnk[cnk]
+
+    def forget_cnk(self, cnk: str) -> None:
+        """Page du CNK périmée: le produit reste au catalogue, sans ce CNK."""
+        index = self.by_cnk.pop(cnk, None)
+        if index is not None:
+            self.entries[index] = self.entries[index]._replace(cnk=None)
+
+    def apply(self, urls) -> None:
+        """
+        Reporte en mémoire ce qu'un lot a enregistré (cache.ProductCatalog.save): produits
+        vus, pages résolues, CNK périmés, pages disparues.
+        """
+        for cnk in urls.stale:
+            if cnk not in urls.resolved:
+                self.forget_cnk(cnk)
+        for url in urls.gone:
+            if url not in urls.observed:
+                self.remove(url)
+        for url, (name, price) in urls.observed.items():
+            self.add(url, name, None, price)
+        for cnk, (url, name) in urls.resolved.items():
+            if name or url in self.by_url:
+                self.add(url, name or self.entries[self.by_url[url]].name, cnk)
+
+    def block(self, name: str) -> List[int]:
+        """
+        Candidats d'un nom: produits de la même marque (si la marque est connue du
+        catalogue), classés par nombre de tokens communs, au plus CATALOG_BLOCK_LIMIT.
+        """
+        brand = detect_brand(name)
+        allowed = set(self.by_brand[brand]) if brand in self.by_brand else None
+        shared: Dict[int, int] = {}
+        for token in set(tokens(name)):
+            for index in self.by_token.get(token, ()):
+                if index not in self.removed and (allowed is None or index in allowed):
+                    shared[index] = shared.get(index, 0) + 1
+        return sorted(shared, key=lambda index: (-shared[index], index))[:CATALOG_BLOCK_LIMIT]
+
+    def top_k(self, name: str) -> List[Tuple[float, CatalogEntry]]:
+        """Meilleurs candidats (score sur les noms normalisés, entrée), par score décroissant."""
+        candidates = self.block(name)
+        if not candidates:
+            return []
+        choices = [self.normalized[index] for index in candidates]
+        return [(float(score), self.entries[candidates[k]]) for score, k in self._top_k(' '.join(tokens(name)), choices)]
+
+    def match(self, cnk: str, names: Sequence[Optional[str]],
+              min_score: float = CATALOG_MIN_SCORE) -> Optional[Tuple[float, CatalogEntry]]:
+        """
+        Produit du catalogue correspondant à un CNK: entrée portant ce CNK, sinon meilleur
+        match flou des noms donnés (score >= min_score, nettement devant le second).
+        """
+        if cnk in self.by_cnk:
+            return 100.0, self.entries[self.by_cnk[cnk]]
+        best = None
+        for name in names:
+            if not name or name.upper() == "NA":
+                continue
+            ranked = self.top_k(name)
+            if not ranked:
+                continue
+            score, entry = ranked[0]
+            runner_up = next((s for s, other in ranked[1:] if other.url != entry.url), 0.0)
+            if score < min_score or (score < 100 and score - runner_up < CATALOG_MIN_MARGIN):
+                continue
+            if best is None or score > best[0]:
+                best = (score, entry)
+        return best
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+API Python embarquable de LP_Pharma.
+
+Pour les services qui appellent le comparateur souvent: un PriceComparer garde les
+pools HTTP (session requests, cloudscraper), les catégories Farmaline et un cache
+de résultats entre les appels, et ne produit aucune sortie console.
+
+Usage:
+    from comparer import PriceComparer
+
+    comparer = PriceComparer(sites=('medi_market', 'multipharma'), cache_ttl=3600)
+    for result in comparer.compare(['1234567'], names={'1234567': 'Dafalgan 1g'}):
+        print(result.cnk, result.prices, result.stats['Prix Min'])
+
+    async for result in comparer.stream(cnks, names=names):
+        ...  # un PriceResult dès que tous les sites ont répondu pour ce CNK
+"""
+
+import asyncio
+import contextlib
+import threading
+import time
+from typing import AsyncIterator, Dict, Iterable, List, NamedTuple, Optional
+
+import events
+import scraper
+from results import ResultTable, SITES, SOURCE_LABELS, STATS_COLUMNS, compute_price_stats
+
+
+# Les scrapers partagent des états de module (pools, ERROR_TRACKER, flux d'événements):
+# un seul scraping à la fois par processus
+_SCRAPE_LOCK = threading.Lock()
+
+
+class PriceResult(NamedTuple):
+    cnk: str
+    name: str
+    base_price: Optional[float]
+    prices: Dict[str, Optional[float]]     # site -> prix (None = non trouvé)
+    scores: Dict[str, Optional[float]]     # site -> score de match 0-100
+    source: str                            # source du match Multipharma ('' si aucune)
+    stats: Dict[str, object]               # colonnes STATS_COLUMNS (None si non calculable)
+    fetched_at: float                      # time.time() du scraping
+
+
+def _value(value):
+    value = value.item() if hasattr(value, 'item') else value
+    return None if value == '' or value != value else value
+
+
+def results_from_table(table: ResultTable, names: Optional[Dict[str, str]] = None,
+                       fetched_at: Optional[float] = None) -> Dict[str, PriceResult]:
+    """Convertit une ResultTable (statistiques calculées) en PriceResult par CNK."""
+    names = names or {}
+    fetched_at = fetched_at or time.time()
+    sites = [(j, site) for j, site in enumerate(table.sites) if site in table.loaded_sites]
+    return {
+        cnk: PriceResult(
+            cnk=cnk,
+            name=names.get(cnk) or table.names[i],
+            base_price=_value(table.base_prices[i]),
+            prices={site: _value(table.prices[i, j]) for j, site in sites},
+            scores={site: _value(table.scores[i, j]) for j, site in sites},
+            source=SOURCE_LABELS[table.sources[i]],
+            stats={col: _value(table.stats[col][i]) for col in STATS_COLUMNS if col in table.stats},
+            fetched_at=fetched_at,
+        )
+        for i, cnk in enumerate(table.cnks)
+    }
+
+
+def result_from_lookups(cnk: str, lookups: Dict[str, tuple], names: Optional[Dict[str, str]] = None,
+                        base_prices: Optional[Dict[str, object]] = None,
+                        fetched_at: Optional[float] = None) -> PriceResult:
+    """PriceResult d'un CNK à partir de ses résultats par site {site: (prix, score, source)}."""
+    base_prices = base_prices or {}
+    table = ResultTable([cnk])
+    if cnk in base_prices:
+        table.set_base_prices({cnk: base_prices[cnk]})
+    for site, (price, score, source) in lookups.items():
+        table.set_site(
+            site,
+            {cnk: price} if price else {},
+            {cnk: score} if score is not None else None,
+            {cnk: source} if source else None,
+        )
+    compute_price_stats(table)
+    return results_from_table(table, names, fetched_at)[cnk]
+
+
+class PriceComparer:
+    """
+    Comparateur de prix réutilisable (sans sortie console).
+
+    Args:
+        sites: Sites à interroger (par défaut ceux du mode fichier CSV)
+        cache_ttl: Durée de validité (secondes) d'un résultat en cache, 0 = pas de cache
+        quiet: Masque la progression des scrapers (scraper.OUTPUT_SETTINGS, le temps
+               du scraping; les autres sorties du processus ne sont pas touchées)
+    """
+
+    def __init__(self, sites=scraper.CSV_SITES, cache_ttl: float = 3600, quiet: bool = True):
+        unknown = set(sites) - set(SITES)
+        if unknown:
+            raise ValueError(f"Sites inconnus: {', '.join(sorted(unknown))}")
+        self.sites = tuple(site for site in SITES if site in sites)
+        self.cache_ttl = cache_ttl
+        self.quiet = quiet
+        self._cache: Dict[str, PriceResult] = {}
+        self._cache_lock = threading.Lock()
+
+    # -- cache ---------------------------------------------------------------
+
+    def cached(self, cnk: str) -> Optional[PriceResult]:
+        """Résultat en cache encore valide pour un CNK, sinon None."""
+        with self._cache_lock:
+            result = self._cache.get(cnk)
+        if result is None or time.time() - result.fetched_at > self.cache_ttl:
+            return None
+        return result
+
+    def clear_cache(self) -> None:
+        with self._cache_lock:
+            self._cache.clear()
+
+    def store_results(self, results: Dict[str, PriceResult]) -> None:
+        if self.cache_ttl <= 0:
+            return
+        with self._cache_lock:
+            self._cache.update(results)
+
+    # -- scraping ------------------------------------------------------------
+
+    @contextlib.contextmanager
+    def _output(self):
+        quiet = scraper.OUTPUT_SETTINGS['quiet']
+        scraper.OUTPUT_SETTINGS['quiet'] = self.quiet
+        try:
+            yield
+        finally:
+            scraper.OUTPUT_SETTINGS['quiet'] = quiet
+
+    def _scrape(self, cnks: List[str], names: Dict[str, str], base_prices: Dict[str, object],
+                listener=None) -> Dict[str, PriceResult]:
+        with _SCRAPE_LOCK, self._output():
+            if listener is not None:
+                events.add_listener(listener)
+            try:
+                table = scraper.scrape_sites(cnks, names, self.sites)
+            finally:
+                if listener is not None:
+                    events.remove_listener(listener)
+        table.set_base_prices(base_prices)
+        compute_price_stats(table)
+        results = results_from_table(table, names)
+        self.store_results(results)
+        return results
+
+    @staticmethod
+    def _unique(cnks: Iterable[str]) -> List[str]:
+        return list(dict.fromkeys(str(cnk).strip() for cnk in cnks if str(cnk).strip()))
+
+    def compare(self, cnks: Iterable[str], names: Optional[Dict[str, str]] = None,
+                base_prices: Optional[Dict[str, object]] = None) -> List[PriceResult]:
+        """
+        Prix de chaque CNK sur les sites configurés (cache si frais, sinon scraping).
+
+        Ne pas appeler depuis une boucle asyncio en cours (les scrapers utilisent
+        asyncio.run): utiliser stream() dans ce cas.
+
+        Args:
+            cnks: CNK à comparer (doublons ignorés)
+            names: CNK -> nom du produit (recherche par nom sur Multipharma / NewPharma)
+            base_prices: CNK -> prix de base (colonne 'Écart Base')
+
+        Returns:
+            Liste de PriceResult dans l'ordre des CNK
+        """
+        cnks = self._unique(cnks)
+        results = {cnk: self.cached(cnk) for cnk in cnks}
+        missing = [cnk for cnk, result in results.items() if result is None]
+        if missing:
+            results.update(self._scrape(missing, names or {}, base_prices or {}))
+        return [results[cnk] for cnk in cnks]
+
+    async def stream(self, cnks: Iterable[str], names: Optional[Dict[str, str]] = None,
+                     base_prices: Optional[Dict[str, object]] = None) -> AsyncIterator[PriceResult]:
+        """
+        Comme compare(), mais produit chaque PriceResult dès qu'il est connu: d'abord
+        les CNK en cache, puis chaque CNK dès que tous les sites ont répondu pour lui,
+        enfin les CNK restants (sans recherche possible) à la fin du scraping.
+
+        Le scraping tourne dans un thread: la boucle asyncio appelante n'est pas bloquée.
+        """
+        cnks = self._unique(cnks)
+        names = names or {}
+        base_prices = base_prices or {}
+
+        missing = []
+        for cnk in cnks:
+            result = self.cached(cnk)
+            if result is None:
+                missing.append(cnk)
+            else:
+                yield result
+        if not missing:
+            return
+
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue()
+        pending = {cnk: set(self.sites) for cnk in missing}
+        lookups = {cnk: {} for cnk in missing}
+
+        def listener(site, cnk, price, score, source):
+            loop.call_soon_threadsafe(queue.put_nowait, (site, cnk, price, score, source))
+
+        future = loop.run_in_executor(None, self._scrape, missing, names, base_prices, listener)
+        future.add_done_callback(lambda _: queue.put_nowait(None))
+
+        while True:
+            item = await queue.get()
+            if item is None:
+                break
+            site, cnk, price, score, source = item
+            # Lookups d'autres sites ou re-vérifications: ignorés
+            if site not in pending.get(cnk, ()):
+                continue
+            lookups[cnk][site] = (price, score, source)
+            pending[cnk].discard(site)
+            if not pending[cnk]:
+                del pending[cnk]
+                yield result_from_lookups(cnk, lookups.pop(cnk), names, base_prices)
+
+        results = await future
+        for cnk in missing:
+            if cnk in pending:
+                yield results[cnk]
+
+    def close(self) -> None:
+        """Ferme les pools HTTP partagés (session requests)."""
+        if scraper._HTTP_SESSION is not None:
+            scraper._HTTP_SESSION.close()
+            scraper._HTTP_SESSION = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,232 @@
+#!/usr/bin/env python3
+"""
+Mode daemon de LP_Pharma: rafraîchissement continu des prix.
+
+Au lieu d'un batch nocturne qui re-scrape tout le catalogue au même rythme, chaque
+(site, CNK) a sa propre échéance de rafraîchissement, calculée à partir de la
+volatilité observée dans l'historique: un prix qui change souvent est revérifié
+toutes les quelques heures, un prix stable seulement tous les quelques jours.
+
+Les échéances sont gardées dans une file de priorité (tas) par site; chaque site
+consomme un budget de recherches par minute (seau à jetons), de sorte que le daemon
+tourne en continu sans dépasser le débit que chaque site tolère. Les résultats sont
+enregistrés dans l'historique des prix (SQLite), une exécution 'daemon' par lot; un
+produit jamais trouvé y garde sa dernière vérification, et n'est revérifié qu'après
+l'intervalle maximal, y compris après un redémarrage. Les lots NewPharma et
+Multipharma reçoivent les noms Medi-Market déjà connus, comme en batch.
+"""
+
+import heapq
+import itertools
+import time
+from datetime import datetime
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from history import HistoryStore
+
+
+# Budget de recherches (CNK) par minute et par site. L'unité est le CNK cherché, pas la
+# requête HTTP: une recherche coûte une à quelques requêtes selon le site (page de
+# recherche, fiche produit), d'où des valeurs prudentes pour les sites les plus stricts.
+SITE_RATE_BUDGETS = {
+    'medi_market': 20.0,
+    'farmaline': 4.0,
+    'newpharma': 2.0,
+    'multipharma': 20.0,
+}
+
+# Bornes de l'intervalle de rafraîchissement d'un (site, CNK), en secondes
+MIN_REFRESH_INTERVAL = 2 * 3600
+MAX_REFRESH_INTERVAL = 3 * 24 * 3600
+
+# Poids de la volatilité (changements de prix par jour) dans le raccourcissement de l'intervalle
+VOLATILITY_WEIGHT = 4.0
+
+# Taille maximale d'un lot de CNK scrapés ensemble pour un site
+MAX_BATCH_SIZE = 25
+
+# Pause maximale entre deux passages de la boucle (secondes)
+MAX_IDLE = 60.0
+
+
+def _timestamp(iso: Optional[str]) -> Optional[float]:
+    if not iso:
+        return None
+    try:
+        return datetime.fromisoformat(iso).timestamp()
+    except ValueError:
+        return None
+
+
+def refresh_interval(changes: int, span_days: float) -> float:
+    """
+    Intervalle de rafraîchissement (secondes) selon la volatilité observée.
+
+    Args:
+        changes: Nombre de changements de prix observés
+        span_days: Durée d'observation (jours)
+    """
+    rate = changes / max(span_days, 1.0)
+    interval = MAX_REFRESH_INTERVAL / (1.0 + VOLATILITY_WEIGHT * rate)
+    return min(MAX_REFRESH_INTERVAL, max(MIN_REFRESH_INTERVAL, interval))
+
+
+class RateBudget:
+    """Seau à jetons: `per_minute` recherches (CNK) par minute, rafale jusqu'à `burst`."""
+
+    def __init__(self, per_minute: float, burst: Optional[float] = None):
+        self.rate = per_minute / 60.0
+        self.capacity = burst if burst is not None else max(1.0, per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def available(self) -> int:
+        self._refill()
+        return int(self.tokens)
+
+    def consume(self, n: int) -> None:
+        self._refill()
+        self.tokens -= n
+
+    def wait_time(self, n: int = 1) -> float:
+        """Secondes avant que `n` jetons soient disponibles."""
+        self._refill()
+        if self.tokens >= n or self.rate <= 0:
+            return 0.0
+        return (n - self.tokens) / self.rate
+
+
+class RefreshDaemon:
+    """
+    Ordonnanceur de rafraîchissement continu par (site, CNK).
+
+    Args:
+        names: CNK -> nom du produit (catalogue à suivre)
+        sites: Sites à rafraîchir
+        scrape: Fonction (cnk_list, product_names, sites) -> ResultTable (scraper.scrape_sites)
+        history: Historique des prix (échéances initiales + enregistrement des résultats)
+        budgets: Recherches par minute et par site (défaut: SITE_RATE_BUDGETS)
+    """
+
+    def __init__(
+        self,
+        names: Dict[str, str],
+        sites: Iterable[str],
+        scrape: Callable,
+        history: HistoryStore,
+        budgets: Optional[Dict[str, float]] = None,
+        label: str = ''
+    ):
+        self.names = names
+        self.sites = tuple(sites)
+        self.scrape = scrape
+        self.history = history
+        self.label = label
+        budgets = budgets or SITE_RATE_BUDGETS
+        self.budgets = {site: RateBudget(budgets.get(site, 10.0)) for site in self.sites}
+        self.queues: Dict[str, List[Tuple[float, int, str]]] = {site: [] for site in self.sites}
+        # (cnk, site) -> [changements observés, première observation (timestamp)]
+        self.volatility: Dict[Tuple[str, str], List[float]] = {}
+        self._seq = itertools.count()
+        self.refreshed = 0
+        self.changed = 0
+
+    def schedule(self, site: str, cnk: str, due: float) -> None:
+        heapq.heappush(self.queues[site], (due, next(self._seq), cnk))
+
+    def interval_for(self, cnk: str, site: str, now: float) -> float:
+        changes, first_seen = self.volatility.get((cnk, site), (0, now))
+        return refresh_interval(int(changes), (now - first_seen) / 86400.0)
+
+    def load(self) -> None:
+        """Échéances initiales depuis l'historique (jamais vérifié = immédiatement)."""
+        now = time.time()
+        state = self.history.refresh_state(list(self.names))
+        for cnk in self.names:
+            for site in self.sites:
+                checked_at, count, first_seen = state.get((cnk, site), (None, 0, None))
+                checked = _timestamp(checked_at)
+                # La première observation n'est pas un changement
+                self.volatility[(cnk, site)] = [max(0, count - 1), _timestamp(first_seen) or now]
+                due = now if checked is None else checked + self.interval_for(cnk, site, now)
+                self.schedule(site, cnk, due)
+
+    def due_batch(self, site: str, now: float) -> List[str]:
+        """Retire de la file les CNK échus du site, dans la limite du budget disponible."""
+        queue = self.queues[site]
+        limit = min(MAX_BATCH_SIZE, self.budgets[site].available())
+        batch = []
+        while queue and len(batch) < limit and queue[0][0] <= now:
+            _, _, cnk = heapq.heappop(queue)
+            batch.append(cnk)
+        return batch
+
+    def refresh(self, site: str, cnks: List[str]) -> None:
+        """Scrape un lot pour un site, enregistre l'historique et replanifie chaque CNK."""
+        self.budgets[site].consume(len(cnks))
+        now = time.time()
+        try:
+            table = self.scrape(cnks, {cnk: self.names[cnk] for cnk in cnks}, (site,))
+        except Exception as e:
+            print(f"⚠️ Daemon: erreur lors du rafraîchissement {site} ({len(cnks)} CNKs): {e}")
+            # Nouvel essai au plus tôt après l'intervalle minimal
+            for cnk in cnks:
+                self.schedule(site, cnk, now + MIN_REFRESH_INTERVAL)
+            return
+
+        col = table.site_index(site)
+        observations = [
+            (cnk, site, float(table.prices[i, col]), float(table.scores[i, col]))
+            for i, cnk in enumerate(table.cnks)
+        ]
+        run_id = self.history.start_run('daemon', f"{self.label} {site}".strip())
+        added, unchanged = self.history.record_observations(run_id, observations)
+
+        # Volatilité mise à jour depuis l'historique (la première observation n'est pas un changement)
+        state = self.history.refresh_state(cnks)
+        for cnk in cnks:
+            _, count, first_seen = state.get((cnk, site), (None, 0, None))
+            self.volatility[(cnk, site)] = [max(0, count - 1), _timestamp(first_seen) or now]
+            self.schedule(site, cnk, now + self.interval_for(cnk, site, now))
+
+        self.refreshed += len(cnks)
+        self.changed += added
+        print(f"🔄 Daemon {site}: {len(cnks)} CNKs rafraîchis, {added} changements (run #{run_id})")
+
+    def next_wakeup(self, now: float) -> float:
+        """Secondes avant la prochaine échéance servable (échéance et budget)."""
+        waits = []
+        for site, queue in self.queues.items():
+            if queue:
+                waits.append(max(queue[0][0] - now, self.budgets[site].wait_time(1)))
+        return min(waits + [MAX_IDLE])
+
+    def run_once(self) -> int:
+        """Un passage: rafraîchit les lots échus de chaque site. Retourne le nombre de CNK traités."""
+        processed = 0
+        for site in self.sites:
+            batch = self.due_batch(site, time.time())
+            if batch:
+                self.refresh(site, batch)
+                processed += len(batch)
+        return processed
+
+    def run(self, max_cycles: Optional[int] = None) -> None:
+        """Boucle principale (Ctrl+C pour arrêter)."""
+        self.load()
+        total = sum(len(queue) for queue in self.queues.values())
+        print(f"🛰️  Daemon: {len(self.names)} CNKs × {len(self.sites)} sites = {total} prix suivis")
+        cycles = 0
+        try:
+            while max_cycles is None or cycles < max_cycles:
+                cycles += 1
+                if not self.run_once():
+                    time.sleep(max(0.5, self.next_wakeup(time.time())))
+        except KeyboardInterrupt:
+            print("\n🛑 Daemon arrêté")
+        print(f"📊 Daemon: {self.refreshed} rafraîchissements, {self.changed} changements enregistrés")
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+"""
+Flux d'événements NDJSON pour LP_Pharma (option --jsonl).
+
+Une ligne JSON par événement, écrite et flushée dès que l'information est connue,
+pour que les consommateurs (service de repricing, ...) traitent les prix pendant
+le scraping au lieu d'attendre le CSV / la Google Sheet finale.
+
+Événements:
+    {"event": "start",  "ts": ..., "mode": "csv", "label": "data/input/grid.csv"}
+    {"event": "lookup", "ts": ..., "site": "multipharma", "cnk": "1234567",
+     "found": true, "prix": 12.5, "score": 92.0, "source": "MediMarket"}
+    {"event": "row",    "ts": ..., "cnk": "1234567", "nom_produit": "...",
+     "prix_base": 13.0, "prix": {"medi_market": 12.9, ...}, "scores": {...},
+     "source": "...", "prix_moyen": ..., "prix_min": ..., "prix_median": ...,
+     "ecart_prix": ..., "site_moins_cher": "...", "ecart_base": ...}
+    {"event": "end",    "ts": ..., "lookups": 1234, "rows": 600}
+
+Un lookup est émis pour chaque recherche (site, CNK) terminée; un CNK re-vérifié
+(--recheck) peut donc avoir plusieurs lookups. Un row est émis par ligne consolidée
+(après statistiques et validation), comme les lignes du CSV / de la feuille: un CNK
+présent sur plusieurs lignes d'entrée a un row par ligne, avec le nom et le prix de
+base de cette ligne. C'est lui qui fait foi. Prix/scores absents -> null.
+"""
+
+import json
+import math
+import sys
+from datetime import datetime
+from threading import Lock
+from typing import Callable, Iterable, List, Optional, Tuple
+
+from results import ResultTable, SOURCE_LABELS, STATS_COLUMNS, parse_price
+
+
+# Clés JSON des colonnes de statistiques
+STATS_KEYS = {
+    'Prix Moyen': 'prix_moyen',
+    'Prix Min': 'prix_min',
+    'Prix Médian': 'prix_median',
+    'Écart Prix': 'ecart_prix',
+    'Site Moins Cher': 'site_moins_cher',
+    'Écart Base': 'ecart_base',
+}
+
+
+def _json_value(value):
+    """NaN / '' -> None, types numpy -> types Python."""
+    if value is None or value == '':
+        return None
+    if hasattr(value, 'item'):
+        value = value.item()
+    if isinstance(value, float) and math.isnan(value):
+        return None
+    return value
+
+
+class EventStream:
+    """
+    Écrit des événements NDJSON dans un fichier, une FIFO ou un flux ouvert.
+    Thread-safe: les scrapers à threads (Medi-Market, NewPharma) émettent en parallèle.
+    """
+
+    def __init__(self, target):
+        """
+        Args:
+            target: chemin (fichier ou FIFO, ouvert en écriture) ou flux texte déjà ouvert
+        """
+        if hasattr(target, 'write'):
+            self._file = target
+            self._owned = False
+        else:
+            # Bufferisé par ligne; l'ouverture d'une FIFO attend qu'un lecteur soit connecté
+            self._file = open(target, 'w', encoding='utf-8', buffering=1)
+            self._owned = True
+        self._lock = Lock()
+        self.counts = {'lookup': 0, 'row': 0}
+
+    def emit(self, event: str, **fields) -> None:
+        record = {'event': event, 'ts': datetime.now().isoformat(timespec='milliseconds')}
+        record.update(fields)
+        line = json.dumps(record, ensure_ascii=False, allow_nan=False)
+        with self._lock:
+            if self._file is None:
+                return
+            try:
+                self._file.write(line + '\n')
+                self._file.flush()
+            except (BrokenPipeError, OSError) as e:
+                # Consommateur parti: on arrête le flux sans interrompre le scraping
+                print(f"⚠️ Flux --jsonl interrompu: {e}", file=sys.stderr)
+                self._file = None
+                return
+            if event in self.counts:
+                self.counts[event] += 1
+
+    def lookup(self, site: str, cnk: str, price=None, score=None, source=None) -> None:
+        price = _json_value(price)
+        fields = {'site': site, 'cnk': cnk, 'found': price is not None, 'prix': price}
+        if score is not None:
+            fields['score'] = _json_value(score)
+        if source:
+            fields['source'] = source
+        self.emit('lookup', **fields)
+
+    def rows(self, table: ResultTable, rows: Iterable[Tuple]) -> None:
+        """
+        Émet un événement row par ligne de `rows` dont le CNK est dans la table: lignes
+        du grid (nom, cnk, prix de base brut) ou (nom, cnk) (prix de base de la table).
+        """
+        sites = [(j, site) for j, site in enumerate(table.sites) if site in table.loaded_sites]
+        stats = [(STATS_KEYS.get(col, col), table.stats[col]) for col in STATS_COLUMNS if col in table.stats]
+        for row in rows:
+            name, cnk = row[0], row[1]
+            i = table.index.get(cnk)
+            if i is None:
+                continue
+            base_price = parse_price(row[2]) if len(row) > 2 else table.base_prices[i]
+            fields = {
+                'cnk': cnk,
+                'nom_produit': name,
+                'prix_base': _json_value(base_price),
+                'prix': {site: _json_value(table.prices[i, j]) for j, site in sites},
+                'scores': {site: _json_value(table.scores[i, j]) for j, site in sites},
+                'source': SOURCE_LABELS[table.sources[i]],
+            }
+            for key, values in stats:
+                fields[key] = _json_value(values[i])
+            self.emit('row', **fields)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._owned and self._file is not None:
+                self._file.close()
+            self._file = None
+
+
+# Flux courant (None = --jsonl non demandé, les fonctions ci-dessous ne font rien)
+_STREAM: Optional[EventStream] = None
+
+# Abonnés in-process aux lookups (API PriceComparer): callback(site, cnk, prix, score, source)
+_LISTENERS: List[Callable] = []
+
+
+def open_stream(target, mode: str = '', label: str = '') -> EventStream:
+    """Ouvre le flux d'événements global et émet l'événement start."""
+    global _STREAM
+    _STREAM = EventStream(target)
+    _STREAM.emit('start', mode=mode, label=label)
+    return _STREAM
+
+
+def close_stream() -> None:
+    """Émet l'événement end (avec les compteurs) et ferme le flux global."""
+    global _STREAM
+    if _STREAM is None:
+        return
+    _STREAM.emit('end', lookups=_STREAM.counts['lookup'], rows=_STREAM.counts['row'])
+    _STREAM.close()
+    _STREAM = None
+
+
+def add_listener(callback: Callable) -> None:
+    _LISTENERS.append(callback)
+
+
+def remove_listener(callback: Callable) -> None:
+    if callback in _LISTENERS:
+        _LISTENERS.remove(callback)
+
+
+def emit_lookup(site: str, cnk: str, price=None, score=None, source=None) -> None:
+    if _STREAM is not None:
+        _STREAM.lookup(site, cnk, price, score, source)
+    for callback in list(_LISTENERS):
+        try:
+            callback(site, cnk, price, score, source)
+        except Exception as e:
+            # Un abonné défaillant ne doit pas interrompre le scraping
+            print(f"⚠️ Abonné aux événements en erreur: {e}", file=sys.stderr)
+
+
+def emit_rows(table: ResultTable, rows: Iterable[Tuple]) -> None:
+    if _STREAM is not None:
+        _STREAM.rows(table, rows)
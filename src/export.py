@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Exports typés des résultats LP_Pharma.
+
+Format Parquet (pyarrow): une ligne par (CNK, site) avec prix et score en float,
+site et source en colonnes catégorielles (dictionnaire), horodatage de l'exécution.
+L'écriture se fait par row groups (un par bloc/table), ce qui permet d'exporter les
+très gros catalogues du mode --stream sans tout garder en mémoire.
+
+Lecture type:
+    pyarrow.dataset.dataset("data/output/parquet/").to_table(filter=...)
+"""
+
+from datetime import datetime
+from typing import Dict, Optional
+
+import numpy as np
+
+from results import ResultTable, SOURCE_LABELS
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Dépendance optionnelle
+    pa = None
+    pq = None
+
+
+# Nombre de lignes (CNK × site) par row group pour les grosses tables
+ROW_GROUP_SIZE = 100_000
+
+
+def parquet_schema():
+    return pa.schema([
+        ('run_at', pa.timestamp('s')),
+        ('cnk', pa.string()),
+        ('nom_produit', pa.string()),
+        ('prix_base', pa.float64()),
+        ('site', pa.dictionary(pa.int8(), pa.string())),
+        ('prix', pa.float64()),
+        ('score', pa.float64()),
+        ('source', pa.dictionary(pa.int8(), pa.string())),
+    ])
+
+
+class ParquetResultWriter:
+    """
+    Écrit des ResultTable successives dans un même fichier Parquet.
+
+    Usage:
+        with ParquetResultWriter("resultats.parquet") as writer:
+            writer.write_table(table, product_names)
+    """
+
+    def __init__(self, path, run_at: Optional[datetime] = None):
+        if pa is None:
+            raise ImportError(
+                "pyarrow non installé - requis pour l'export Parquet:\n"
+                "   pip install pyarrow"
+            )
+        self.path = str(path)
+        self.run_at = (run_at or datetime.now()).replace(microsecond=0)
+        self.rows_written = 0
+        self._writer = pq.ParquetWriter(self.path, parquet_schema(), compression='zstd')
+
+    def write_table(self, table: ResultTable, product_names: Optional[Dict[str, str]] = None) -> int:
+        """
+        Ajoute les résultats des sites scrapés d'une table (lignes sans prix comprises,
+        prix NaN -> null). Retourne le nombre de lignes écrites.
+        """
+        columns = [j for j, site in enumerate(table.sites) if site in table.loaded_sites]
+        n, k = len(table), len(columns)
+        if n == 0 or k == 0:
+            return 0
+        product_names = product_names or {}
+
+        site_labels = pa.array([table.sites[j] for j in columns], type=pa.string())
+        source_labels = pa.array(list(SOURCE_LABELS), type=pa.string())
+
+        prices = table.prices[:, columns].ravel()
+        scores = table.scores[:, columns].ravel()
+        # La source de match ne concerne que Multipharma
+        multipharma = table.sites.index('multipharma') if 'multipharma' in table.sites else -1
+        source_codes = np.where(
+            np.array([j == multipharma for j in columns])[None, :],
+            table.sources[:, None],
+            0
+        ).astype(np.int8).ravel()
+
+        cnks = pa.array(table.cnks, type=pa.string())
+        names = pa.array([product_names.get(cnk, '') for cnk in table.cnks], type=pa.string())
+        repeat = pa.array(np.repeat(np.arange(n), k))
+
+        batch = pa.table({
+            'run_at': pa.array(np.full(n * k, np.datetime64(self.run_at, 's'))),
+            'cnk': cnks.take(repeat),
+            'nom_produit': names.take(repeat),
+            'prix_base': pa.array(np.repeat(table.base_prices, k), from_pandas=True),
+            'site': pa.DictionaryArray.from_arrays(pa.array(np.tile(np.arange(k, dtype=np.int8), n)), site_labels),
+            'prix': pa.array(prices, from_pandas=True),
+            'score': pa.array(scores, from_pandas=True),
+            'source': pa.DictionaryArray.from_arrays(pa.array(source_codes), source_labels),
+        }, schema=parquet_schema())
+
+        self._writer.write_table(batch, row_group_size=ROW_GROUP_SIZE)
+        self.rows_written += batch.num_rows
+        return batch.num_rows
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
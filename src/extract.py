@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Extraction des produits d'une page: données structurées d'abord, DOM ensuite.
+
+Beaucoup de pages embarquent déjà nom et prix sous forme JSON: blocs
+<script type="application/ld+json"> (Product / Offer) ou attributs analytics
+(data-google-360 sur NewPharma). Ces blocs sont repérés par un scan des octets de la
+réponse, sans construire le DOM; BeautifulSoup et les sélecteurs CSS du site ne
+servent que si aucune donnée structurée exploitable n'est trouvée.
+
+Le chemin utilisé pour chaque page (json-ld, google-360, dom, aucun) est compté par
+site dans STATS, affiché en fin de phase.
+"""
+
+import html
+import json
+import re
+import threading
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from bs4 import BeautifulSoup
+
+
+_LD_JSON = re.compile(
+    rb'<script[^>]*type=["\']application/ld\+json["\'][^>]*>(.*?)</script>',
+    re.IGNORECASE | re.DOTALL,
+)
+_GOOGLE_360 = re.compile(rb'data-google-360="([^"]*)"')
+_HREF = re.compile(rb'href="([^"]+)"')
+
+# Propriétés schema.org portant un identifiant produit (comparées au CNK): codes
+# comparés en entier, URLs par leur segment BE0{cnk}
+_ID_KEYS = ('sku', 'productID', 'mpn', 'gtin', 'gtin8', 'gtin13', 'gtin14', 'url', '@id')
+_URL_KEYS = ('url', '@id')
+
+
+def _same_code(value: str, code: str) -> bool:
+    """Codes égaux aux zéros de tête près ('BE0' national accepté: 'BE04862482')."""
+    value = value.strip().upper()
+    if value.startswith('BE') and value[2:].isdigit():
+        value = value[2:]
+    return value.isdigit() and value.lstrip('0') == code.lstrip('0')
+
+
+class StructuredProduct(NamedTuple):
+    name: str
+    price: float
+    url: str
+    ids: Tuple[Tuple[str, str], ...]   # (propriété, valeur)
+
+    def mentions(self, code: str) -> bool:
+        """
+        True si un identifiant du produit désigne `code`: sku, productID, gtin...
+        égal au code, ou URL portant le segment BE0{code}.
+        """
+        in_url = re.compile(rf'BE0*{re.escape(code.lstrip("0"))}(?=[/?#.\-]|$)', re.IGNORECASE)
+        return any(
+            in_url.search(value) if key in _URL_KEYS else _same_code(value, code)
+            for key, value in self.ids
+        )
+
+
+def _parse_price(value) -> Optional[float]:
+    if value is None or isinstance(value, bool):
+        return None
+    try:
+        return float(str(value).replace('€', '').replace('\xa0', '').replace(',', '.').strip())
+    except ValueError:
+        return None
+
+
+def _walk(node):
+    """Objets JSON-LD d'un bloc (listes et @graph aplatis)."""
+    if isinstance(node, list):
+        for item in node:
+            yield from _walk(item)
+    elif isinstance(node, dict):
+        yield node
+        if '@graph' in node:
+            yield from _walk(node['@graph'])
+
+
+def _offer_price(offers) -> Optional[float]:
+    for offer in offers if isinstance(offers, list) else [offers]:
+        if isinstance(offer, dict):
+            for key in ('price', 'lowPrice'):
+                price = _parse_price(offer.get(key))
+                if price is not None:
+                    return price
+    return None
+
+
+def json_ld_products(body: bytes) -> List[StructuredProduct]:
+    """Produits (avec nom et prix) des blocs JSON-LD de la page, dans l'ordre."""
+    if b'ld+json' not in body:
+        return []
+    products = []
+    for match in _LD_JSON.finditer(body):
+        try:
+            data = json.loads(match.group(1))
+        except ValueError:
+            continue
+        for node in _walk(data):
+            types = node.get('@type')
+            if 'Product' not in (types if isinstance(types, list) else [types]):
+                continue
+            name = node.get('name')
+            price = _offer_price(node.get('offers'))
+            if not isinstance(name, str) or not name.strip() or price is None:
+                continue
+            products.append(StructuredProduct(
+                name=html.unescape(name.strip()),
+                price=price,
+                url=node.get('url') if isinstance(node.get('url'), str) else '',
+                ids=tuple((key, str(node[key])) for key in _ID_KEYS if node.get(key) not in (None, '')),
+            ))
+    return products
+
+
+def google_360_items(raw: str) -> List[Tuple[str, object]]:
+    """Produits (nom, prix) d'une valeur d'attribut data-google-360 (déjà décodée)."""
+    try:
+        data = json.loads(raw.replace("&quot;", '"'))
+        items = data.get("ecommerce", {}).get("items", [])
+    except (ValueError, AttributeError):
+        return []
+    return [
+        (item["item_name"], item["price"]) for item in items
+        if isinstance(item, dict) and item.get("item_name") and item.get("price") is not None
+    ]
+
+
+def google_360_blocks(body: bytes) -> List[Tuple[List[Tuple[str, object]], Optional[str]]]:
+    """
+    Blocs data-google-360 de la page: ([(nom, prix)], premier lien qui suit l'attribut
+    avant le bloc suivant).
+    """
+    matches = list(_GOOGLE_360.finditer(body))
+    blocks = []
+    for k, match in enumerate(matches):
+        items = google_360_items(html.unescape(match.group(1).decode('utf-8', 'replace')))
+        if not items:
+            continue
+        end = matches[k + 1].start() if k + 1 < len(matches) else len(body)
+        href = _HREF.search(body, match.end(), end)
+        blocks.append((items, html.unescape(href.group(1).decode('utf-8', 'replace')) if href else None))
+    return blocks
+
+
+class ExtractionStats:
+    """Nombre de pages extraites par chemin (json-ld, google-360, dom, aucun) et par site."""
+
+    def __init__(self):
+        self.counts: Dict[str, Dict[str, int]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, site: str, path: str) -> None:
+        with self._lock:
+            site_counts = self.counts.setdefault(site, {})
+            site_counts[path] = site_counts.get(path, 0) + 1
+
+    def reset(self, site: str) -> None:
+        with self._lock:
+            self.counts.pop(site, None)
+
+    def snapshot(self, site: str) -> Dict[str, int]:
+        with self._lock:
+            return dict(self.counts.get(site, {}))
+
+    def summary(self, site: str) -> str:
+        """'json-ld 92% · dom 6% · aucun 2% (50 pages)', '' si aucune page."""
+        counts = self.snapshot(site)
+        total = sum(counts.values())
+        if not total:
+            return ''
+        parts = [f"{path} {count / total:.0%}" for path, count in sorted(counts.items(), key=lambda kv: -kv[1])]
+        return f"{' · '.join(parts)} ({total} pages)"
+
+
+STATS = ExtractionStats()
+
+
+def extract(site: str, body: bytes,
+            structured: Sequence[Tuple[str, Callable[[bytes], object]]],
+            dom: Callable[[BeautifulSoup], object],
+            parser: str = "lxml"):
+    """
+    Extrait le résultat d'une page: chaque lecteur de données structurées (chemin,
+    fonction(octets)) est essayé dans l'ordre, puis `dom(soup)` si aucun n'a abouti.
+    Les lecteurs et `dom` retournent un résultat évalué à faux quand rien n'est trouvé.
+    """
+    for path, reader in structured:
+        result = reader(body)
+        if result:
+            STATS.record(site, path)
+            return result
+    result = dom(BeautifulSoup(body, parser))
+    STATS.record(site, 'dom' if result else 'aucun')
+    return result
+
+
+def print_summary(site: str, label: str, out: Callable[[str], None] = print) -> None:
+    summary = STATS.summary(site)
+    if summary:
+        out(f"🧩 Extraction {label}: {summary}")
@@ -13,6 +13,8 @@ from typing import List, Dict, Optional, Tuple
 import gspread
 from google.oauth2.service_account import Credentials
 
+from results import ResultTable, STATS_COLUMNS, compute_price_stats
+
 
 # Scopes requis pour Google Sheets API
 SCOPES = [
@@ -63,13 +65,32 @@ def get_credentials(creds_path: Optional[str] = None) -> Credentials:
     return credentials
 
 
-def open_sheet(sheet_name: str, creds_path: Optional[str] = None) -> gspread.Spreadsheet:
+def get_client(creds_path: Optional[str] = None) -> gspread.Client:
+    """
+    Authentifie le Service Account et retourne un client gspread réutilisable.
+    
+    Args:
+        creds_path: Chemin vers le fichier de credentials (optionnel)
+    
+    Returns:
+        gspread.Client authentifié (à partager entre plusieurs feuilles)
+    """
+    credentials = get_credentials(creds_path)
+    return gspread.authorize(credentials)
+
+
+def open_sheet(
+    sheet_name: str,
+    creds_path: Optional[str] = None,
+    client: Optional[gspread.Client] = None
+) -> gspread.Spreadsheet:
     """
     Ouvre une Google Sheet par son nom.
     
     Args:
         sheet_name: Nom de la Google Sheet (ex: "test_pharma_scrap")
         creds_path: Chemin vers le fichier de credentials (optionnel)
+        client: Client gspread déjà authentifié (évite une ré-authentification)
     
     Returns:
         gspread.Spreadsheet object
@@ -77,8 +98,8 @@ def open_sheet(sheet_name: str, creds_path: Optional[str] = None) -> gspread.Spr
     Raises:
         gspread.exceptions.SpreadsheetNotFound: Si la feuille n'existe pas ou n'est pas partagée
     """
-    credentials = get_credentials(creds_path)
-    client = gspread.authorize(credentials)
+    if client is None:
+        client = get_client(creds_path)
     
     print(f"📊 Ouverture de la Google Sheet: {sheet_name}")
     try:
@@ -95,12 +116,57 @@ def open_sheet(sheet_name: str, creds_path: Optional[str] = None) -> gspread.Spr
         )
 
 
+def read_manifest(
+    manifest_path: str,
+    default_worksheet: str = 'resultats_final'
+) -> List[Tuple[str, str]]:
+    """
+    Lit un manifeste de batch listant les feuilles/onglets à traiter.
+    
+    Format (séparateur ';', une cible par ligne, '#' pour les commentaires):
+        nom_de_la_sheet;onglet
+        autre_sheet            (onglet par défaut: resultats_final)
+    
+    Args:
+        manifest_path: Chemin vers le fichier manifeste
+        default_worksheet: Onglet utilisé quand la ligne n'en précise pas
+    
+    Returns:
+        Liste ordonnée et sans doublons de (nom_sheet, onglet)
+    
+    Raises:
+        FileNotFoundError: Si le manifeste n'existe pas
+        ValueError: Si le manifeste ne contient aucune cible
+    """
+    path = Path(manifest_path).expanduser()
+    if not path.exists():
+        raise FileNotFoundError(f"Manifeste introuvable: {path}")
+    
+    targets = []
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            parts = [p.strip() for p in line.split(';')]
+            sheet_name = parts[0]
+            worksheet_name = parts[1] if len(parts) > 1 and parts[1] else default_worksheet
+            if sheet_name and (sheet_name, worksheet_name) not in targets:
+                targets.append((sheet_name, worksheet_name))
+    
+    if not targets:
+        raise ValueError(f"Aucune feuille listée dans le manifeste {path}")
+    
+    return targets
+
+
 def read_cnks(
     spreadsheet: gspread.Spreadsheet,
     worksheet_name: str = 'resultats_final',
     cnk_col: str = 'CNK',
-    name_col: str = 'Nom_Produit'
-) -> Tuple[List[str], Dict[str, int], Dict[str, str]]:
+    name_col: str = 'Nom_Produit',
+    base_col: str = 'Prix_Base'
+) -> Tuple[List[str], Dict[str, List[int]], Dict[str, str], Dict[str, str]]:
     """
     Lit la liste des CNK depuis une worksheet.
     
@@ -108,10 +174,14 @@ def read_cnks(
         spreadsheet: gspread.Spreadsheet object
         worksheet_name: Nom de l'onglet (ex: "resultats_final")
         cnk_col: Nom de la colonne contenant les CNK (ex: "CNK")
+        name_col: Nom de la colonne des noms de produit (optionnelle)
+        base_col: Nom de la colonne des prix de base (optionnelle)
     
     Returns:
-        Tuple de (liste des CNK, mapping CNK -> numéro de ligne)
-        Le mapping permet de retrouver la ligne pour écrire les résultats
+        Tuple de (liste des CNK uniques, mapping CNK -> numéros de ligne,
+                  mapping CNK -> nom, mapping CNK -> prix de base brut)
+        Un CNK présent sur plusieurs lignes n'apparaît qu'une fois dans la liste
+        (scrapé une seule fois) et le mapping liste toutes ses lignes
     
     Raises:
         ValueError: Si la colonne CNK n'existe pas ou est vide
@@ -147,37 +217,49 @@ def read_cnks(
         name_col_idx = headers.index(name_col)
     except ValueError:
         name_col_idx = None
+    try:
+        base_col_idx = headers.index(base_col)
+    except ValueError:
+        base_col_idx = None
 
     # Extraire les CNK (ignorer la ligne d'en-tête et les cellules vides)
     cnk_list = []
-    cnk_to_row = {}  # Mapping CNK -> numéro de ligne (1-based, pour Google Sheets)
+    cnk_to_rows = {}  # Mapping CNK -> numéros de ligne (1-based, pour Google Sheets)
     cnk_to_name = {}
+    cnk_to_base = {}
+    row_count = 0
 
     for row_idx, row in enumerate(all_values[1:], start=2):  # start=2 car ligne 1 = headers
         if len(row) > cnk_col_idx:
             cnk = row[cnk_col_idx].strip()
             if cnk:  # Ignorer les cellules vides
-                cnk_list.append(cnk)
-                cnk_to_row[cnk] = row_idx
-                # Lire le nom du produit si la colonne existe
-                if name_col_idx is not None and len(row) > name_col_idx:
-                    cnk_to_name[cnk] = row[name_col_idx].strip()
-                else:
-                    cnk_to_name[cnk] = ''
-    
-    print(f"✅ {len(cnk_list)} CNKs trouvés dans la colonne '{cnk_col}'")
+                row_count += 1
+                if cnk not in cnk_to_rows:
+                    cnk_list.append(cnk)
+                    cnk_to_rows[cnk] = []
+                cnk_to_rows[cnk].append(row_idx)
+                # Lire le nom du produit si la colonne existe (premier nom non vide)
+                if not cnk_to_name.get(cnk):
+                    if name_col_idx is not None and len(row) > name_col_idx:
+                        cnk_to_name[cnk] = row[name_col_idx].strip()
+                    else:
+                        cnk_to_name[cnk] = ''
+                if base_col_idx is not None and len(row) > base_col_idx and not cnk_to_base.get(cnk):
+                    cnk_to_base[cnk] = row[base_col_idx].strip()
+    
+    print(f"✅ {row_count} lignes avec CNK dans la colonne '{cnk_col}' ({len(cnk_list)} CNKs uniques)")
     
     if not cnk_list:
         raise ValueError(f"Aucun CNK trouvé dans la colonne '{cnk_col}'")
 
-    return cnk_list, cnk_to_row, cnk_to_name
+    return cnk_list, cnk_to_rows, cnk_to_name, cnk_to_base
 
 
 def write_results(
     spreadsheet: gspread.Spreadsheet,
     worksheet_name: str,
-    cnk_to_row: Dict[str, int],
-    results: Dict[str, Dict[str, any]],
+    cnk_to_rows: Dict[str, List[int]],
+    results: ResultTable,
     retry_count: int = 2,
     retry_delay: float = 2.0
 ) -> None:
@@ -187,9 +269,8 @@ def write_results(
     Args:
         spreadsheet: gspread.Spreadsheet object
         worksheet_name: Nom de l'onglet
-        cnk_to_row: Mapping CNK -> numéro de ligne
-        results: Dict avec les résultats pour chaque CNK
-                 Format: {'CNK': {'Prix_MediMarket': 12.34, 'Prix_Multipharma': 10.5, ...}}
+        cnk_to_rows: Mapping CNK -> numéros de ligne (le résultat est écrit sur chacune)
+        results: Table de résultats (les CNK absents de la table sont ignorés)
         retry_count: Nombre de tentatives en cas d'erreur API
         retry_delay: Délai entre les tentatives (secondes)
     
@@ -203,6 +284,7 @@ def write_results(
         - Match_Source_Multipharma
         - Prix Moyen
         - Prix Min
+        - Prix Médian, Écart Prix, Site Moins Cher, Écart Base (si présentes dans la feuille)
     """
     print(f"\n📝 Écriture des résultats dans l'onglet '{worksheet_name}'...")
     
@@ -231,6 +313,11 @@ def write_results(
         except ValueError:
             print(f"⚠️  Colonne '{col_name}' introuvable dans les headers. Ignorée.")
     
+    # Statistiques supplémentaires: écrites seulement si la colonne existe (sans avertissement)
+    for col_name in STATS_COLUMNS:
+        if col_name not in columns_to_write and col_name in headers:
+            columns_to_write[col_name] = headers.index(col_name)
+    
     # Filtrer les colonnes qui existent réellement
     columns_to_write = {k: v for k, v in columns_to_write.items() if v is not None}
     
@@ -242,24 +329,27 @@ def write_results(
     
     print(f"📊 Colonnes à mettre à jour: {list(columns_to_write.keys())}")
     
+    # Valeurs de chaque colonne lues directement dans la table (une liste par colonne)
+    column_values = {}
+    for col_name in columns_to_write:
+        values = results.sheet_column(col_name)
+        column_values[col_name] = values if values is not None else [''] * len(results)
+    
     # Préparer les updates (batch)
     # Format: liste de dicts avec 'range' et 'values'
     updates = []
     
-    for cnk, data in results.items():
-        if cnk not in cnk_to_row:
-            print(f"⚠️  CNK {cnk} non trouvé dans le mapping des lignes. Ignoré.")
+    for cnk, rows in cnk_to_rows.items():
+        i = results.index.get(cnk)
+        if i is None:
             continue
         
-        row_num = cnk_to_row[cnk]
-        
         for col_name, col_idx in columns_to_write.items():
             # Convertir l'index de colonne en lettre (A, B, C, ...)
             col_letter = chr(65 + col_idx)  # 65 = 'A'
-            cell_range = f"{col_letter}{row_num}"
             
             # Récupérer la valeur à écrire
-            value = data.get(col_name, '')
+            value = column_values[col_name][i]
             
             # Formater la valeur
             if value == '' or value is None:
@@ -267,15 +357,17 @@ def write_results(
             elif isinstance(value, (int, float)):
                 # Keep numeric types as-is so Google Sheets stores them as numbers.
                 # Formatting (comma decimal / two decimals) will be applied to the column below.
-                formatted_value = value
+                formatted_value = float(value)
             else:
                 # Ensure booleans/others are stringified
                 formatted_value = str(value)
             
-            updates.append({
-                'range': cell_range,
-                'values': [[formatted_value]]
-            })
+            # Même résultat sur chaque ligne qui référence ce CNK
+            for row_num in rows:
+                updates.append({
+                    'range': f"{col_letter}{row_num}",
+                    'values': [[formatted_value]]
+                })
     
     if not updates:
         print("⚠️  Aucune donnée à écrire")
@@ -291,7 +383,7 @@ def write_results(
             # Après écriture, appliquer un format numérique (2 décimales) aux colonnes pertinentes
             try:
                 # Colonnes numériques à formater avec 2 décimales (virgule)
-                numeric_cols = ['Prix_MediMarket', 'Prix_Farmaline', 'Prix_NewPharma', 'Prix_Multipharma', 'Prix Moyen', 'Prix Min']
+                numeric_cols = ['Prix_MediMarket', 'Prix_Farmaline', 'Prix_NewPharma', 'Prix_Multipharma', 'Prix Moyen', 'Prix Min', 'Prix Médian', 'Écart Prix']
                 for col_name in numeric_cols:
                     if col_name in columns_to_write:
                         col_idx = columns_to_write[col_name]
@@ -327,6 +419,14 @@ def write_results(
                             worksheet.format(range_a1, {"numberFormat": fmt_match["numberFormat"]})
                         except Exception as e:
                             print(f"⚠️  Impossible d'appliquer le format à {match_col}: {e}")
+                
+                # Écart vs prix de base: pourcentage
+                if 'Écart Base' in columns_to_write:
+                    col_letter = chr(65 + columns_to_write['Écart Base'])
+                    try:
+                        worksheet.format(f"{col_letter}2:{col_letter}", {"numberFormat": {"type": "PERCENT", "pattern": "0.0%"}})
+                    except Exception as e:
+                        print(f"⚠️  Impossible d'appliquer le format à Écart Base: {e}")
             except Exception as e:
                 print(f"⚠️  Erreur lors de l'application des formats de colonnes: {e}")
             return
@@ -341,39 +441,24 @@ def write_results(
                 raise
 
 
-def calculate_stats(results: Dict[str, Dict[str, any]]) -> Dict[str, Dict[str, any]]:
+def calculate_stats(results: ResultTable) -> ResultTable:
     """
-    Calcule les statistiques (Prix Moyen, Prix Min) pour chaque CNK.
+    Calcule les statistiques de prix pour chaque CNK (vectorisé sur la matrice CNK × site).
     
     Args:
-        results: Dict avec les résultats pour chaque CNK
+        results: Table de résultats (matrice CNK × site des prix)
     
     Returns:
-        Le même dict enrichi avec 'Prix Moyen' et 'Prix Min'
+        La même table enrichie avec les colonnes de STATS_COLUMNS
+        (Prix Moyen, Prix Min, Prix Médian, Écart Prix, Site Moins Cher, Écart Base)
     """
-    print("\n📊 Calcul des statistiques (Prix Moyen, Prix Min)...")
+    print("\n📊 Calcul des statistiques (Prix Moyen, Min, Médian, Écart, Site moins cher)...")
     
-    for cnk, data in results.items():
-        prices = []
-        
-        # Collecter les prix disponibles (tous les sites)
-        for price_col in ['Prix_MediMarket', 'Prix_Farmaline', 'Prix_NewPharma', 'Prix_Multipharma']:
-            if price_col in data and data[price_col] not in ('', 'NA', None):
-                try:
-                    price = float(data[price_col])
-                    prices.append(price)
-                except (ValueError, TypeError):
-                    pass
-        
-        # Calculer moyenne et min
-        if prices:
-            data['Prix Moyen'] = round(sum(prices) / len(prices), 2)
-            data['Prix Min'] = round(min(prices), 2)
-        else:
-            data['Prix Moyen'] = ''
-            data['Prix Min'] = ''
-    
-    print(f"✅ Statistiques calculées pour {len(results)} CNKs")
+    start = time.perf_counter()
+    compute_price_stats(results)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    
+    print(f"✅ Statistiques calculées pour {len(results)} CNKs ({elapsed_ms:.1f} ms)")
     return results
 
 
@@ -0,0 +1,350 @@
+#!/usr/bin/env python3
+"""
+Historique des prix pour LP_Pharma (SQLite, append-only).
+
+Chaque exécution enregistre ses observations (CNK, site, prix, score, horodatage).
+Une observation n'est ajoutée que si elle diffère de la dernière connue pour ce
+(CNK, site): le stockage grandit avec les changements de prix, pas avec le nombre
+d'exécutions. La table `latest` garde l'état courant pour la déduplication et
+permet de répondre à "qu'est-ce qui a changé depuis la dernière exécution ?"
+sans relire ni comparer les CSV de data/output/. La table `misses` garde la dernière
+vérification des (CNK, site) jamais trouvés, sans observation.
+"""
+
+import sqlite3
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+from results import ResultTable
+
+
+DEFAULT_HISTORY_PATH = Path(__file__).parents[1] / "data" / "history.sqlite3"
+
+# Taille des lots pour les requêtes IN (limite de paramètres SQLite)
+_IN_BATCH = 500
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    started_at TEXT NOT NULL,
+    mode TEXT NOT NULL,
+    label TEXT NOT NULL DEFAULT ''
+);
+CREATE TABLE IF NOT EXISTS observations (
+    cnk TEXT NOT NULL,
+    site TEXT NOT NULL,
+    price REAL,
+    score REAL,
+    observed_at TEXT NOT NULL,
+    run_id INTEGER NOT NULL REFERENCES runs(run_id)
+);
+CREATE INDEX IF NOT EXISTS idx_observations_run ON observations(run_id);
+CREATE INDEX IF NOT EXISTS idx_observations_key ON observations(cnk, site, run_id);
+CREATE TABLE IF NOT EXISTS latest (
+    cnk TEXT NOT NULL,
+    site TEXT NOT NULL,
+    price REAL,
+    score REAL,
+    observed_at TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    last_seen_run INTEGER NOT NULL,
+    PRIMARY KEY (cnk, site)
+);
+CREATE TABLE IF NOT EXISTS misses (
+    cnk TEXT NOT NULL,
+    site TEXT NOT NULL,
+    run_id INTEGER NOT NULL,
+    PRIMARY KEY (cnk, site)
+);
+"""
+
+
+class PriceChange(NamedTuple):
+    cnk: str
+    site: str
+    old_price: Optional[float]
+    new_price: Optional[float]
+    score: Optional[float]
+    observed_at: str
+
+
+def _normalize(price: float, score: float) -> Tuple[Optional[float], Optional[float]]:
+    """NaN -> None, prix arrondi au centime et score au dixième (comparaisons stables)."""
+    return (
+        None if price != price else round(price, 2),
+        None if score != score else round(score, 1),
+    )
+
+
+class HistoryStore:
+    """
+    Historique des observations de prix dans un fichier SQLite. La connexion peut être
+    partagée entre threads si l'appelant sérialise les accès (service HTTP).
+    """
+
+    def __init__(self, path=DEFAULT_HISTORY_PATH):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.conn = sqlite3.connect(str(self.path), check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def start_run(self, mode: str, label: str = '') -> int:
+        """Enregistre une nouvelle exécution et retourne son identifiant."""
+        with self.conn:
+            cur = self.conn.execute(
+                "INSERT INTO runs (started_at, mode, label) VALUES (?, ?, ?)",
+                (datetime.now().isoformat(timespec='seconds'), mode, label)
+            )
+        return cur.lastrowid
+
+    def last_run_id(self) -> Optional[int]:
+        row = self.conn.execute("SELECT MAX(run_id) FROM runs").fetchone()
+        return row[0]
+
+    def _latest_for(self, cnks: List[str]) -> Dict[Tuple[str, str], Tuple[Optional[float], Optional[float]]]:
+        latest = {}
+        for start in range(0, len(cnks), _IN_BATCH):
+            batch = cnks[start:start + _IN_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            for cnk, site, price, score in self.conn.execute(
+                f"SELECT cnk, site, price, score FROM latest WHERE cnk IN ({placeholders})", batch
+            ):
+                latest[(cnk, site)] = (price, score)
+        return latest
+
+    def record_observations(
+        self,
+        run_id: int,
+        observations: Iterable[Tuple[str, str, float, float]]
+    ) -> Tuple[int, int]:
+        """
+        Enregistre des observations (cnk, site, prix, score), NaN = non trouvé.
+
+        Une observation identique à la dernière connue n'est pas ré-écrite (seul
+        last_seen_run avance). Un produit jamais trouvé n'a pas d'observation, seule
+        sa dernière vérification est gardée (table `misses`); un produit qui
+        disparaît est enregistré (prix NULL).
+
+        Returns:
+            (nombre d'observations ajoutées, nombre d'observations inchangées)
+        """
+        observations = [(cnk, site) + _normalize(price, score) for cnk, site, price, score in observations]
+        latest = self._latest_for(sorted({cnk for cnk, _, _, _ in observations}))
+        now = datetime.now().isoformat(timespec='seconds')
+
+        inserts = []
+        unchanged = []
+        misses = []
+        for cnk, site, price, score in observations:
+            previous = latest.get((cnk, site))
+            if previous is None and price is None:
+                misses.append((cnk, site, run_id))
+                continue
+            if previous == (price, score):
+                unchanged.append((run_id, cnk, site))
+                continue
+            inserts.append((cnk, site, price, score, now, run_id))
+
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO observations (cnk, site, price, score, observed_at, run_id) VALUES (?, ?, ?, ?, ?, ?)",
+                inserts
+            )
+            self.conn.executemany(
+                """INSERT INTO latest (cnk, site, price, score, observed_at, run_id, last_seen_run)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(cnk, site) DO UPDATE SET
+                       price = excluded.price, score = excluded.score,
+                       observed_at = excluded.observed_at, run_id = excluded.run_id,
+                       last_seen_run = excluded.last_seen_run""",
+                [row + (run_id,) for row in inserts]
+            )
+            self.conn.executemany(
+                "UPDATE latest SET last_seen_run = ? WHERE cnk = ? AND site = ?",
+                unchanged
+            )
+            self.conn.executemany(
+                """INSERT INTO misses (cnk, site, run_id) VALUES (?, ?, ?)
+                   ON CONFLICT(cnk, site) DO UPDATE SET run_id = excluded.run_id""",
+                misses
+            )
+            self.conn.executemany(
+                "DELETE FROM misses WHERE cnk = ? AND site = ?",
+                [(cnk, site) for cnk, site, _, _, _, _ in inserts]
+            )
+        return len(inserts), len(unchanged)
+
+    def record_table(self, run_id: int, table: ResultTable) -> Tuple[int, int]:
+        """Enregistre les résultats des sites effectivement scrapés d'une table."""
+        prices = table.prices.tolist()
+        scores = table.scores.tolist()
+        columns = [(j, site) for j, site in enumerate(table.sites) if site in table.loaded_sites]
+        return self.record_observations(run_id, (
+            (cnk, site, prices[i][j], scores[i][j])
+            for i, cnk in enumerate(table.cnks)
+            for j, site in columns
+        ))
+
+    def refresh_state(self, cnks: List[str]) -> Dict[Tuple[str, str], Tuple[str, int, str]]:
+        """
+        État de rafraîchissement par (CNK, site) pour l'ordonnancement du mode daemon.
+
+        Un (CNK, site) jamais trouvé a 0 observation et sa dernière vérification
+        comme première observation.
+
+        Returns:
+            {(cnk, site): (dernière vérification, nombre d'observations enregistrées,
+                           première observation)} (dates ISO)
+        """
+        cnks = sorted(set(cnks))
+        state = {}
+        for start in range(0, len(cnks), _IN_BATCH):
+            batch = cnks[start:start + _IN_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            counts = {
+                (cnk, site): (count, first_seen)
+                for cnk, site, count, first_seen in self.conn.execute(
+                    f"""SELECT cnk, site, COUNT(*), MIN(observed_at) FROM observations
+                        WHERE cnk IN ({placeholders}) GROUP BY cnk, site""", batch
+                )
+            }
+            for cnk, site, checked_at in self.conn.execute(
+                f"""SELECT l.cnk, l.site, r.started_at FROM latest l
+                    JOIN runs r ON r.run_id = l.last_seen_run
+                    WHERE l.cnk IN ({placeholders})""", batch
+            ):
+                count, first_seen = counts.get((cnk, site), (0, checked_at))
+                state[(cnk, site)] = (checked_at, count, first_seen)
+            for cnk, site, checked_at in self.conn.execute(
+                f"""SELECT m.cnk, m.site, r.started_at FROM misses m
+                    JOIN runs r ON r.run_id = m.run_id
+                    WHERE m.cnk IN ({placeholders})""", batch
+            ):
+                state.setdefault((cnk, site), (checked_at, 0, checked_at))
+        return state
+
+    def latest_for(self, cnk: str) -> Dict[str, Tuple[Optional[float], Optional[float], str]]:
+        """
+        Dernier état connu d'un CNK: {site: (prix, score, date de dernière vérification)}.
+        Un site où le produit n'a jamais été trouvé donne (None, None, dernière vérification).
+        """
+        latest = {
+            site: (None, None, checked_at)
+            for site, checked_at in self.conn.execute(
+                """SELECT m.site, r.started_at FROM misses m
+                   JOIN runs r ON r.run_id = m.run_id
+                   WHERE m.cnk = ?""", (cnk,)
+            )
+        }
+        latest.update(
+            (site, (price, score, checked_at))
+            for site, price, score, checked_at in self.conn.execute(
+                """SELECT l.site, l.price, l.score, r.started_at FROM latest l
+                   JOIN runs r ON r.run_id = l.last_seen_run
+                   WHERE l.cnk = ?""", (cnk,)
+            )
+        )
+        return latest
+
+    def merge_from(self, other_path) -> Tuple[int, int]:
+        """
+        Importe un autre historique (ex: celui d'un shard sur une autre machine).
+
+        Les exécutions sont ré-numérotées; l'état courant (`latest`) d'un (CNK, site)
+        est remplacé si l'observation importée est plus récente.
+
+        Returns:
+            (exécutions importées, observations importées)
+        """
+        self.conn.execute("ATTACH DATABASE ? AS other", (str(other_path),))
+        try:
+            with self.conn:
+                run_map = {}
+                for run_id, started_at, mode, label in self.conn.execute(
+                    "SELECT run_id, started_at, mode, label FROM other.runs ORDER BY run_id"
+                ).fetchall():
+                    cur = self.conn.execute(
+                        "INSERT INTO runs (started_at, mode, label) VALUES (?, ?, ?)",
+                        (started_at, mode, label)
+                    )
+                    run_map[run_id] = cur.lastrowid
+
+                observations = [
+                    (cnk, site, price, score, observed_at, run_map[run_id])
+                    for cnk, site, price, score, observed_at, run_id in self.conn.execute(
+                        "SELECT cnk, site, price, score, observed_at, run_id FROM other.observations"
+                    )
+                ]
+                self.conn.executemany(
+                    "INSERT INTO observations (cnk, site, price, score, observed_at, run_id) VALUES (?, ?, ?, ?, ?, ?)",
+                    observations
+                )
+                self.conn.executemany(
+                    """INSERT INTO latest (cnk, site, price, score, observed_at, run_id, last_seen_run)
+                       VALUES (?, ?, ?, ?, ?, ?, ?)
+                       ON CONFLICT(cnk, site) DO UPDATE SET
+                           price = excluded.price, score = excluded.score,
+                           observed_at = excluded.observed_at, run_id = excluded.run_id,
+                           last_seen_run = excluded.last_seen_run
+                       WHERE excluded.observed_at >= latest.observed_at""",
+                    [
+                        (cnk, site, price, score, observed_at, run_map[run_id], run_map[last_seen_run])
+                        for cnk, site, price, score, observed_at, run_id, last_seen_run in self.conn.execute(
+                            "SELECT cnk, site, price, score, observed_at, run_id, last_seen_run FROM other.latest"
+                        )
+                    ]
+                )
+                # Vérifications sans résultat (historiques antérieurs: pas de table misses)
+                if self.conn.execute(
+                    "SELECT 1 FROM other.sqlite_master WHERE type = 'table' AND name = 'misses'"
+                ).fetchone():
+                    self.conn.executemany(
+                        """INSERT INTO misses (cnk, site, run_id) VALUES (?, ?, ?)
+                           ON CONFLICT(cnk, site) DO UPDATE SET run_id = excluded.run_id
+                           WHERE (SELECT started_at FROM runs WHERE run_id = excluded.run_id)
+                              >= (SELECT started_at FROM runs WHERE run_id = misses.run_id)""",
+                        [
+                            (cnk, site, run_map[run_id])
+                            for cnk, site, run_id in self.conn.execute("SELECT cnk, site, run_id FROM other.misses")
+                        ]
+                    )
+                self.conn.execute(
+                    """DELETE FROM misses WHERE EXISTS (
+                           SELECT 1 FROM latest l WHERE l.cnk = misses.cnk AND l.site = misses.site)"""
+                )
+        finally:
+            self.conn.execute("DETACH DATABASE other")
+        return len(run_map), len(observations)
+
+    def changes_since_last_run(self, run_id: Optional[int] = None) -> List[PriceChange]:
+        """
+        Changements enregistrés par une exécution (par défaut la dernière) par rapport
+        à l'observation précédente de chaque (CNK, site).
+        """
+        if run_id is None:
+            run_id = self.last_run_id()
+            if run_id is None:
+                return []
+        rows = self.conn.execute(
+            """SELECT o.cnk, o.site,
+                      (SELECT p.price FROM observations p
+                        WHERE p.cnk = o.cnk AND p.site = o.site AND p.run_id < o.run_id
+                        ORDER BY p.run_id DESC LIMIT 1) AS old_price,
+                      o.price, o.score, o.observed_at
+                 FROM observations o
+                WHERE o.run_id = ?
+                ORDER BY o.cnk, o.site""",
+            (run_id,)
+        ).fetchall()
+        return [PriceChange(*row) for row in rows]
@@ -0,0 +1,238 @@
+#!/usr/bin/env python3
+"""
+Table de résultats compacte pour LP_Pharma.
+
+Remplace la dizaine de dictionnaires parallèles (medi_prices, multipharma_scores, ...)
+par une seule table en colonnes: une matrice CNK × site de prix (float, NaN = absent),
+une matrice de scores de match et une colonne de sources codées sur un octet.
+La consolidation CSV, les statistiques et l'écriture Google Sheets lisent directement
+cette table.
+"""
+
+import math
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+
+# Sites dans l'ordre des colonnes de la matrice
+SITES = ('medi_market', 'farmaline', 'newpharma', 'multipharma')
+
+# Colonne de sortie (CSV / Google Sheets) de chaque site
+PRICE_COLUMNS = {
+    'medi_market': 'Prix_MediMarket',
+    'farmaline': 'Prix_Farmaline',
+    'newpharma': 'Prix_NewPharma',
+    'multipharma': 'Prix_Multipharma',
+}
+
+MATCH_COLUMNS = {
+    'multipharma': 'Match_Multipharma',
+    'newpharma': 'Match_NewPharma',
+}
+
+# Libellés des sites (colonne 'Site Moins Cher')
+SITE_LABELS = {
+    'medi_market': 'MediMarket',
+    'farmaline': 'Farmaline',
+    'newpharma': 'NewPharma',
+    'multipharma': 'Multipharma',
+}
+
+# Colonnes calculées par compute_price_stats (CSV et Google Sheets)
+STATS_COLUMNS = ('Prix Moyen', 'Prix Min', 'Prix Médian', 'Écart Prix', 'Site Moins Cher', 'Écart Base')
+
+# Libellés des sources de match (codés en int8, 0 = pas de source)
+SOURCE_LABELS = ('', 'Fichier Source', 'MediMarket')
+
+
+def parse_price(value) -> float:
+    """Convertit un prix (float, '12.5', '12,5', 'NA', '') en float, NaN si absent."""
+    if value is None or value == '' or value == 'NA':
+        return math.nan
+    if isinstance(value, (int, float)):
+        return float(value)
+    try:
+        return float(str(value).replace('€', '').replace('\xa0', '').replace(',', '.').strip())
+    except ValueError:
+        return math.nan
+
+
+class ResultTable:
+    """
+    Résultats de scraping pour une liste de CNK uniques, stockés en colonnes.
+
+    Attributs:
+        cnks: Liste des CNK (ordre des lignes)
+        index: Mapping CNK -> numéro de ligne
+        base_prices: Prix de base (float, NaN si absent)
+        prices: Matrice (n_cnk, n_sites) des prix, NaN = non trouvé
+        scores: Matrice (n_cnk, n_sites) des scores de match (0-100), NaN = pas de score
+        sources: Code de la source du meilleur match Multipharma (index dans SOURCE_LABELS)
+        loaded_sites: Sites effectivement scrapés (chargés via set_site)
+        names: Nom trouvé par recherche CNK (Medi-Market), clé de recherche secondaire
+        stats: Colonnes calculées (Prix Moyen, Prix Min, ...) par calculate_stats
+    """
+
+    __slots__ = ('cnks', 'index', 'sites', 'loaded_sites', 'base_prices', 'prices', 'scores', 'sources', 'names', 'stats')
+
+    def __init__(self, cnk_list: Iterable[str], sites=SITES):
+        self.cnks = list(cnk_list)
+        self.index = {cnk: i for i, cnk in enumerate(self.cnks)}
+        self.sites = tuple(sites)
+        self.loaded_sites = set()
+        n = len(self.cnks)
+        self.base_prices = np.full(n, np.nan)
+        self.prices = np.full((n, len(self.sites)), np.nan)
+        self.scores = np.full((n, len(self.sites)), np.nan)
+        self.sources = np.zeros(n, dtype=np.int8)
+        self.names = [''] * n
+        self.stats = {}
+
+    def __len__(self):
+        return len(self.cnks)
+
+    def site_index(self, site: str) -> int:
+        return self.sites.index(site)
+
+    def set_base_prices(self, base_prices: Dict[str, object], replace: bool = False) -> None:
+        """
+        Charge les prix de base (CNK -> valeur brute du fichier d'entrée). Avec
+        `replace`, les CNK absents de `base_prices` n'ont plus de prix de base.
+        """
+        if replace:
+            self.base_prices[:] = np.nan
+        for cnk, value in base_prices.items():
+            i = self.index.get(cnk)
+            if i is not None:
+                self.base_prices[i] = parse_price(value)
+
+    def set_site(
+        self,
+        site: str,
+        prices: Dict[str, object],
+        scores: Optional[Dict[str, float]] = None,
+        sources: Optional[Dict[str, str]] = None
+    ) -> None:
+        """
+        Charge les résultats d'un scraper (dicts CNK -> valeur) dans les colonnes du site.
+        Sans `scores`, un prix trouvé vaut un match à 100% (recherche par CNK).
+        """
+        col = self.site_index(site)
+        self.loaded_sites.add(site)
+        for cnk, value in prices.items():
+            i = self.index.get(cnk)
+            if i is None:
+                continue
+            price = parse_price(value)
+            self.prices[i, col] = price
+            if scores is None:
+                if not math.isnan(price):
+                    self.scores[i, col] = 100.0
+            elif scores.get(cnk):
+                self.scores[i, col] = float(scores[cnk])
+        if sources:
+            for cnk, label in sources.items():
+                i = self.index.get(cnk)
+                if i is not None and label in SOURCE_LABELS:
+                    self.sources[i] = SOURCE_LABELS.index(label)
+
+    def set_names(self, names: Dict[str, str]) -> None:
+        """Mémorise les noms trouvés par CNK (Medi-Market) pour les re-recherches par nom."""
+        for cnk, name in names.items():
+            i = self.index.get(cnk)
+            if i is not None and name:
+                self.names[i] = name
+
+    def names_dict(self, cnks: Iterable[str]) -> Dict[str, str]:
+        """Noms mémorisés pour un sous-ensemble de CNK (format attendu par les scrapers)."""
+        return {cnk: self.names[self.index[cnk]] for cnk in cnks if self.names[self.index[cnk]]}
+
+    def price(self, cnk: str, site: str) -> float:
+        return float(self.prices[self.index[cnk], self.site_index(site)])
+
+    def score(self, cnk: str, site: str) -> float:
+        return float(self.scores[self.index[cnk], self.site_index(site)])
+
+    def source(self, cnk: str) -> str:
+        return SOURCE_LABELS[self.sources[self.index[cnk]]]
+
+    def sheet_column(self, column: str) -> Optional[List[object]]:
+        """
+        Valeurs d'une colonne au format Google Sheets (une par CNK, '' si absente):
+        prix en float, scores en décimal (0-1), source en texte.
+        Retourne None si la colonne n'est pas connue de la table.
+        """
+        for site, name in PRICE_COLUMNS.items():
+            if name == column and site in self.sites:
+                return _floats_or_blank(self.prices[:, self.site_index(site)])
+        for site, name in MATCH_COLUMNS.items():
+            if name == column and site in self.sites:
+                return _floats_or_blank(self.scores[:, self.site_index(site)] / 100.0)
+        if column == 'Match_Source_Multipharma':
+            return [SOURCE_LABELS[code] for code in self.sources.tolist()]
+        if column in self.stats:
+            values = self.stats[column]
+            if isinstance(values, np.ndarray) and values.dtype.kind == 'f':
+                return _floats_or_blank(values)
+            return list(values)
+        return None
+
+
+def compute_price_stats(table: ResultTable) -> Dict[str, np.ndarray]:
+    """
+    Calcule les statistiques de prix de tous les CNK en quelques opérations vectorielles
+    sur la matrice CNK × site (NaN = prix absent).
+
+    Colonnes produites (dans table.stats):
+        - Prix Moyen / Prix Min / Prix Médian: sur les sites où le produit est trouvé
+        - Écart Prix: écart entre le prix le plus haut et le plus bas
+        - Site Moins Cher: libellé du site le moins cher ('' si aucun prix)
+        - Écart Base: (Prix Moyen - Prix_Base) / Prix_Base, en fraction (0.05 = +5%)
+
+    Returns:
+        Le dict table.stats mis à jour
+    """
+    prices = table.prices
+    valid = ~np.isnan(prices)
+    count = valid.sum(axis=1)
+    found = count > 0
+
+    low = np.where(valid, prices, np.inf)
+    high = np.where(valid, prices, -np.inf)
+    cheapest = low.argmin(axis=1)
+    min_price = np.where(found, low.min(axis=1), np.nan)
+    max_price = np.where(found, high.max(axis=1), np.nan)
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean_price = np.where(found, np.where(valid, prices, 0.0).sum(axis=1) / count, np.nan)
+        base = np.where(table.base_prices > 0, table.base_prices, np.nan)
+        base_gap = (mean_price - base) / base
+
+    # Médiane par tri des lignes (NaN rangés en fin) puis lecture au milieu des `count` valeurs
+    ordered = np.sort(prices, axis=1)
+    upper = np.minimum(count // 2, prices.shape[1] - 1)[:, None]
+    lower = np.maximum(count - 1, 0)[:, None] // 2
+    median_price = np.where(
+        found,
+        (np.take_along_axis(ordered, lower, axis=1) + np.take_along_axis(ordered, upper, axis=1))[:, 0] / 2,
+        np.nan
+    )
+
+    labels = np.array([SITE_LABELS.get(site, site) for site in table.sites] + [''], dtype=object)
+    cheapest_site = labels[np.where(found, cheapest, len(table.sites))]
+
+    table.stats.update({
+        'Prix Moyen': np.round(mean_price, 2),
+        'Prix Min': np.round(min_price, 2),
+        'Prix Médian': np.round(median_price, 2),
+        'Écart Prix': np.round(max_price - min_price, 2),
+        'Site Moins Cher': cheapest_site,
+        'Écart Base': np.round(base_gap, 4),
+    })
+    return table.stats
+
+
+def _floats_or_blank(values: np.ndarray) -> List[object]:
+    """Convertit un vecteur float en liste Python, NaN -> ''."""
+    return ['' if math.isnan(v) else v for v in values.tolist()]
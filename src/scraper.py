@@ -14,21 +14,44 @@ import sys
 import os
 
 # Force unbuffered output pour voir l'avancement en temps réel
-if not sys.flags.optimize:
+# (exécution en script uniquement: importé comme bibliothèque, on ne touche pas aux flux de l'hôte)
+if __name__ == "__main__" and not sys.flags.optimize:
     sys.stdout = os.fdopen(sys.stdout.fileno(), 'w', 1)
     sys.stderr = os.fdopen(sys.stderr.fileno(), 'w', 1)
 
+import atexit
+from contextlib import aclosing
 import csv
 import time
 import subprocess
 import asyncio
 import json
 import random
+import re
 import requests
 from datetime import datetime
 from pathlib import Path
 from bs4 import BeautifulSoup
-from urllib.parse import quote_plus
+from urllib.parse import quote_plus, urljoin
+
+import numpy as np
+
+import archive
+import cassette
+import bulk
+import cache
+import catalog
+import events
+import extract
+import shard
+import sitemap
+import transport
+import validation
+from daemon import SITE_RATE_BUDGETS, RefreshDaemon
+from export import ParquetResultWriter
+from history import DEFAULT_HISTORY_PATH, HistoryStore
+from workqueue import DEFAULT_QUEUE_PATH, MAX_ATTEMPTS, QUEUE_RATE_BUDGETS, WorkQueue, lease_owner, shard_queue_path
+from results import ResultTable, SITES, SITE_LABELS, SOURCE_LABELS, STATS_COLUMNS, compute_price_stats, parse_price
 
 # Configuration
 SCRIPT_DIR = Path(__file__).parent.absolute()
@@ -40,7 +63,19 @@ TEMP_DIR.mkdir(exist_ok=True)
 # ============================================================================
 def print_live(message="", end="\n"):
     """Affiche un message et force l'affichage immédiat (pas de buffer)."""
-    print(message, end=end, flush=True)
+    log(message, end=end, flush=True)
+
+
+# Sortie console des scrapers: muette en mode embarqué (comparer.PriceComparer(quiet=True))
+OUTPUT_SETTINGS = {
+    'quiet': False,
+}
+
+
+def log(*args, **kwargs):
+    """Sortie console des scrapers (comme print()), sans effet si OUTPUT_SETTINGS['quiet']."""
+    if not OUTPUT_SETTINGS['quiet']:
+        print(*args, **kwargs)
 
 # ============================================================================
 # 🛡️ ANTI-DÉTECTION: User-Agents, Headers, Délais
@@ -113,6 +148,21 @@ def rotate_headers():
         "Cache-Control": "max-age=0",
     }
 
+# Pauses de politesse entre requêtes (désactivées en --reparse / --replay: aucune requête réseau)
+PACING_SETTINGS = {
+    'enabled': True,
+}
+
+
+def polite_sleep(seconds):
+    if PACING_SETTINGS['enabled'] and seconds > 0:
+        time.sleep(seconds)
+
+
+async def polite_sleep_async(seconds):
+    await asyncio.sleep(seconds if PACING_SETTINGS['enabled'] and seconds > 0 else 0)
+
+
 def human_like_delay():
     """
     Simule un comportement humain avec délais aléatoires et pauses irrégulières.
@@ -122,8 +172,10 @@ def human_like_delay():
     - 85% de chance: délai normal (0.5-2s) = navigation normale
     
     Returns:
-        float: Nombre de secondes à attendre
+        float: Nombre de secondes à attendre (0 si les pauses sont désactivées)
     """
+    if not PACING_SETTINGS['enabled']:
+        return 0.0
     choice = random.random()
     if choice < 0.05:  # 5%: pause longue
         return random.uniform(10, 30)
@@ -146,19 +198,19 @@ def log_blocking_error(site, error_code):
         
         # Alerte si trop d'erreurs
         if ERROR_TRACKER[key] >= 5:
-            print(f"\n⚠️ ALERTE: {site.upper()} bloque fréquemment (code {error_code}, {ERROR_TRACKER[key]} occurrences)")
-            print(f"   → Considérez augmenter les délais ou utiliser un VPS/proxy")
+            log(f"\n⚠️ ALERTE: {site.upper()} bloque fréquemment (code {error_code}, {ERROR_TRACKER[key]} occurrences)")
+            log(f"   → Considérez augmenter les délais ou utiliser un VPS/proxy")
 
 def print_blocking_report():
     """Affiche un rapport des erreurs de blocage détectées pendant le scraping."""
     total_errors = sum(ERROR_TRACKER.values())
     if total_errors == 0:
-        print("\n✅ Aucune erreur de blocage détectée (403/429)")
+        log("\n✅ Aucune erreur de blocage détectée (403/429)")
         return
     
-    print("\n" + "="*60)
-    print("⚠️  RAPPORT DES ERREURS DE BLOCAGE")
-    print("="*60)
+    log("\n" + "="*60)
+    log("⚠️  RAPPORT DES ERREURS DE BLOCAGE")
+    log("="*60)
     
     for site in ['farmaline', 'newpharma', 'medi_market', 'multipharma']:
         errors_403 = ERROR_TRACKER.get(f'{site}_403', 0)
@@ -166,18 +218,193 @@ def print_blocking_report():
         total_site = errors_403 + errors_429
         
         if total_site > 0:
-            print(f"\n🔴 {site.upper()}:")
+            log(f"\n🔴 {site.upper()}:")
             if errors_403 > 0:
-                print(f"   • 403 Forbidden: {errors_403} fois")
+                log(f"   • 403 Forbidden: {errors_403} fois")
             if errors_429 > 0:
-                print(f"   • 429 Too Many Requests: {errors_429} fois")
+                log(f"   • 429 Too Many Requests: {errors_429} fois")
+    
+    log("\n💡 Actions recommandées:")
+    log("   1. Augmenter les délais (human_like_delay déjà activé)")
+    log("   2. Louer un VPS en Belgique (~5€/mois)")
+    log("   3. Utiliser ScraperAPI pour proxies résidentiels (~2€/mois)")
+    log("   4. Consulter docs/ANTI_DETECTION_AVANCEE.md pour plus de solutions")
+    log("="*60)
+
+
+# ============================================================================
+# 🔌 POOLS HTTP PARTAGÉS (réutilisés entre phases et entre feuilles d'un batch)
+# ============================================================================
+_HTTP_SESSION = None
+_CLOUDSCRAPER = None
+
+# Transport enregistré / rejoué de toutes les sessions HTTP (archive --archive / --reparse,
+# cassette --record / --replay)
+_HTTP_STORE = None
+# Catégories Farmaline découvertes (page d'accueil), réutilisées par les appels suivants
+_FARMALINE_CATEGORIES = None
+
+
+def get_http_session(pool_size=10):
+    """
+    Retourne la session requests partagée (pool de connexions keep-alive).
+    
+    Créée une seule fois par processus: un batch de plusieurs feuilles réutilise
+    les mêmes connexions TCP/TLS au lieu de les rouvrir à chaque requête.
+    """
+    global _HTTP_SESSION
+    if _HTTP_SESSION is None:
+        session = requests.Session()
+        adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        if _HTTP_STORE is not None:
+            transport.install(session, _HTTP_STORE)
+        _HTTP_SESSION = session
+    return _HTTP_SESSION
+
+
+def get_cloudscraper():
+    """Retourne le scraper cloudscraper partagé (challenge Cloudflare résolu une seule fois)."""
+    global _CLOUDSCRAPER
+    if _CLOUDSCRAPER is None:
+        import cloudscraper
+        _CLOUDSCRAPER = cloudscraper.create_scraper(
+            browser={
+                'browser': 'chrome',
+                'platform': 'windows',
+                'mobile': False
+            }
+        )
+        if _HTTP_STORE is not None:
+            transport.install(_CLOUDSCRAPER, _HTTP_STORE)
+    return _CLOUDSCRAPER
+
+
+def open_client_session(**kwargs):
+    """Session aiohttp (Farmaline, Multipharma), branchée sur l'archive si active."""
+    import aiohttp
+    return transport.wrap_client_session(aiohttp.ClientSession(**kwargs), _HTTP_STORE)
+
+
+# ============================================================================
+# 🧩 SHARDS: part du catalogue et des budgets de requêtes (--shard i/N)
+# ============================================================================
+SHARD_SETTINGS = {
+    'index': 0,   # 0-based
+    'count': 1,
+    'workers': 1,  # processus de la file (--workers) se partageant ce shard
+}
+
+
+def in_current_shard(cnk):
+    """True si le CNK appartient au shard de ce processus (hash stable du CNK)."""
+    return shard.in_shard(cnk, SHARD_SETTINGS['index'], SHARD_SETTINGS['count'])
+
+
+def shard_split():
+    """Nombre de parts du débit d'un processus seul: shards × workers de la file."""
+    return SHARD_SETTINGS['count'] * SHARD_SETTINGS['workers']
+
+
+def shard_workers(workers):
+    """Nombre de workers d'un site ramené à la part de ce processus (au moins 1)."""
+    return max(1, workers // shard_split())
+
+
+def shard_delay(delay, workers):
+    """
+    Délai entre requêtes allongé quand shard_workers() ne peut pas descendre sous 1:
+    le débit du shard (workers / délai) reste égal à 1/N du débit d'un processus seul.
+    """
+    return delay * shard_workers(workers) * shard_split() / workers
+
+
+# ============================================================================
+# ⚙️ ORDONNANCEMENT: fenêtre glissante (pas de tâche/future par CNK à l'avance)
+# ============================================================================
+async def bounded_as_completed(worker, items, limit):
+    """
+    Exécute `worker(item)` sur chaque élément avec au plus `limit` tâches en vol.
+    
+    Les tâches ne sont créées qu'au fur et à mesure que de la capacité se libère,
+    et les résultats sont rendus dès qu'ils sont prêts (ordre de complétion):
+    la mémoire et le coût d'ordonnancement ne dépendent pas de la taille du catalogue.
+    
+    Args:
+        worker: Fonction async appelée pour chaque élément
+        items: Itérable (éventuellement paresseux) d'éléments à traiter
+        limit: Taille de la fenêtre (int) ou callable retournant la taille courante
+    
+    Yields:
+        Résultat de chaque tâche, ou l'exception levée par celle-ci
+    
+    Si le consommateur s'arrête avant la fin (break, exception, annulation), les
+    tâches encore en vol sont annulées et attendues.
+    """
+    items = iter(items)
+    pending = set()
+    exhausted = False
+    
+    try:
+        while True:
+            window = limit() if callable(limit) else limit
+            while not exhausted and len(pending) < max(1, window):
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(asyncio.ensure_future(worker(item)))
+            
+            if not pending:
+                return
+            
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                try:
+                    yield task.result()
+                except Exception as e:
+                    yield e
+    finally:
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+
+
+def bounded_executor_map(executor, worker, items, window):
+    """
+    Équivalent synchrone de bounded_as_completed pour un ThreadPoolExecutor:
+    au plus `window` futures en attente, résultats rendus dans l'ordre de complétion.
+    Si le consommateur s'arrête avant la fin, les futures pas encore démarrées sont
+    annulées.
+    """
+    from concurrent.futures import wait, FIRST_COMPLETED
+    
+    items = iter(items)
+    pending = set()
+    exhausted = False
     
-    print("\n💡 Actions recommandées:")
-    print("   1. Augmenter les délais (human_like_delay déjà activé)")
-    print("   2. Louer un VPS en Belgique (~5€/mois)")
-    print("   3. Utiliser ScraperAPI pour proxies résidentiels (~2€/mois)")
-    print("   4. Consulter docs/ANTI_DETECTION_AVANCEE.md pour plus de solutions")
-    print("="*60)
+    try:
+        while True:
+            while not exhausted and len(pending) < window:
+                try:
+                    item = next(items)
+                except StopIteration:
+                    exhausted = True
+                    break
+                pending.add(executor.submit(worker, item))
+            
+            if not pending:
+                return
+            
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+    finally:
+        for future in pending:
+            future.cancel()
 
 
 def read_cnk_list(input_file):
@@ -217,15 +444,20 @@ def read_grid_file(grid_file):
     """
     Lit le fichier grid avec noms, CNK et prix de base.
     Format attendu: Nom;CNK;Prix
-    Retourne un tuple de 3 dictionnaires: (product_names, cnk_list, base_prices)
+    Retourne un tuple (product_names, cnk_list, base_prices, grid_rows):
+      - cnk_list: CNK uniques dans l'ordre d'apparition (chaque CNK n'est scrapé qu'une fois)
+      - product_names / base_prices: CNK -> première valeur rencontrée
+      - grid_rows: toutes les lignes (nom, cnk, prix) dans l'ordre du fichier,
+        doublons compris, pour écrire le résultat sur chaque ligne qui référence le CNK
     """
     product_names = {}
     cnk_list = []
     base_prices = {}
+    grid_rows = []
     
     if not os.path.exists(grid_file):
-        print(f"⚠️ Fichier grid '{grid_file}' non trouvé")
-        return product_names, cnk_list, base_prices
+        log(f"⚠️ Fichier grid '{grid_file}' non trouvé")
+        return product_names, cnk_list, base_prices, grid_rows
     
     try:
         with open(grid_file, newline="", encoding="utf-8") as f:
@@ -235,47 +467,118 @@ def read_grid_file(grid_file):
                     name = row[0].strip()
                     cnk = row[1].strip()
                     prix = row[2].strip()
-                    if name and cnk:
-                        product_names[cnk] = name
-                        cnk_list.append(cnk)
-                        base_prices[cnk] = prix
-        print(f"📋 {len(product_names)} produits chargés depuis le fichier grid")
-        print(f"  • {len(cnk_list)} CNKs")
-        print(f"  • {len(base_prices)} prix de base")
+                    if name and cnk and in_current_shard(cnk):
+                        grid_rows.append((name, cnk, prix))
+                        if cnk not in product_names:
+                            product_names[cnk] = name
+                            cnk_list.append(cnk)
+                            base_prices[cnk] = prix
+        log(f"📋 {len(grid_rows)} lignes chargées depuis le fichier grid")
+        if SHARD_SETTINGS['count'] > 1:
+            log(f"  • Shard {SHARD_SETTINGS['index'] + 1}/{SHARD_SETTINGS['count']}")
+        log(f"  • {len(cnk_list)} CNKs uniques")
+        if len(grid_rows) > len(cnk_list):
+            log(f"  • {len(grid_rows) - len(cnk_list)} doublons (scrapés une seule fois)")
+        log(f"  • {len(base_prices)} prix de base")
     except Exception as e:
-        print(f"⚠️ Erreur lors de la lecture du fichier grid: {e}")
+        log(f"⚠️ Erreur lors de la lecture du fichier grid: {e}")
     
-    return product_names, cnk_list, base_prices
+    return product_names, cnk_list, base_prices, grid_rows
 
 
-def scrape_medi_market(cnk_list):
-    """Scrape Medi-Market pour une liste de CNK."""
-    print("\n" + "="*60)
-    print("🔵 PHASE 1: Scraping Medi-Market")
-    print("="*60)
+def scrape_medi_market(cnk_list, urls=None, misses=None):
+    """
+    Scrape Medi-Market pour une liste de CNK.
+    
+    `urls` (cache.ProductUrls): pages produit importées des sitemaps (sync), lues
+    directement avant les recherches (une requête, quelle que soit la boutique);
+    une page disparue ou sans le produit est invalidée et le CNK recherché.
+    `misses` (set): reçoit les CNK dont l'absence est prouvée (les deux boutiques
+    ont répondu sans le produit); une erreur réseau ou un blocage n'en est pas une.
+    """
+    log("\n" + "="*60)
+    log("🔵 PHASE 1: Scraping Medi-Market")
+    log("="*60)
     
     from queue import Queue
     from threading import Thread, Lock
     
     PARAPHARMACIE_SITE = "https://medi-market.be/fr/search?q={cnk}"
     PHARMACIE_SITE = "https://pharmacy-medi-market.be/fr/search?q={cnk}"
-    MAX_WORKERS = 10
+    MAX_WORKERS = shard_workers(10)
     
     USER_AGENTS = [
         "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36",
         "Mozilla/5.0 (Macintosh; Intel Mac OS X 10_15_7) AppleWebKit/605.1.15",
     ]
     
+    if urls is None:
+        urls = cache.ProductUrls('medi_market')
+    
+    session = get_http_session(pool_size=MAX_WORKERS)
+    extract.STATS.reset('medi_market')
+    
+    # (boutique, CNK) dont la recherche a abouti sans le produit
+    absent = set()
+    
     def scrape_from_site(cnk, search_url):
+        if search_url is None:
+            return scrape_known_page(cnk)
         url = search_url.format(cnk=cnk)
         headers = {"User-Agent": random.choice(USER_AGENTS)}
         try:
-            resp = requests.get(url, headers=headers, timeout=10)
-            resp.raise_for_status()
-        except:
+            resp = session.get(url, headers=headers, timeout=10)
+        except requests.RequestException:
+            return None  # Erreur réseau: ni trouvé, ni absent
+        if resp.status_code in (404, 410):
+            absent.add((search_url, cnk))
             return None
+        if resp.status_code != 200:
+            return None  # Blocage (403, 429) ou erreur serveur
         
-        soup = BeautifulSoup(resp.content, "html.parser")
+        res = extract.extract(
+            'medi_market', resp.content,
+            [('json-ld', lambda body: read_structured(cnk, body))],
+            lambda soup: read_dom(cnk, soup),
+            parser="html.parser",
+        )
+        # Produit présent mais illisible (sélecteur cassé): pas une absence
+        if res is None and f'data-product-id="{cnk}"'.encode() not in resp.content:
+            absent.add((search_url, cnk))
+        return res
+    
+    def scrape_known_page(cnk):
+        url, _ = urls.get(cnk)
+        headers = {"User-Agent": random.choice(USER_AGENTS)}
+        try:
+            resp = session.get(url, headers=headers, timeout=10)
+        except requests.RequestException:
+            return None  # Erreur réseau: la page reste indexée, le CNK est recherché
+        if resp.status_code in (404, 410):
+            urls.invalidate(cnk, gone=True)
+            return None
+        if resp.status_code != 200:
+            return None  # Blocage (403, 429) ou erreur serveur: la page reste indexée
+        res = extract.extract(
+            'medi_market', resp.content,
+            [('json-ld', lambda body: read_structured(cnk, body))],
+            lambda soup: read_product_dom(cnk, soup),
+            parser="html.parser",
+        )
+        if res:
+            urls.hit(cnk)
+        elif f'data-product-id="{cnk}"'.encode() not in resp.content:
+            urls.invalidate(cnk)  # Page d'un autre produit
+        return res
+    
+    def read_structured(cnk, body):
+        # Produit JSON-LD dont un identifiant (sku, url...) porte le CNK cherché
+        for product in extract.json_ld_products(body):
+            if product.mentions(cnk):
+                return [product.name, cnk, product.price]
+        return None
+    
+    def read_dom(cnk, soup):
         star_div = soup.find("div", class_="skeepers_product__stars",
                            attrs={"data-product-id": str(cnk)})
         if not star_div:
@@ -300,6 +603,20 @@ def scrape_medi_market(cnk_list):
         
         return [name, cnk, price]
     
+    def read_product_dom(cnk, soup):
+        # Page produit: avis Skeepers du CNK, titre h1, prix en méta Open Graph
+        if not soup.find(attrs={"data-product-id": str(cnk)}):
+            return None
+        h1 = soup.find("h1")
+        price_meta = soup.find("meta", attrs={"property": "product:price:amount"})
+        if not h1 or not price_meta:
+            return None
+        try:
+            price = float(str(price_meta.get("content", "")).replace(",", "."))
+        except ValueError:
+            return None
+        return [h1.get_text(strip=True), cnk, price]
+    
     def worker(queue, site_url, results, counter, counter_lock, total, phase, processed_cnks, processed_lock):
         while True:
             try:
@@ -321,10 +638,16 @@ def scrape_medi_market(cnk_list):
             
             if res:
                 name, cnk, price = res
-                print(f"✅ [{phase}] [{idx}/{total}] {name} – {price} €")
+                log(f"✅ [{phase}] [{idx}/{total}] {name} – {price} €")
                 results.append(res)
+                events.emit_lookup('medi_market', cnk, price)
+            elif phase == "Page connue":
+                log(f"🔗 [{phase}] [{idx}/{total}] {cnk} page périmée, recherche")
             else:
-                print(f"❌ [{phase}] [{idx}/{total}] {cnk} non trouvé")
+                log(f"❌ [{phase}] [{idx}/{total}] {cnk} non trouvé")
+                # Non trouvé définitivement après la phase Pharmacie (la dernière)
+                if phase == "Pharmacie":
+                    events.emit_lookup('medi_market', cnk)
             
             queue.task_done()
     
@@ -358,154 +681,233 @@ def scrape_medi_market(cnk_list):
         
         return results
     
+    # Phase 0: pages produit connues (sitemaps)
+    results_known = run_phase([cnk for cnk in cnk_list if urls.get(cnk)], None, "Page connue")
+    found_cnks = {r[1] for r in results_known}
+    
     # Phase 1: Parapharmacie
-    results_phase1 = run_phase(cnk_list, PARAPHARMACIE_SITE, "Parapharmacie")
+    results_phase1 = results_known + run_phase(
+        [cnk for cnk in cnk_list if cnk not in found_cnks], PARAPHARMACIE_SITE, "Parapharmacie"
+    )
     found_cnks = {r[1] for r in results_phase1}
     not_found = [cnk for cnk in cnk_list if cnk not in found_cnks]
     
     # Phase 2: Pharmacie (pour les non trouvés)
     results_phase2 = run_phase(not_found, PHARMACIE_SITE, "Pharmacie")
+    extract.print_summary('medi_market', "Medi-Market", log)
     
     all_results = results_phase1 + results_phase2
     
     # Créer dict CNK -> prix et CNK -> nom
     price_dict = {r[1]: r[2] for r in all_results}
     name_dict = {r[1]: r[0] for r in all_results}
+    if misses is not None:
+        misses.update(
+            cnk for cnk in cnk_list
+            if cnk not in price_dict and (PARAPHARMACIE_SITE, cnk) in absent and (PHARMACIE_SITE, cnk) in absent
+        )
     
-    print(f"\n✅ Medi-Market: {len(price_dict)}/{len(cnk_list)} CNKs trouvés")
+    log(f"\n✅ Medi-Market: {len(price_dict)}/{len(cnk_list)} CNKs trouvés")
     return price_dict, name_dict
 
 
-async def scrape_farmaline_async(cnk_list):
-    """Scrape Farmaline avec anti-détection + cache intelligent de catégories."""
-    print("\n" + "="*60)
-    print("🟢 PHASE 2: Scraping Farmaline (anti-détection + cache intelligent)")
-    print("="*60)
+async def scrape_farmaline_async(cnk_list, urls=None, misses=None):
+    """
+    Scrape Farmaline avec anti-détection + cache intelligent de catégories.
+    
+    Les catégories sont testées par taux de succès appris (global et par préfixe CNK,
+    persisté dans le cache entre les runs).
+    `urls` (cache.ProductUrls): pages produit connues, dont la catégorie est testée
+    en premier; mis à jour avec les pages trouvées ou disparues.
+    `misses` (set): reçoit les CNK dont l'absence est prouvée (toutes les catégories
+    testées ont répondu sans le produit, sans blocage ni timeout).
+    """
+    global _FARMALINE_CATEGORIES
+    log("\n" + "="*60)
+    log("🟢 PHASE 2: Scraping Farmaline (anti-détection + cache intelligent)")
+    log("="*60)
     
     import aiohttp
     from aiohttp_retry import RetryClient, ExponentialRetry
     
     BASE_URL = "https://www.farmaline.be"
-    CONCURRENT = 2  # Très conservateur pour éviter le blocage
+    CONCURRENT = shard_workers(2)  # Très conservateur pour éviter le blocage
+    
+    if urls is None:
+        urls = cache.ProductUrls('farmaline')
     
-    # Cache intelligent : mémorise la catégorie du dernier produit trouvé
-    # Format: {index_dans_liste: categorie}
-    last_category_cache = {}
+    # Catégories de secours si la page d'accueil n'est pas lisible
+    FALLBACK_CATEGORIES = ["sante", "bebe-maman", "beaute", "complement-alimentaire", "hygiene", "medicament"]
     
-    # Cache par préfixe CNK (pour produits similaires)
-    category_cache = {}
+    # Cache intelligent persistant : taux de succès des catégories (global et par préfixe CNK)
+    category_index = open_category_index()
+    category_stats = category_index.load_stats('farmaline') if category_index else cache.CategoryStats('farmaline')
+    
+    # Catégorie des produits trouvés pendant ce run: CNK -> categorie
+    found_categories = {}
     
     # Compteur pour ajouter des pauses longues périodiques
     request_count = [0]
     
-    async def scrape_product(client, cnk, cnk_index, categories, sem):
-        async with sem:
-            # Utiliser la rotation de headers réaliste
-            headers = rotate_headers()
-            headers["Referer"] = BASE_URL  # Ajouter referer pour plus de réalisme
-            
-            # OPTIMISATION INTELLIGENTE: Tester d'abord la catégorie du produit précédent
-            # (souvent les produits consécutifs sont dans la même catégorie/gamme)
-            priority_cats = []
-            
-            # 1. Catégorie du produit juste avant (index - 1)
-            if cnk_index > 0 and (cnk_index - 1) in last_category_cache:
-                prev_cat = last_category_cache[cnk_index - 1]
+    # Pages produit demandées (objectif: ~1 par CNK trouvé)
+    page_requests = [0]
+    extract.STATS.reset('farmaline')
+    
+    def read_structured(cnk, body):
+        """(nom, prix) du Product JSON-LD de la page (celui qui porte le CNK de préférence)."""
+        products = extract.json_ld_products(body)
+        product = next((p for p in products if p.mentions(cnk)), products[0] if products else None)
+        return (product.name, product.price) if product else None
+    
+    def read_dom(soup):
+        h1 = soup.find("h1")
+        name = h1.get_text(strip=True) if h1 else "N/A"
+        
+        price_div = soup.find(
+            "div",
+            class_="text-xl font-bold text-dark-brand desktop:ml-3.5",
+            attrs={"data-qa-id": "product-page-variant-details__display-price"}
+        )
+        if not price_div:
+            return None
+        price_str = price_div.get_text(strip=True).replace("€","").replace("\xa0","").replace(",",".")
+        try:
+            return name, float(price_str)
+        except ValueError:
+            return None
+    
+    async def scrape_product(client, cnk, cnk_index, categories):
+        # Utiliser la rotation de headers réaliste
+        headers = rotate_headers()
+        headers["Referer"] = BASE_URL  # Ajouter referer pour plus de réalisme
+        
+        # OPTIMISATION INTELLIGENTE: Tester d'abord les catégories les plus probables
+        priority_cats = []
+        
+        # 1. Page produit déjà connue (index des URLs, sitemap): lue telle quelle
+        known = urls.get(cnk)
+        known_url = known[0] if known else None
+        known_cat = None
+        if known_url:
+            match = re.search(r"/fr/([^/]+)/BE0", known_url)
+            known_cat = match.group(1) if match else None
+        
+        # 2. Préfixe CNK encore inconnu: catégorie du produit précédent
+        # (souvent les produits consécutifs sont dans la même catégorie/gamme)
+        if cnk_index > 0 and not category_stats.has_prefix(cnk):
+            prev_cat = found_categories.get(cnk_list[cnk_index - 1])
+            if prev_cat and prev_cat not in priority_cats:
                 priority_cats.append(prev_cat)
-                print(f"🎯 Farmaline [{cnk}] Test catégorie du produit précédent: {prev_cat}")
-            
-            # 2. Catégorie des produits similaires (même préfixe CNK)
-            if cnk[:3] in category_cache and category_cache[cnk[:3]] not in priority_cats:
-                similar_cat = category_cache[cnk[:3]]
-                priority_cats.append(similar_cat)
-            
-            # 3. Autres catégories (triées par longueur de nom = plus spécifiques d'abord)
-            sorted_cats = sorted(categories, key=lambda c: (len(c), c))
-            for cat in priority_cats:
-                if cat in sorted_cats:
-                    sorted_cats.remove(cat)
-            
-            # Catégories finales : prioritaires + autres
-            final_cats = priority_cats + sorted_cats
-            
-            # Pause longue tous les 20 produits pour éviter la détection
-            request_count[0] += 1
-            if request_count[0] % 20 == 0:
-                cooldown = random.uniform(10, 20)
-                print(f"⏸️  Pause de sécurité ({cooldown:.1f}s) après {request_count[0]} requêtes...")
-                await asyncio.sleep(cooldown)
-            
-            for idx, cat in enumerate(final_cats[:8]):  # Limiter à 8 catégories max
-                url = f"{BASE_URL}/fr/{cat}/BE0{cnk}/"
-                try:
-                    # Utiliser délai humain réaliste
-                    delay = human_like_delay()
-                    if idx > 0:  # Délai plus long après la première tentative
-                        delay += random.uniform(1, 2)
-                    
-                    await asyncio.sleep(delay)
-                    
-                    resp = await client.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=15))
-                    
-                    # Tracker les erreurs de blocage
-                    if resp.status == 403:
-                        log_blocking_error('farmaline', 403)
-                        print(f"⚠️ Farmaline [{cnk}] Erreur 403 - Blocage détecté")
-                        return None
-                    elif resp.status == 429:
-                        log_blocking_error('farmaline', 429)
-                        print(f"⚠️ Farmaline [{cnk}] Rate limit (429), pause de 60s...")
-                        await asyncio.sleep(60)
-                        continue
-                    
-                    if resp.status == 200:
-                        html = await resp.text()
-                        if "CNK" in html and "BE0" + cnk in html:  # Vérification plus stricte
-                            soup = BeautifulSoup(html, "lxml")
-                            h1 = soup.find("h1")
-                            name = h1.get_text(strip=True) if h1 else "N/A"
-                            
-                            price_div = soup.find(
-                                "div",
-                                class_="text-xl font-bold text-dark-brand desktop:ml-3.5",
-                                attrs={"data-qa-id": "product-page-variant-details__display-price"}
-                            )
-                            if price_div:
-                                price_str = price_div.get_text(strip=True).replace("€","").replace("\xa0","").replace(",",".")
-                                try:
-                                    price = float(price_str)
-                                    
-                                    # 🎯 CACHE INTELLIGENT: Mémoriser la catégorie de CE produit
-                                    last_category_cache[cnk_index] = cat
-                                    category_cache[cnk[:3]] = cat
-                                    
-                                    if priority_cats and cat == priority_cats[0]:  # Si trouvé dans catégorie du produit précédent
-                                        print(f"🎯✅ Farmaline [{cnk}] {name[:50]} – {price} € (catégorie précédente: {cat})")
-                                    else:
-                                        print(f"✅ Farmaline [{cnk}] {name[:50]} – {price} € (catégorie: {cat})")
-                                    
-                                    return cnk, name, price
-                                except:
-                                    pass
-                        return cnk, None, None
-                    elif resp.status == 403:  # Forbidden
-                        print(f"⚠️ Accès bloqué (403), pause de 60s...")
-                        await asyncio.sleep(60)
-                        return cnk, None, None
-                except asyncio.TimeoutError:
+                log(f"🎯 Farmaline [{cnk}] Test catégorie du produit précédent: {prev_cat}")
+        
+        # 3. Autres catégories par taux de succès appris (préfixe CNK, puis global),
+        # à égalité les plus spécifiques d'abord
+        final_cats = priority_cats + [
+            cat for cat in category_stats.rank(cnk, categories) if cat not in priority_cats
+        ]
+        attempts = [(cat, f"{BASE_URL}/fr/{cat}/BE0{cnk}/") for cat in final_cats]
+        if known_url:
+            attempts = [(known_cat, known_url)] + [
+                (cat, url) for cat, url in attempts if url != known_url and cat != known_cat
+            ]
+        
+        # Pause longue tous les 20 produits pour éviter la détection
+        request_count[0] += 1
+        if request_count[0] % 20 == 0:
+            cooldown = random.uniform(10, 20)
+            log(f"⏸️  Pause de sécurité ({cooldown:.1f}s) après {request_count[0]} requêtes...")
+            await polite_sleep_async(cooldown)
+        
+        # Absence prouvée seulement si chaque tentative a répondu (pas de 429, timeout...)
+        failed = False
+        for idx, (cat, url) in enumerate(attempts[:8]):  # Limiter à 8 catégories max
+            try:
+                # Utiliser délai humain réaliste
+                delay = human_like_delay()
+                if idx > 0:  # Délai plus long après la première tentative
+                    delay += random.uniform(1, 2)
+                delay = shard_delay(delay, 2)
+                
+                await polite_sleep_async(delay)
+                
+                page_requests[0] += 1
+                resp = await client.get(url, headers=headers, timeout=aiohttp.ClientTimeout(total=15))
+                
+                # Tracker les erreurs de blocage
+                if resp.status == 403:
+                    log_blocking_error('farmaline', 403)
+                    log(f"⚠️ Farmaline [{cnk}] Erreur 403 - Blocage détecté")
+                    return None
+                elif resp.status == 429:
+                    log_blocking_error('farmaline', 429)
+                    log(f"⚠️ Farmaline [{cnk}] Rate limit (429), pause de 60s...")
+                    failed = True
+                    await polite_sleep_async(60)
                     continue
-                except Exception as e:
-                    if "429" in str(e) or "403" in str(e):
-                        print(f"⚠️ Blocage détecté, pause de 60s...")
-                        await asyncio.sleep(60)
+                
+                if resp.status == 200:
+                    body = await resp.read()
+                    if b"CNK" in body and ("BE0" + cnk).encode() in body:  # Vérification plus stricte
+                        product = extract.extract(
+                            'farmaline', body,
+                            [('json-ld', lambda page: read_structured(cnk, page))],
+                            read_dom,
+                        )
+                        if product:
+                            name, price = product
+                            # 🎯 CACHE INTELLIGENT: Mémoriser la catégorie de CE produit
+                            # (échec pour les catégories testées avant)
+                            if cat:
+                                found_categories[cnk] = cat
+                                for missed, _ in attempts[:idx]:
+                                    if missed:
+                                        category_stats.record(cnk, missed, hit=False)
+                                category_stats.record(cnk, cat, hit=True)
+                            
+                            if url == known_url:
+                                urls.hit(cnk)
+                                log(f"🔗✅ Farmaline [{cnk}] {name[:50]} – {price} € (page connue)")
+                                return cnk, name, price
+                            urls.resolve(cnk, url, name)
+                            
+                            if idx == 0:  # Trouvé dès la première catégorie testée
+                                log(f"🎯✅ Farmaline [{cnk}] {name[:50]} – {price} € (1re catégorie: {cat})")
+                            else:
+                                log(f"✅ Farmaline [{cnk}] {name[:50]} – {price} € (catégorie: {cat})")
+                            
+                            return cnk, name, price
+                        # Page du produit mais illisible (sélecteur cassé): pas une absence
+                        log(f"⚠️ Farmaline [{cnk}] page produit illisible ({cat})")
                         return cnk, None, None
-                    continue
-            
-            print(f"❌ Farmaline [{cnk}] non trouvé")
-            return cnk, None, None
-    
+                    if url == known_url:  # Page connue redirigée ailleurs: essayer les catégories
+                        urls.invalidate(cnk)
+                        continue
+                    if misses is not None and not failed:
+                        misses.add(cnk)
+                    return cnk, None, None
+                elif resp.status in (404, 410):
+                    if url == known_url:  # Seule une page connue qui a répondu "absent" est retirée
+                        urls.invalidate(cnk, gone=True)
+                else:  # Erreur serveur: catégorie non vérifiée
+                    failed = True
+            except asyncio.TimeoutError:
+                failed = True
+                continue
+            except Exception as e:
+                if "429" in str(e) or "403" in str(e):
+                    log(f"⚠️ Blocage détecté, pause de 60s...")
+                    await polite_sleep_async(60)
+                    return cnk, None, None
+                failed = True
+                continue
+        
+        log(f"❌ Farmaline [{cnk}] non trouvé")
+        if misses is not None and not failed:
+            misses.add(cnk)
+        return cnk, None, None
+
     async def get_categories(client):
-        """Récupère les catégories simples avec cache."""
+        """Récupère les catégories simples depuis la page d'accueil ([] si illisible)."""
         try:
             # Utiliser rotation de headers
             headers = rotate_headers()
@@ -524,44 +926,68 @@ async def scrape_farmaline_async(cnk_list):
                             cats.append(cat)
             return cats[:12] if len(cats) > 12 else cats  # Limiter aux 12 premières
         except:
-            # Fallback : catégories hardcodées courantes
-            return ["sante", "bebe-maman", "beaute", "complement-alimentaire", "hygiene", "medicament"]
+            return []
     
     # Créer session avec timeouts optimisés et headers réalistes
     retry_options = ExponentialRetry(attempts=2, start_timeout=2, factor=2.0)
     timeout = aiohttp.ClientTimeout(total=30, connect=10)
     connector = aiohttp.TCPConnector(limit=CONCURRENT, ssl=False, force_close=False)
     
-    async with aiohttp.ClientSession(connector=connector, timeout=timeout) as session:
+    async with open_client_session(connector=connector, timeout=timeout) as session:
         retry_client = RetryClient(client_session=session, retry_options=retry_options, raise_for_status=False)
         
-        categories = await get_categories(retry_client)
-        print(f"📚 {len(categories)} catégories Farmaline détectées")
+        menu = _FARMALINE_CATEGORIES
+        if menu is None:
+            menu = category_index.categories('farmaline') if category_index else None
+            if not menu:
+                menu = await get_categories(retry_client)
+                if menu and category_index:
+                    category_index.store_categories('farmaline', menu)
+            # Seul un menu lu est gardé pour le processus: le repli est retenté au run suivant
+            _FARMALINE_CATEGORIES = menu or None
+        # Fallback : catégories hardcodées courantes
+        menu = menu or FALLBACK_CATEGORIES
+        # Catégories où des produits ont déjà été trouvés, même absentes du menu
+        categories = menu + [
+            cat for cat in category_stats.learned() if cat not in menu
+        ]
+        log(f"📚 {len(categories)} catégories Farmaline détectées")
         
-        sem = asyncio.Semaphore(CONCURRENT)
-        tasks = [scrape_product(retry_client, cnk, idx, categories, sem) for idx, cnk in enumerate(cnk_list)]
-        results = await asyncio.gather(*tasks, return_exceptions=True)
-    
-    # Filtrer les exceptions et extraire les noms
-    valid_results = []
-    names_dict = {}
-    for r in results:
-        if isinstance(r, tuple) and len(r) == 3:
-            cnk, name, price = r
-            valid_results.append((cnk, price))
-            if name:
-                names_dict[cnk] = name
-        elif isinstance(r, Exception):
-            print(f"⚠️ Erreur capturée: {r}")
-    
-    # Créer dict CNK -> prix
-    price_dict = {cnk: price for cnk, price in valid_results if price is not None}
+        # Fenêtre glissante: au plus CONCURRENT coroutines créées à la fois
+        price_dict = {}
+        names_dict = {}
+        async with aclosing(bounded_as_completed(
+            lambda item: scrape_product(retry_client, item[1], item[0], categories),
+            enumerate(cnk_list),
+            CONCURRENT,
+        )) as results:
+            async for r in results:
+                # Filtrer les exceptions et extraire les noms
+                if isinstance(r, tuple) and len(r) == 3:
+                    cnk, name, price = r
+                    if price is not None:
+                        price_dict[cnk] = price
+                    if name:
+                        names_dict[cnk] = name
+                    events.emit_lookup('farmaline', cnk, price)
+                elif isinstance(r, Exception):
+                    log(f"⚠️ Erreur capturée: {r}")
+    
+    if category_index:
+        try:
+            category_index.save_stats(category_stats)
+        except Exception as e:
+            log(f"⚠️ Statistiques de catégories: enregistrement impossible: {e}")
+        category_index.close()
     
-    print(f"\n✅ Farmaline: {len(price_dict)}/{len(cnk_list)} CNKs trouvés")
+    log(f"\n✅ Farmaline: {len(price_dict)}/{len(cnk_list)} CNKs trouvés")
+    extract.print_summary('farmaline', "Farmaline", log)
+    if price_dict:
+        log(f"  • {page_requests[0]} pages demandées ({page_requests[0] / len(price_dict):.2f} par CNK trouvé)")
     return price_dict, names_dict
 
 
-def scrape_newpharma(cnk_list, product_names, medi_names=None):
+def scrape_newpharma(cnk_list, product_names, medi_names=None, urls=None):
     """Scrape NewPharma avec cloudscraper pour contourner Cloudflare.
     
     Compare la qualité du match avec :
@@ -569,13 +995,18 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
     2. Le nom trouvé sur Medi-Market (medi_names) - optionnel
     
     Retourne les scores les plus élevés entre les deux sources.
+    
+    `urls` (cache.ProductUrls): pages produit connues, lues directement avant toute
+    recherche; mis à jour avec les pages des matchs fiables.
     """
-    print("\n" + "="*60)
-    print("🟡 PHASE 3: Scraping NewPharma (cloudscraper + anti-Cloudflare)")
-    print("="*60)
+    log("\n" + "="*60)
+    log("🟡 PHASE 3: Scraping NewPharma (cloudscraper + anti-Cloudflare)")
+    log("="*60)
     
     if medi_names is None:
         medi_names = {}
+    if urls is None:
+        urls = cache.ProductUrls('newpharma')
     
     # Ouvrir fichier de logging
     LOG_FILE = "/tmp/newpharma.log"
@@ -589,22 +1020,22 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
     
     log_to_file("🟡 Démarrage du scraping NewPharma")
     
-    from concurrent.futures import ThreadPoolExecutor, as_completed
+    from concurrent.futures import ThreadPoolExecutor
     
     # Importer cloudscraper pour contourner Cloudflare
     try:
         import cloudscraper
-        print("✅ cloudscraper chargé - Cloudflare bypass activé")
+        log("✅ cloudscraper chargé - Cloudflare bypass activé")
     except ImportError:
-        print("❌ cloudscraper non installé - Installation requise:")
-        print("   pip install cloudscraper")
+        log("❌ cloudscraper non installé - Installation requise:")
+        log("   pip install cloudscraper")
         return {}, {}
     
     # Importer rapidfuzz pour le calcul de similarité
     try:
         from rapidfuzz import fuzz
     except ImportError:
-        print("⚠️ rapidfuzz non installé, utilisation de matching simple")
+        log("⚠️ rapidfuzz non installé, utilisation de matching simple")
         class fuzz:
             @staticmethod
             def ratio(a, b):
@@ -621,16 +1052,81 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
                 total = len(words_a | words_b)
                 return (common / total * 100) if total > 0 else 0
     
-    # Créer un scraper cloudscraper qui contourne automatiquement Cloudflare
-    scraper = cloudscraper.create_scraper(
-        browser={
-            'browser': 'chrome',
-            'platform': 'windows',
-            'mobile': False
-        }
-    )
+    # Scraper cloudscraper partagé qui contourne automatiquement Cloudflare
+    scraper = get_cloudscraper()
     
-    MAX_WORKERS = 2  # Très conservateur pour éviter le blocage
+    MAX_WORKERS = shard_workers(2)  # Très conservateur pour éviter le blocage
+    
+    extract.STATS.reset('newpharma')
+    
+    def read_blocks(body):
+        """
+        Blocs produits ([(nom, prix)], lien) d'un résultat de recherche ou d'une page produit:
+        attributs data-google-360 et JSON-LD lus dans les octets, DOM en dernier recours.
+        """
+        def json_ld_blocks(page):
+            return [([(p.name, p.price)], p.url or None) for p in extract.json_ld_products(page)]
+        
+        def dom_blocks(soup):
+            blocks = []
+            for div in soup.find_all("div", attrs={"data-google-360": True}):
+                items = extract.google_360_items(div.get("data-google-360", ""))
+                if items:
+                    link = div.find("a", href=True) or div.find_parent("a", href=True)
+                    blocks.append((items, link["href"] if link else None))
+            return blocks
+        
+        return extract.extract(
+            'newpharma', body,
+            [('google-360', extract.google_360_blocks), ('json-ld', json_ld_blocks)],
+            dom_blocks,
+        )
+    
+    def score_names(item_name, product_name, medi_name):
+        """(score, source, score Medi-Market) du meilleur des deux noms recherchés."""
+        score = fuzz.ratio(product_name.lower(), item_name.lower())
+        score_medi = 0
+        source = "grid"
+        if medi_name and medi_name != "NA":
+            score_medi = fuzz.ratio(medi_name.lower(), item_name.lower())
+            if score_medi > score:
+                score = score_medi
+                source = "medi-market"
+        return score, source, score_medi
+    
+    def fetch_known_page(cnk, product_name, medi_name, headers):
+        """
+        Lit directement la page produit indexée du CNK.
+        Retourne le résultat si la page existe toujours et décrit le même produit,
+        None sinon (recherche par nom nécessaire).
+        """
+        url, indexed_name = urls.get(cnk)
+        log_to_file(f"[{cnk}] Page produit connue: {url}")
+        try:
+            resp = scraper.get(url, headers=headers, timeout=30)
+        except Exception as e:
+            log_to_file(f"[{cnk}] ⚠️ Page produit inaccessible: {type(e).__name__}")
+            return None
+        log_to_file(f"[{cnk}] Réponse page produit: Status {resp.status_code} ({len(resp.content)} bytes)")
+        if resp.status_code in (404, 410):
+            urls.invalidate(cnk, gone=True)
+            return None
+        if resp.status_code != 200:
+            return None
+        
+        for items, _ in read_blocks(resp.content):
+            for item_name, price in items:
+                if indexed_name and fuzz.ratio(indexed_name.lower(), item_name.lower()) < cache.URL_INDEX_MIN_SCORE:
+                    continue
+                score, source, _ = score_names(item_name, product_name, medi_name)
+                urls.hit(cnk)
+                log_to_file(f"[{cnk}] 🔗 Page produit valide: {item_name[:50]}... → {price}€ (score: {score:.0f}%)")
+                log(f"🔗 NewPharma [{cnk}] {product_name[:40]}... – {price} € (page connue, match: {score:.0f}%)")
+                return cnk, str(price), item_name, score
+        
+        log_to_file(f"[{cnk}] ⚠️ La page produit ne correspond plus, nouvelle recherche")
+        urls.invalidate(cnk)
+        return None
     
     def search_product(cnk, product_name, medi_name, retry=0):
         """Recherche un produit par nom sur NewPharma.
@@ -647,14 +1143,19 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
         
         try:
             # Utiliser délai humain réaliste
-            delay = human_like_delay()
+            delay = shard_delay(human_like_delay(), 2)
             log_to_file(f"[{cnk}] Délai anti-détection: {delay:.2f}s")
-            time.sleep(delay)
+            polite_sleep(delay)
             
             # Rotation de headers pour chaque requête
             headers = rotate_headers()
             headers["Referer"] = "https://www.newpharma.be/"
             
+            if retry == 0 and urls.get(cnk):
+                result = fetch_known_page(cnk, product_name, medi_name, headers)
+                if result:
+                    return result
+            
             q = quote_plus(product_name)
             url = f"https://www.newpharma.be/fr/search-results/search.html?q={q}"
             
@@ -674,36 +1175,35 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
                 log_blocking_error('newpharma', 403)
                 log_to_file(f"[{cnk}] ⚠️ Erreur 403 Forbidden (tentative {retry})")
                 if retry < 2:
-                    print(f"⚠️ NewPharma [{cnk}] Erreur 403, pause de 60s avant retry...")
-                    time.sleep(60)
+                    log(f"⚠️ NewPharma [{cnk}] Erreur 403, pause de 60s avant retry...")
+                    polite_sleep(60)
                     return search_product(cnk, product_name, medi_name, retry + 1)
                 else:
                     log_to_file(f"[{cnk}] ❌ Bloqué (403) après {retry} tentatives")
-                    print(f"⚠️ NewPharma [{cnk}] Bloqué (403) après {retry} tentatives")
+                    log(f"⚠️ NewPharma [{cnk}] Bloqué (403) après {retry} tentatives")
                     return cnk, None, None, 0
             
             if resp.status_code == 429:
                 log_blocking_error('newpharma', 429)
                 log_to_file(f"[{cnk}] ⚠️ Rate limit (429) (tentative {retry})")
                 if retry < 3:
-                    print(f"⚠️ NewPharma [{cnk}] Rate limit (429), pause de 90s...")
-                    time.sleep(90)
+                    log(f"⚠️ NewPharma [{cnk}] Rate limit (429), pause de 90s...")
+                    polite_sleep(90)
                     return search_product(cnk, product_name, medi_name, retry + 1)
                 else:
                     log_to_file(f"[{cnk}] ❌ Rate limit persistant après {retry} tentatives")
-                    print(f"⚠️ NewPharma [{cnk}] Rate limit persistant après {retry} tentatives")
+                    log(f"⚠️ NewPharma [{cnk}] Rate limit persistant après {retry} tentatives")
                     return cnk, None, None, 0
             
             if resp.status_code != 200:
                 log_to_file(f"[{cnk}] ❌ Status HTTP {resp.status_code}")
                 return cnk, None, None, 0
             
-            soup = BeautifulSoup(resp.content, "lxml")
-            divs = soup.find_all("div", attrs={"data-google-360": True})
+            blocks = read_blocks(resp.content)
             
-            log_to_file(f"[{cnk}] ✅ Trouvé {len(divs)} produits candidats")
+            log_to_file(f"[{cnk}] ✅ Trouvé {len(blocks)} produits candidats")
             
-            if not divs:
+            if not blocks:
                 log_to_file(f"[{cnk}] ❌ Aucun produit trouvé")
                 return cnk, None, None, 0
             
@@ -711,32 +1211,16 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
             best_score = 0
             best_name = None
             best_source = None
+            best_url = None
             
-            for idx, div in enumerate(divs):
-                raw = div.get("data-google-360", "")
-                try:
-                    data = json.loads(raw.replace("&quot;", '"'))
-                    items = data.get("ecommerce", {}).get("items", [])
-                except:
-                    continue
-                
-                for item in items:
-                    item_name = item.get("item_name")
-                    price = item.get("price")
-                    if not item_name or price is None:
-                        continue
-                    
-                    # Comparer contre le nom d'input
-                    score_input = fuzz.ratio(product_name.lower(), item_name.lower())
-                    
-                    # Comparer contre le nom Medi-Market si disponible
-                    score_medi = 0
-                    source = "grid"
-                    if medi_name and medi_name != "NA":
-                        score_medi = fuzz.ratio(medi_name.lower(), item_name.lower())
-                        if score_medi > score_input:
-                            score_input = score_medi
-                            source = "medi-market"
+            for items, href in blocks:
+                if href and len(items) == 1:
+                    urls.observe(items[0][0], urljoin("https://www.newpharma.be/", href), items[0][1])
+            
+            for idx, (items, href) in enumerate(blocks):
+                for item_name, price in items:
+                    # Comparer contre le nom d'input et le nom Medi-Market si disponible
+                    score_input, source, score_medi = score_names(item_name, product_name, medi_name)
                     
                     log_to_file(f"[{cnk}]   Candidat #{idx}: {item_name[:50]}...")
                     log_to_file(f"[{cnk}]      Prix: {price}€ | Score (grid): {score_input:.0f}%" + (f" | Score (Medi): {score_medi:.0f}%" if medi_name and medi_name != "NA" else ""))
@@ -746,6 +1230,7 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
                         best_match_price = price
                         best_name = item_name
                         best_source = source
+                        best_url = urljoin("https://www.newpharma.be/", href) if href else None
                     
                     # Si score parfait, pas besoin de chercher plus
                     if score_input >= 98:
@@ -765,7 +1250,9 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
                 
                 source_indicator = f" (src: {best_source})" if best_source else ""
                 log_to_file(f"[{cnk}] {indicator} MEILLEUR MATCH: {best_name[:50]}... → {best_match_price}€ (score: {best_score:.0f}%){source_indicator}")
-                print(f"{indicator} NewPharma [{cnk}] {product_name[:40]}... – {best_match_price} € (match: {best_score:.0f}%{source_indicator})")
+                log(f"{indicator} NewPharma [{cnk}] {product_name[:40]}... – {best_match_price} € (match: {best_score:.0f}%{source_indicator})")
+                if best_url and best_score >= cache.URL_INDEX_MIN_SCORE:
+                    urls.resolve(cnk, best_url, best_name)
                 return cnk, str(best_match_price), best_name, best_score
             
             log_to_file(f"[{cnk}] ❌ Aucun match acceptable trouvé")
@@ -773,42 +1260,46 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
             
         except Exception as e:
             log_to_file(f"[{cnk}] ❌ Exception: {type(e).__name__}: {str(e)[:100]}")
-            print(f"❌ NewPharma [{cnk}] Erreur: {type(e).__name__}")
+            log(f"❌ NewPharma [{cnk}] Erreur: {type(e).__name__}")
             return cnk, None, None, 0
     
-    # Préparer les tâches
-    tasks = []
-    for cnk in cnk_list:
-        name = product_names.get(cnk)
-        if name:
-            medi_name = medi_names.get(cnk)  # Peut être None
-            tasks.append((cnk, name, medi_name))
+    # Préparer les tâches (générées à la demande par la fenêtre glissante)
+    def iter_tasks():
+        for cnk in cnk_list:
+            name = product_names.get(cnk)
+            if name:
+                medi_name = medi_names.get(cnk)  # Peut être None
+                yield cnk, name, medi_name
     
-    if not tasks:
-        print("⚠️ Aucun nom de produit disponible pour NewPharma")
+    task_count = sum(1 for cnk in cnk_list if product_names.get(cnk))
+    
+    if not task_count:
+        log("⚠️ Aucun nom de produit disponible pour NewPharma")
         return {}, {}
     
-    print(f"🔍 {len(tasks)} CNK avec noms disponibles pour NewPharma")
+    log(f"🔍 {task_count} CNK avec noms disponibles pour NewPharma")
     
     results = {}
     match_scores = {}
     
     with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
-        futures = {executor.submit(search_product, cnk, name, medi_name): cnk for cnk, name, medi_name in tasks}
-        
         completed = 0
-        for future in as_completed(futures):
-            cnk, price, found_name, match_score = future.result()
+        for cnk, price, found_name, match_score in bounded_executor_map(
+            executor, lambda task: search_product(*task), iter_tasks(), MAX_WORKERS * 2
+        ):
             if price:
                 results[cnk] = price
                 match_scores[cnk] = match_score
+                events.emit_lookup('newpharma', cnk, price, match_score)
+            else:
+                events.emit_lookup('newpharma', cnk)
             completed += 1
             
             # Pause tous les 10 produits
-            if completed % 10 == 0 and completed < len(tasks):
+            if completed % 10 == 0 and completed < task_count:
                 pause = random.uniform(10, 20)
-                print(f"⏸️  Pause de sécurité ({pause:.1f}s)...")
-                time.sleep(pause)
+                log(f"⏸️  Pause de sécurité ({pause:.1f}s)...")
+                polite_sleep(pause)
     
     # Statistiques sur les scores de match
     if match_scores:
@@ -817,21 +1308,27 @@ def scrape_newpharma(cnk_list, product_names, medi_names=None):
         medium_quality = sum(1 for s in match_scores.values() if 70 <= s < 90)
         low_quality = sum(1 for s in match_scores.values() if s < 70)
         
-        print(f"\n📊 Qualité des correspondances NewPharma:")
-        print(f"  • Score moyen: {avg_score:.1f}%")
-        print(f"  • Haute qualité (≥90%): {high_quality}")
-        print(f"  • Qualité moyenne (70-89%): {medium_quality}")
-        print(f"  • Qualité faible (<70%): {low_quality}")
-    
-    print(f"\n✅ NewPharma: {len(results)}/{len(cnk_list)} CNKs trouvés")
+        log(f"\n📊 Qualité des correspondances NewPharma:")
+        log(f"  • Score moyen: {avg_score:.1f}%")
+        log(f"  • Haute qualité (≥90%): {high_quality}")
+        log(f"  • Qualité moyenne (70-89%): {medium_quality}")
+        log(f"  • Qualité faible (<70%): {low_quality}")
+    
+    log(f"\n✅ NewPharma: {len(results)}/{len(cnk_list)} CNKs trouvés")
+    extract.print_summary('newpharma', "NewPharma", log)
     return results, match_scores
 
 
-def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
-    """Scrape Multipharma en recherchant par nom de produit (grid et medi-market) - VERSION ASYNC."""
-    print("\n" + "="*60)
-    print("🟣 PHASE 4: Scraping Multipharma (ASYNC)")
-    print("="*60)
+def scrape_multipharma(cnk_list, product_names_grid, product_names_medi, urls=None):
+    """
+    Scrape Multipharma en recherchant par nom de produit (grid et medi-market) - VERSION ASYNC.
+    
+    `urls` (cache.ProductUrls): pages produit connues, lues directement avant toute
+    recherche; mis à jour avec les pages des matchs fiables.
+    """
+    log("\n" + "="*60)
+    log("🟣 PHASE 4: Scraping Multipharma (ASYNC)")
+    log("="*60)
     
     import asyncio
     import aiohttp
@@ -842,7 +1339,7 @@ def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
     try:
         from rapidfuzz import fuzz
     except ImportError:
-        print("⚠️ rapidfuzz non installé, utilisation de matching simple")
+        log("⚠️ rapidfuzz non installé, utilisation de matching simple")
         class fuzz:
             @staticmethod
             def ratio(a, b):
@@ -859,13 +1356,35 @@ def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
                 total = len(words_a | words_b)
                 return (common / total * 100) if total > 0 else 0
     
+    if urls is None:
+        urls = cache.ProductUrls('multipharma')
+    
     BASE_URL = "https://www.multipharma.be"
-    SEARCH_URL = f"{BASE_URL}/on/demandware.store/Sites-Multipharma-Webshop-BE-Site/fr_BE/Search-Show?q="
+    STORE_URL = f"{BASE_URL}/on/demandware.store/Sites-Multipharma-Webshop-BE-Site/fr_BE"
+    SEARCH_URL = f"{STORE_URL}/Search-Show?q="
+    
+    # Endpoints légers: fragment de grille limité aux premiers résultats, et JSON
+    # produit quand l'identifiant est connu (page produit indexée)
+    GRID_SIZE = 3
+    GRID_URL = f"{STORE_URL}/Search-UpdateGrid?start=0&sz={GRID_SIZE}&q="
+    PRODUCT_JSON_URL = f"{STORE_URL}/Product-Variation?quantity=1&pid="
+    
+    # Endpoints utilisables pendant ce run (désactivés au premier échec -> pages complètes)
+    light_endpoints = {'grid': True, 'json': True}
+    
+    # Réponses 4xx consécutives du JSON produit avant de le désactiver (identifiant .html
+    # refusé par Product-Variation: chaque page coûterait deux requêtes)
+    JSON_MAX_FAILURES = 3
+    json_failures = [0]
+    
+    # Volume reçu et temps d'analyse des recherches (requêtes en échec comprises)
+    transfer = {'lookups': 0, 'bytes': 0, 'parse': 0.0, 'failed': 0}
+    extract.STATS.reset('multipharma')
     
     # Configuration adaptive
-    INITIAL_WORKERS = 10  # Démarrage progressif
-    MAX_WORKERS = 30      # Monter jusqu'à 30 si tout va bien
-    RAMP_UP_STEP = 5      # Augmenter de 5 workers toutes les 10 requêtes réussies
+    INITIAL_WORKERS = shard_workers(10)  # Démarrage progressif
+    MAX_WORKERS = shard_workers(30)      # Monter jusqu'à 30 si tout va bien (part du shard)
+    RAMP_UP_STEP = shard_workers(5)      # Augmenter de 5 workers toutes les 10 requêtes réussies
     MIN_DELAY = 0.1       # Délai minimum très court
     MAX_DELAY = 0.5       # Délai maximum réduit
     ADAPTIVE_WINDOW = 20  # Fenêtre pour calcul des stats (dernières N requêtes)
@@ -903,7 +1422,7 @@ def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
             # Si erreurs, augmenter délais et réduire workers
             if error_code in [429, 403]:
                 self.current_delay = min(MAX_DELAY * 2, self.current_delay * 1.5)
-                self.current_workers = max(5, self.current_workers - RAMP_UP_STEP)
+                self.current_workers = max(min(5, INITIAL_WORKERS), self.current_workers - RAMP_UP_STEP)
         
         def get_delay(self):
             # Retourner un délai aléatoire dans la plage adaptée
@@ -911,17 +1430,213 @@ def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
     
     delay_manager = AdaptiveDelayManager()
     
+    def read_product(product):
+        """(nom, prix) d'une tuile de résultat ou d'une page produit, None si absents."""
+        found_name = None
+        name_selectors = [
+            "div.pdp-link",
+            "a.product-tile-title",
+            "h1.product-name",
+            "h2.product-name",
+            "div.product-name",
+            "a[class*='product-name']",
+            "h1",
+            "h2",
+        ]
+        
+        for selector in name_selectors:
+            name_elem = product.select_one(selector)
+            if name_elem:
+                found_name = name_elem.get_text(strip=True)
+                if found_name and len(found_name) > 5:  # Nom valide
+                    break
+        
+        price_selectors = [
+            "div.sales",
+            "span.sales",
+            "div.price",
+            "span.price",
+            "span.price-sales",
+            "div.price span.value",
+            "span[class*='price']",
+            "div[class*='price']",
+        ]
+        
+        for selector in price_selectors:
+            price_elem = product.select_one(selector)
+            if price_elem:
+                price_text = price_elem.get_text(strip=True)
+                price_text = price_text.replace("€", "").replace(",", ".").strip()
+                match = re.search(r"(\d+\.?\d*)", price_text)
+                if match:
+                    return found_name, match.group(1)
+        
+        return found_name, None
+    
+    def read_structured(body, page_url):
+        """(nom, prix, url) du premier Product JSON-LD de la réponse, None si absent."""
+        products = extract.json_ld_products(body)
+        if not products:
+            return None
+        product = products[0]
+        return product.name, str(product.price), urljoin(BASE_URL, product.url) if product.url else page_url
+    
+    def read_search_dom(soup, use_grid, page_url):
+        """(nom, prix, url) du premier résultat d'une recherche (ou de la page produit atteinte)."""
+        # Chercher le premier produit (le fragment de grille ne contient que des tuiles)
+        product = None
+        selectors = ["div.product-tile", "div.product"] if use_grid else [
+            "div.product-tile",
+            "div.product",
+            "div[class*='product']",
+            "article.product",
+            "li.product-tile",
+        ]
+        
+        for selector in selectors:
+            product = soup.select_one(selector)
+            if product:
+                break
+        
+        # Vérifier si redirection directe vers page produit
+        if not product and not use_grid:
+            product_page_indicators = [
+                "div.product-detail",
+                "div.product-info",
+                "div[class*='product-detail']",
+            ]
+            for indicator in product_page_indicators:
+                if soup.select_one(indicator):
+                    product = soup
+                    break
+        
+        if not product:
+            return None
+        
+        # Chercher le nom et le prix du produit trouvé
+        found_name, price = read_product(product)
+        if not price:
+            return None
+        
+        # URL de la page produit (lien de la tuile, ou page atteinte par redirection)
+        if product is soup:
+            return found_name, price, page_url
+        link = product.select_one("a[href]")
+        return found_name, price, urljoin(BASE_URL, link["href"]) if link else None
+    
+    async def fetch_product_json(session, cnk, url):
+        """
+        (nom, prix) depuis le JSON produit (identifiant = dernier segment de l'URL
+        .html), None si indisponible: la page produit complète est lue à la place.
+        """
+        match = re.search(r"/([^/?#]+)\.html", url)
+        if not match or not light_endpoints['json']:
+            return None
+        try:
+            async with session.get(
+                f"{PRODUCT_JSON_URL}{quote_plus(match.group(1))}",
+                headers={"Accept": "application/json", "X-Requested-With": "XMLHttpRequest"},
+                timeout=aiohttp.ClientTimeout(total=15),
+            ) as response:
+                status = response.status
+                body = await response.read()
+        except Exception:
+            transfer['failed'] += 1
+            return None
+        
+        transfer['lookups'] += 1
+        transfer['bytes'] += len(body)
+        if status != 200:
+            transfer['failed'] += 1
+            if 400 <= status < 500 and status != 429:
+                json_failures[0] += 1
+                if json_failures[0] >= JSON_MAX_FAILURES and light_endpoints['json']:
+                    light_endpoints['json'] = False
+                    log(f"⚠️ Multipharma: JSON produit refusé ({status}) {JSON_MAX_FAILURES} fois de suite, "
+                          f"lecture des pages produit")
+            return None
+        
+        start = time.perf_counter()
+        try:
+            product = json.loads(body).get("product") or {}
+            name = product.get("productName")
+            price = ((product.get("price") or {}).get("sales") or {}).get("value")
+        except (ValueError, AttributeError):
+            # Réponse non JSON: endpoint indisponible sur ce storefront
+            light_endpoints['json'] = False
+            transfer['failed'] += 1
+            log("⚠️ Multipharma: JSON produit indisponible, lecture des pages produit")
+            return None
+        transfer['parse'] += time.perf_counter() - start
+        json_failures[0] = 0
+        if not name or price is None:
+            return None
+        extract.STATS.record('multipharma', 'json')
+        return name, str(price)
+    
+    async def fetch_known_page(session, cnk, name_grid, name_medi):
+        """
+        Lit directement la page produit indexée du CNK (JSON produit si possible).
+        Retourne (prix, score, source, nom trouvé) si la page existe toujours et décrit
+        le même produit, None sinon (recherche par nom nécessaire).
+        """
+        url, indexed_name = urls.get(cnk)
+        await polite_sleep_async(shard_delay(delay_manager.get_delay(), 10))
+        product = await fetch_product_json(session, cnk, url)
+        if product:
+            found_name, price = product
+        else:
+            try:
+                async with session.get(url, timeout=aiohttp.ClientTimeout(total=15)) as response:
+                    if response.status in (404, 410):
+                        urls.invalidate(cnk, gone=True)
+                        return None
+                    if response.status != 200:
+                        return None
+                    html_content = await response.read()
+            except Exception as e:
+                log(f"⚠️ Multipharma [{cnk}] Page produit connue inaccessible: {type(e).__name__}")
+                return None
+            
+            start = time.perf_counter()
+            found = extract.extract(
+                'multipharma', html_content,
+                [('json-ld', lambda body: read_structured(body, url))],
+                lambda soup: read_search_dom(soup, False, url),
+            )
+            found_name, price = found[:2] if found else (None, None)
+            transfer['lookups'] += 1
+            transfer['bytes'] += len(html_content)
+            transfer['parse'] += time.perf_counter() - start
+        
+        if not price or not found_name or (
+            indexed_name and fuzz.ratio(indexed_name.lower(), found_name.lower()) < cache.URL_INDEX_MIN_SCORE
+        ):
+            urls.invalidate(cnk)
+            return None
+        
+        best_score, best_source = 0, None
+        for name, source in ((name_grid, "Fichier Source"), (name_medi, "MediMarket")):
+            if name and name.upper() != "NA":
+                score = fuzz.ratio(name.lower(), found_name.lower())
+                if score > best_score:
+                    best_score, best_source = score, source
+        urls.hit(cnk)
+        log(f"🔗 Multipharma [{cnk}] {found_name[:40]}... – {price} € (page connue, match: {best_score:.0f}%)")
+        return price, best_score, best_source, found_name
+    
     async def search_product(session, cnk, product_name, retry=0):
         """Recherche un produit par nom sur Multipharma (async)."""
         if not product_name or product_name.upper() == "NA":
-            return cnk, None, None, 0
+            return cnk, None, None, 0, None
         
         try:
             encoded_name = quote_plus(product_name)
-            search_url = f"{SEARCH_URL}{encoded_name}"
+            use_grid = light_endpoints['grid']
+            search_url = f"{GRID_URL if use_grid else SEARCH_URL}{encoded_name}"
             
             # Délai adaptatif
-            await asyncio.sleep(delay_manager.get_delay())
+            await polite_sleep_async(shard_delay(delay_manager.get_delay(), 10))
             
             start_time = time.time()
             async with session.get(search_url, timeout=aiohttp.ClientTimeout(total=15)) as response:
@@ -929,133 +1644,81 @@ def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
                 
                 if response.status == 429 and retry < 3:
                     delay_manager.record_error(429)
-                    await asyncio.sleep(random.uniform(30, 60))
+                    await polite_sleep_async(random.uniform(30, 60))
                     return await search_product(session, cnk, product_name, retry + 1)
                 
                 if response.status == 403 and retry < 2:
                     delay_manager.record_error(403)
-                    await asyncio.sleep(random.uniform(20, 40))
+                    await polite_sleep_async(random.uniform(20, 40))
                     return await search_product(session, cnk, product_name, retry + 1)
                 
                 if response.status != 200:
-                    return cnk, None, None, 0
+                    transfer['failed'] += 1
+                    if use_grid and response.status in (400, 404, 410, 500, 501):
+                        # Fragment de grille indisponible: pages de recherche complètes
+                        light_endpoints['grid'] = False
+                        log(f"⚠️ Multipharma: Search-UpdateGrid indisponible ({response.status}), retour à Search-Show")
+                        return await search_product(session, cnk, product_name, retry)
+                    return cnk, None, None, 0, None
                 
-                html_content = await response.text()
+                html_content = await response.read()
+                page_url = str(response.url)
                 delay_manager.record_success(response_time)
             
-            soup = BeautifulSoup(html_content, "lxml")
+            parse_start = time.perf_counter()
+            found = extract.extract(
+                'multipharma', html_content,
+                [('json-ld', lambda body: read_structured(body, page_url))],
+                lambda soup: read_search_dom(soup, use_grid, page_url),
+            )
+            transfer['lookups'] += 1
+            transfer['bytes'] += len(html_content)
+            transfer['parse'] += time.perf_counter() - parse_start
             
-            # Chercher le premier produit
-            product = None
-            selectors = [
-                "div.product-tile",
-                "div.product",
-                "div[class*='product']",
-                "article.product",
-                "li.product-tile",
-            ]
+            if not found:
+                return cnk, None, None, 0, None
+            found_name, price, product_url = found
+            urls.observe(found_name, product_url, price)
             
-            for selector in selectors:
-                products = soup.select(selector)
-                if products:
-                    product = products[0]
-                    break
+            # Calculer le score de correspondance
+            match_score = 0
+            if found_name:
+                match_score = fuzz.ratio(product_name.lower(), found_name.lower())
             
-            # Vérifier si redirection directe vers page produit
-            if not product:
-                product_page_indicators = [
-                    "div.product-detail",
-                    "div.product-info",
-                    "div[class*='product-detail']",
-                ]
-                for indicator in product_page_indicators:
-                    if soup.select(indicator):
-                        product = soup
-                        break
+            # Afficher avec indicateur de fiabilité
+            if match_score >= 90:
+                indicator = "✅"
+            elif match_score >= 70:
+                indicator = "⚠️"
+            else:
+                indicator = "❓"
             
-            if not product:
-                return cnk, None, None, 0
-            
-            # Chercher le nom du produit trouvé
-            found_name = None
-            name_selectors = [
-                "div.pdp-link",
-                "a.product-tile-title",
-                "h1.product-name",
-                "h2.product-name",
-                "div.product-name",
-                "a[class*='product-name']",
-                "h1",
-                "h2",
-            ]
-            
-            for selector in name_selectors:
-                name_elem = product.select_one(selector)
-                if name_elem:
-                    found_name = name_elem.get_text(strip=True)
-                    if found_name and len(found_name) > 5:  # Nom valide
-                        break
-            
-            # Calculer le score de correspondance
-            match_score = 0
-            if found_name:
-                match_score = fuzz.ratio(product_name.lower(), found_name.lower())
-            
-            # Chercher le prix
-            price_selectors = [
-                "div.sales",
-                "span.sales",
-                "div.price",
-                "span.price",
-                "span.price-sales",
-                "div.price span.value",
-                "span[class*='price']",
-                "div[class*='price']",
-            ]
-            
-            for selector in price_selectors:
-                price_elem = product.select_one(selector)
-                if price_elem:
-                    price_text = price_elem.get_text(strip=True)
-                    price_text = price_text.replace("€", "").replace(",", ".").strip()
-                    match = re.search(r"(\d+\.?\d*)", price_text)
-                    if match:
-                        price = match.group(1)
-                        
-                        # Afficher avec indicateur de fiabilité
-                        if match_score >= 90:
-                            indicator = "✅"
-                        elif match_score >= 70:
-                            indicator = "⚠️"
-                        else:
-                            indicator = "❓"
-                        
-                        print(f"{indicator} Multipharma [{cnk}] {product_name[:40]}... – {price} € (match: {match_score:.0f}%)")
-                        return cnk, price, found_name, match_score
-            
-            return cnk, None, None, 0
+            log(f"{indicator} Multipharma [{cnk}] {product_name[:40]}... – {price} € (match: {match_score:.0f}%)")
+            return cnk, price, found_name, match_score, product_url
             
         except asyncio.TimeoutError:
-            print(f"⏱️ Multipharma [{cnk}] Timeout")
-            return cnk, None, None, 0
+            log(f"⏱️ Multipharma [{cnk}] Timeout")
+            return cnk, None, None, 0, None
         except Exception as e:
-            print(f"❌ Multipharma [{cnk}] Erreur: {type(e).__name__}")
-            return cnk, None, None, 0
+            log(f"❌ Multipharma [{cnk}] Erreur: {type(e).__name__}")
+            return cnk, None, None, 0, None
     
-    # Préparer les tâches avec les deux sources de noms
-    tasks = []
-    for cnk in cnk_list:
-        name_grid = product_names_grid.get(cnk)
-        name_medi = product_names_medi.get(cnk)
-        # On a besoin d'au moins un nom pour chercher
-        if name_grid or name_medi:
-            tasks.append((cnk, name_grid, name_medi))
-    
-    if not tasks:
-        print("⚠️ Aucun nom de produit disponible pour Multipharma")
+    # Préparer les tâches avec les deux sources de noms (générées à la demande)
+    def iter_tasks():
+        for cnk in cnk_list:
+            name_grid = product_names_grid.get(cnk)
+            name_medi = product_names_medi.get(cnk)
+            # On a besoin d'au moins un nom pour chercher
+            if name_grid or name_medi:
+                yield cnk, name_grid, name_medi
+    
+    task_count = sum(1 for cnk in cnk_list if product_names_grid.get(cnk) or product_names_medi.get(cnk))
+    
+    if not task_count:
+        log("⚠️ Aucun nom de produit disponible pour Multipharma")
         return {}, {}, {}
     
-    print(f"🔍 {len(tasks)} CNK avec noms disponibles pour Multipharma")
+    log(f"🔍 {task_count} CNK avec noms disponibles pour Multipharma")
     
     results = {}
     match_scores = {}  # Stocker les scores de correspondance
@@ -1072,70 +1735,74 @@ def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
         
         timeout = aiohttp.ClientTimeout(total=15, connect=5)
         
-        async with aiohttp.ClientSession(
+        async with open_client_session(
             headers=HEADERS,
             connector=connector,
             timeout=timeout
         ) as session:
             
-            completed = 0
-            semaphore = asyncio.Semaphore(delay_manager.current_workers)
-            
-            async def process_product_with_semaphore(cnk, name_grid, name_medi):
-                """Traite un produit avec limitation de concurrence."""
-                async with semaphore:
-                    # Chercher avec le nom du grid
-                    best_price = None
-                    best_score = 0
-                    best_source = None
-                    best_found_name = None
-                    
-                    if name_grid:
-                        cnk_result, price, found_name, match_score = await search_product(session, cnk, name_grid)
-                        if price and match_score > best_score:
-                            best_price = price
-                            best_score = match_score
-                            best_source = "Fichier Source"
-                            best_found_name = found_name
-                    
-                    # Chercher avec le nom trouvé sur Medi-Market
-                    if name_medi:
-                        cnk_result, price, found_name, match_score = await search_product(session, cnk, name_medi)
-                        if price and match_score > best_score:
-                            best_price = price
-                            best_score = match_score
-                            best_source = "MediMarket"
-                            best_found_name = found_name
-                    
-                    # Garder le meilleur résultat
-                    if best_price:
-                        results[cnk] = best_price
-                        match_scores[cnk] = best_score
-                        match_sources[cnk] = best_source
-                    
-                    return cnk
-            
-            # Traiter par batches pour le ramp-up progressif
-            batch_size = 10
-            for i in range(0, len(tasks), batch_size):
-                batch = tasks[i:i + batch_size]
-                batch_tasks = [
-                    process_product_with_semaphore(cnk, name_grid, name_medi)
-                    for cnk, name_grid, name_medi in batch
-                ]
+            async def process_product(task):
+                """Traite un produit (double recherche Grid + MediMarket)."""
+                cnk, name_grid, name_medi = task
+                
+                best_price = None
+                best_score = 0
+                best_source = None
+                best_found_name = None
+                best_url = None
                 
-                # Attendre que le batch soit terminé
-                await asyncio.gather(*batch_tasks, return_exceptions=True)
-                completed += len(batch)
+                # Page produit déjà connue: pas de recherche si elle est toujours valide
+                known = await fetch_known_page(session, cnk, name_grid, name_medi) if urls.get(cnk) else None
+                if known:
+                    best_price, best_score, best_source, best_found_name = known
                 
-                # Ajuster dynamiquement le semaphore
-                semaphore = asyncio.Semaphore(delay_manager.current_workers)
+                # Chercher avec le nom du grid
+                if name_grid and not known:
+                    cnk_result, price, found_name, match_score, product_url = await search_product(session, cnk, name_grid)
+                    if price and match_score > best_score:
+                        best_price = price
+                        best_score = match_score
+                        best_source = "Fichier Source"
+                        best_found_name = found_name
+                        best_url = product_url
+                
+                # Chercher avec le nom trouvé sur Medi-Market
+                if name_medi and not known:
+                    cnk_result, price, found_name, match_score, product_url = await search_product(session, cnk, name_medi)
+                    if price and match_score > best_score:
+                        best_price = price
+                        best_score = match_score
+                        best_source = "MediMarket"
+                        best_found_name = found_name
+                        best_url = product_url
+                
+                if best_url and best_score >= cache.URL_INDEX_MIN_SCORE:
+                    urls.resolve(cnk, best_url, best_found_name)
+                
+                # Garder le meilleur résultat
+                if best_price:
+                    results[cnk] = best_price
+                    match_scores[cnk] = best_score
+                    match_sources[cnk] = best_source
+                    events.emit_lookup('multipharma', cnk, best_price, best_score, best_source)
+                else:
+                    events.emit_lookup('multipharma', cnk)
                 
-                # Pause périodique pour éviter la détection
-                if completed % 50 == 0 and completed < len(tasks):
-                    pause = random.uniform(1, 2)
-                    print(f"⏸️  Pause de sécurité ({pause:.1f}s) - Workers: {delay_manager.current_workers}, Delay: {delay_manager.current_delay:.2f}s")
-                    await asyncio.sleep(pause)
+                return cnk
+            
+            # Fenêtre glissante dont la taille suit le ramp-up adaptatif des workers
+            completed = 0
+            async with aclosing(bounded_as_completed(
+                process_product, iter_tasks(), lambda: delay_manager.current_workers
+            )) as processed:
+                async for _ in processed:
+                    completed += 1
+                    
+                    # Pause périodique pour éviter la détection
+                    if completed % 50 == 0 and completed < task_count:
+                        pause = random.uniform(1, 2)
+                        log(f"⏸️  Pause de sécurité ({pause:.1f}s) - Workers: {delay_manager.current_workers}, Delay: {delay_manager.current_delay:.2f}s")
+                        await polite_sleep_async(pause)
     
     # Exécuter la boucle async
     asyncio.run(process_all_products())
@@ -1151,46 +1818,78 @@ def scrape_multipharma(cnk_list, product_names_grid, product_names_medi):
         grid_count = sum(1 for s in match_sources.values() if s == "Fichier Source")
         medi_count = sum(1 for s in match_sources.values() if s == "MediMarket")
         
-        print(f"\n📊 Qualité des correspondances Multipharma:")
-        print(f"  • Score moyen: {avg_score:.1f}%")
-        print(f"  • Haute qualité (≥90%): {high_quality}")
-        print(f"  • Qualité moyenne (70-89%): {medium_quality}")
-        print(f"  • Qualité faible (<70%): {low_quality}")
-        print(f"\n📍 Sources des meilleurs matchs:")
-        print(f"  • Fichier Source: {grid_count}")
-        print(f"  • Nom MediMarket: {medi_count}")
-    
-    print(f"\n✅ Multipharma: {len(results)}/{len(cnk_list)} CNKs trouvés")
+        log(f"\n📊 Qualité des correspondances Multipharma:")
+        log(f"  • Score moyen: {avg_score:.1f}%")
+        log(f"  • Haute qualité (≥90%): {high_quality}")
+        log(f"  • Qualité moyenne (70-89%): {medium_quality}")
+        log(f"  • Qualité faible (<70%): {low_quality}")
+        log(f"\n📍 Sources des meilleurs matchs:")
+        log(f"  • Fichier Source: {grid_count}")
+        log(f"  • Nom MediMarket: {medi_count}")
+    
+    log(f"\n✅ Multipharma: {len(results)}/{len(cnk_list)} CNKs trouvés")
+    extract.print_summary('multipharma', "Multipharma", log)
+    if transfer['lookups']:
+        log(f"📦 Multipharma: {transfer['bytes'] / transfer['lookups'] / 1024:.1f} Ko et "
+              f"{transfer['parse'] / transfer['lookups'] * 1000:.1f} ms d'analyse par requête "
+              f"({'grille' if light_endpoints['grid'] else 'Search-Show'}"
+              f"{', JSON produit' if light_endpoints['json'] else ''})")
+    if transfer['failed']:
+        log(f"  • {transfer['failed']} requêtes en échec (non 200, réseau ou réponse illisible)")
     return results, match_scores, match_sources
 
 
-def consolidate_results(cnk_list, product_names, base_prices, medi_prices, medi_names, multipharma_prices, multipharma_scores, multipharma_sources, newpharma_prices, newpharma_scores, output_file):
-    """Fusionne les résultats des 3 sites dans un CSV unique."""
-    print("\n" + "="*60)
-    print("📊 CONSOLIDATION des résultats")
-    print("="*60)
+# Colonnes du CSV consolidé
+OUTPUT_COLUMNS = [
+    "Nom_Produit",
+    "CNK",
+    "Prix_Base",
+    "Prix_MediMarket",
+    "Prix_Multipharma",
+    "Prix_NewPharma",
+    "Match_MediMarket",
+    "Match_Multipharma",
+    "Match_Source_Multipharma",
+    "Match_NewPharma",
+    *STATS_COLUMNS
+]
+
+
+def iter_output_rows(grid_rows, table):
+    """Génère les lignes du CSV consolidé (une par ligne d'entrée) depuis la table de résultats.
     
-    rows = []
-    for cnk in cnk_list:
-        name = product_names.get(cnk, "")
-        base_price = base_prices.get(cnk, "NA")
-        medi_price = medi_prices.get(cnk, "NA")
-        multi_price = multipharma_prices.get(cnk, "NA")
-        newp_price = newpharma_prices.get(cnk, "NA")
+    Les colonnes de statistiques sont lues dans table.stats (voir compute_price_stats).
+    """
+    medi_col = table.site_index('medi_market')
+    multi_col = table.site_index('multipharma')
+    newp_col = table.site_index('newpharma')
+    
+    stats_values = [table.sheet_column(col) or [''] * len(table) for col in STATS_COLUMNS]
+    
+    for name, cnk, base_price in grid_rows:
+        i = table.index[cnk]
+        prices = table.prices[i].tolist()
+        scores = table.scores[i].tolist()
+        mean_price, min_price, median_price, spread, cheapest_site, base_gap = (col[i] for col in stats_values)
+        
+        # Prix absents (NaN) -> "NA"
+        medi_price = prices[medi_col] if prices[medi_col] == prices[medi_col] else "NA"
+        multi_price = prices[multi_col] if prices[multi_col] == prices[multi_col] else "NA"
+        newp_price = prices[newp_col] if prices[newp_col] == prices[newp_col] else "NA"
         
         # Scores de match (Medi-Market cherche par CNK donc toujours 100% si trouvé)
         medi_score = "100%" if medi_price != "NA" else ""
         
-        multi_score = multipharma_scores.get(cnk, "")
-        multi_score_str = f"{multi_score:.0f}%" if multi_score else ""
+        multi_score = scores[multi_col]
+        multi_score_str = f"{multi_score:.0f}%" if multi_score == multi_score and multi_score else ""
         
-        multi_source = multipharma_sources.get(cnk, "")
+        multi_source = SOURCE_LABELS[table.sources[i]]
         
-        newp_score = newpharma_scores.get(cnk, "")
-        newp_score_str = f"{newp_score:.0f}%" if newp_score else ""
+        newp_score = scores[newp_col]
+        newp_score_str = f"{newp_score:.0f}%" if newp_score == newp_score and newp_score else ""
         
         # Format numeric prices for CSV output using comma as decimal separator
-        rows.append([
+        yield [
             name,
             cnk,
             format_price_for_output(base_price),
@@ -1200,327 +1899,1720 @@ def consolidate_results(cnk_list, product_names, base_prices, medi_prices, medi_
             medi_score,
             multi_score_str,
             multi_source,
-            newp_score_str
-        ])
+            newp_score_str,
+            format_price_for_output(mean_price),
+            format_price_for_output(min_price),
+            format_price_for_output(median_price),
+            format_price_for_output(spread),
+            cheapest_site,
+            f"{base_gap * 100:+.1f}%".replace('.', ',') if base_gap != '' else ""
+        ]
+
+
+def sheet_event_rows(cnk_list, product_names, mappings):
+    """
+    (nom, cnk) de chaque ligne de feuille écrite (une par ligne référençant le CNK,
+    feuille par feuille), pour les événements row de --jsonl.
+    """
+    selected = set(cnk_list)
+    for cnk_to_rows in mappings:
+        for cnk, rows in cnk_to_rows.items():
+            if cnk in selected:
+                for _ in rows:
+                    yield product_names.get(cnk, ''), cnk
+
+
+def write_output_rows(writer, rows, stats):
+    """Écrit des lignes consolidées et met à jour les compteurs de couverture."""
+    for row in rows:
+        writer.writerow(row)
+        stats["total"] += 1
+        stats["medi"] += row[3] != "NA"
+        stats["multipharma"] += row[4] != "NA"
+        stats["newpharma"] += row[5] != "NA"
+
+
+def print_coverage_stats(stats, output_file):
+    """Affiche les statistiques de couverture du CSV consolidé."""
+    total = stats['total'] or 1
+    log(f"\n📈 Statistiques de couverture:")
+    log(f"  • Total CNK: {stats['total']}")
+    log(f"  • Medi-Market: {stats['medi']} ({stats['medi']/total*100:.1f}%)")
+    log(f"  • Multipharma: {stats['multipharma']} ({stats['multipharma']/total*100:.1f}%)")
+    log(f"  • NewPharma: {stats['newpharma']} ({stats['newpharma']/total*100:.1f}%)")
+    log(f"\n📦 Résultats consolidés → {output_file}")
+
+
+def consolidate_results(table, grid_rows, output_file):
+    """Fusionne les résultats des sites (table de résultats) dans un CSV unique.
+    
+    Une ligne est écrite pour chaque ligne d'entrée de `grid_rows` (nom, cnk, prix),
+    doublons compris, avec leur propre nom et prix de base.
+    """
+    log("\n" + "="*60)
+    log("📊 CONSOLIDATION des résultats")
+    log("="*60)
     
-    # Écrire le CSV
+    # Écrire le CSV (les lignes sont générées au fil de l'écriture)
+    stats = {"total": 0, "medi": 0, "multipharma": 0, "newpharma": 0}
     with open(output_file, "w", newline="", encoding="utf-8") as f:
         writer = csv.writer(f, delimiter=";")
-        writer.writerow([
-            "Nom_Produit", 
-            "CNK", 
-            "Prix_Base", 
-            "Prix_MediMarket", 
-            "Prix_Multipharma", 
-            "Prix_NewPharma",
-            "Match_MediMarket",
-            "Match_Multipharma",
-            "Match_Source_Multipharma",
-            "Match_NewPharma"
-        ])
-        writer.writerows(rows)
-    
-    # Statistiques
-    stats = {
-        "total": len(cnk_list),
-        "medi": sum(1 for row in rows if row[3] != "NA"),
-        "multipharma": sum(1 for row in rows if row[4] != "NA"),
-        "newpharma": sum(1 for row in rows if row[5] != "NA"),
-    }
+        writer.writerow(OUTPUT_COLUMNS)
+        write_output_rows(writer, iter_output_rows(grid_rows, table), stats)
     
-    print(f"\n📈 Statistiques de couverture:")
-    print(f"  • Total CNK: {stats['total']}")
-    print(f"  • Medi-Market: {stats['medi']} ({stats['medi']/stats['total']*100:.1f}%)")
-    print(f"  • Multipharma: {stats['multipharma']} ({stats['multipharma']/stats['total']*100:.1f}%)")
-    print(f"  • NewPharma: {stats['newpharma']} ({stats['newpharma']/stats['total']*100:.1f}%)")
-    print(f"\n📦 Résultats consolidés → {output_file}")
+    print_coverage_stats(stats, output_file)
 
 
-def main():
-    # Support -h/--help
-    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
-        print("Usage:")
-        print("  Mode fichier CSV:")
-        print("    python src/scraper.py [grid_file] [output_file]")
-        print("    python src/scraper.py --run")
-        print("")
-        print("  Mode Google Sheets:")
-        print("    python src/scraper.py --sheet <sheet_name>")
-        print("")
-        print("Exemples:")
-        print("  python src/scraper.py data/input/grid.csv data/output/resultats.csv")
-        print("  python src/scraper.py --sheet test_pharma_scrap")
-        sys.exit(0)
+# Sites du mode fichier CSV (NewPharma désactivé: bloque les requêtes avec 403)
+CSV_SITES = ('medi_market', 'multipharma')
 
-    # Defaults: data/input/grid.csv and timestamped output in data/output/
-    project_root = Path(__file__).parents[1]
-    default_input = project_root / "data" / "input" / "grid.csv"
-    default_output = project_root / "data" / "output" / f"resultats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
 
-    # Check for --sheet mode
-    sheet_mode = False
-    sheet_name = None
-    creds_path_arg = None
-    limit_arg = None
-    if "--sheet" in sys.argv:
-        sheet_mode = True
-        sheet_idx = sys.argv.index("--sheet")
-        if sheet_idx + 1 < len(sys.argv) and not sys.argv[sheet_idx + 1].startswith("--"):
-            sheet_name = sys.argv[sheet_idx + 1]
-        else:
-            print("❌ Erreur: --sheet nécessite un nom de Google Sheet")
-            print("Exemple: python src/scraper.py --sheet test_pharma_scrap")
-            sys.exit(1)
+# Cache des recherches (modifié par --cache / --negative-ttl / --no-cache; remplacé
+# par la copie enregistrée avec le run en --reparse / --replay)
+CACHE_SETTINGS = {
+    'enabled': True,
+    'path': cache.DEFAULT_CACHE_PATH,
+    'negative_ttl': cache.DEFAULT_NEGATIVE_TTL,
+}
 
-    # Optional: explicit credentials file path
-    if "--creds" in sys.argv:
-        creds_idx = sys.argv.index("--creds")
-        if creds_idx + 1 < len(sys.argv) and not sys.argv[creds_idx + 1].startswith("--"):
-            creds_path_arg = sys.argv[creds_idx + 1]
-        else:
-            print("❌ Erreur: --creds nécessite un chemin vers le fichier JSON des credentials")
-            sys.exit(1)
 
-    # Optional: limit number of CNKs to process (for quick tests)
-    if "--limit" in sys.argv:
-        limit_idx = sys.argv.index("--limit")
-        if limit_idx + 1 < len(sys.argv) and not sys.argv[limit_idx + 1].startswith("--"):
-            try:
-                limit_arg = int(sys.argv[limit_idx + 1])
-            except ValueError:
-                print("❌ Erreur: --limit nécessite un entier")
-                sys.exit(1)
-        else:
-            print("❌ Erreur: --limit nécessite un entier (ex: --limit 5)")
-            sys.exit(1)
+def open_negative_cache(site):
+    """Cache négatif pour un site à recherche par CNK, None si désactivé/inaccessible."""
+    if not CACHE_SETTINGS['enabled'] or site not in cache.NEGATIVE_CACHE_SITES:
+        return None
+    try:
+        return cache.NegativeCache(CACHE_SETTINGS['path'], ttl=CACHE_SETTINGS['negative_ttl'])
+    except Exception as e:
+        log(f"⚠️ Cache négatif indisponible ({CACHE_SETTINGS['path']}): {e}")
+        return None
 
-    if sheet_mode:
-        # Mode Google Sheets
-        print("="*60)
-        print("🚀 MASTER SCRAPER - Mode Google Sheets")
-        print("="*60)
-        print(f"📊 Google Sheet: {sheet_name}")
-        print(f"📋 Onglet: resultats_final")
-        
-        # Import du module Google Sheets
+
+def open_category_index():
+    """Catégories Farmaline persistées (cache.CategoryIndex), None si désactivé/inaccessible."""
+    if not CACHE_SETTINGS['enabled']:
+        return None
+    try:
+        return cache.CategoryIndex(CACHE_SETTINGS['path'])
+    except Exception as e:
+        log(f"⚠️ Cache des catégories indisponible ({CACHE_SETTINGS['path']}): {e}")
+        return None
+
+
+def load_product_urls(site, cnk_list):
+    """Pages produit connues (cache.ProductUrls) d'un site, None si désactivé/inaccessible."""
+    if not CACHE_SETTINGS['enabled'] or site not in cache.URL_INDEX_SITES:
+        return None
+    try:
+        with cache.UrlIndex(CACHE_SETTINGS['path']) as index:
+            return index.load(site, cnk_list)
+    except Exception as e:
+        log(f"⚠️ Index des URLs produit indisponible ({CACHE_SETTINGS['path']}): {e}")
+        return None
+
+
+# Catalogues locaux en mémoire, construits une fois par processus: (cache, site) -> Catalog
+_CATALOGS = {}
+
+
+def local_catalog(site):
+    """
+    Catalogue local du site (catalog.Catalog), chargé du cache au premier appel du
+    processus puis réutilisé (lots --stream, file de travail), None si indisponible.
+    """
+    key = (str(CACHE_SETTINGS['path']), site)
+    if key not in _CATALOGS:
         try:
-            # Add src directory to path if not already there
-            src_dir = Path(__file__).parent
-            if str(src_dir) not in sys.path:
-                sys.path.insert(0, str(src_dir))
-            
-            import google_sheets
-        except ImportError as e:
-            print(f"\n❌ Erreur: module google_sheets introuvable: {e}")
-            print("Installez les dépendances: pip install -r requirements.txt")
-            sys.exit(1)
-        
-        start_time = time.time()
-        
-        # Ouvrir la Google Sheet
+            with cache.ProductCatalog(CACHE_SETTINGS['path']) as store:
+                _CATALOGS[key] = catalog.Catalog(site, store.load(site))
+        except Exception as e:
+            log(f"⚠️ Catalogue local indisponible ({CACHE_SETTINGS['path']}): {e}")
+            return None
+    return _CATALOGS[key]
+
+
+def suggest_from_catalog(urls, cnk_list, product_names, medi_names):
+    """
+    Résout hors ligne, via le catalogue local du site, la page produit des CNK sans
+    page connue (noms du grid et de Medi-Market): ces pages sont lues directement,
+    la recherche réseau ne sert qu'aux produits jamais vus.
+    """
+    if urls.site not in catalog.CATALOG_SITES:
+        return
+    local = local_catalog(urls.site)
+    if local is None or not len(local):
+        return
+    for cnk in cnk_list:
+        if urls.get(cnk):
+            continue
+        match = local.match(cnk, [product_names.get(cnk), medi_names.get(cnk)])
+        if match:
+            _, entry = match
+            urls.suggest(cnk, entry.url, entry.name)
+    log(f"📖 {SITE_LABELS.get(urls.site, urls.site)}: {len(urls.suggested)} CNKs résolus par le catalogue local"
+          f" ({len(local)} produits)")
+
+
+def save_product_urls(urls):
+    """Enregistre les pages produit trouvées / périmées pendant le scraping d'un site."""
+    if urls.known:
+        log(f"🔗 {SITE_LABELS.get(urls.site, urls.site)}: {urls.direct_hits}/{len(urls.known)} pages produit connues lues directement"
+              f", {len(urls.stale)} périmées")
+    if urls.suggested:
+        confirmed = sum(1 for cnk in urls.suggested if cnk in urls.resolved)
+        log(f"📖 {SITE_LABELS.get(urls.site, urls.site)}: {confirmed}/{len(urls.suggested)} matchs du catalogue local confirmés")
+    try:
+        with cache.UrlIndex(CACHE_SETTINGS['path']) as index:
+            index.save(urls)
+    except Exception as e:
+        log(f"⚠️ Index des URLs produit: enregistrement impossible: {e}")
+    if urls.site in catalog.CATALOG_SITES:
         try:
-            # Pass explicit creds path when provided, otherwise google_sheets will fall back to env or default
-            spreadsheet = google_sheets.open_sheet(sheet_name, creds_path=creds_path_arg)
+            with cache.ProductCatalog(CACHE_SETTINGS['path']) as store:
+                store.save(urls, catalog.tokens)
         except Exception as e:
-            print(f"\n❌ Erreur lors de l'ouverture de la Google Sheet: {e}")
-            sys.exit(1)
-        
-        # Lire les CNK et les noms (colonne Nom_Produit) depuis la feuille
+            log(f"⚠️ Catalogue local: enregistrement impossible: {e}")
+        local = _CATALOGS.get((str(CACHE_SETTINGS['path']), urls.site))
+        if local is not None:
+            local.apply(urls)
+
+
+def scrape_site_into(table, site, cnk_list, product_names):
+    """
+    Scrape un site pour des CNK uniques et charge ses résultats dans la table.
+    Les noms Medi-Market déjà présents dans la table servent de clé de recherche
+    secondaire à NewPharma et Multipharma.
+    
+    Les CNK connus comme absents du site (cache négatif) ne sont pas recherchés;
+    les absences prouvées par le scraper (pas les erreurs réseau ni les blocages) et
+    les présences constatées mettent le cache à jour. Les pages produit
+    déjà connues (index des URLs) ou matchées dans le catalogue local sont lues
+    directement, sans recherche.
+    """
+    negative = open_negative_cache(site)
+    if negative is not None:
+        skipped = negative.absent(site, cnk_list)
+        if skipped:
+            log(f"\n🚫 {SITE_LABELS.get(site, site)}: {len(skipped)} CNKs connus comme absents (cache négatif) ignorés")
+            for cnk in skipped:
+                events.emit_lookup(site, cnk)
+            cnk_list = [cnk for cnk in cnk_list if cnk not in skipped]
+            table.set_site(site, {})
+    urls = load_product_urls(site, cnk_list) if cnk_list else None
+    if urls is not None:
+        suggest_from_catalog(urls, cnk_list, product_names, table.names_dict(cnk_list))
+    misses = set()
+    try:
+        if cnk_list:
+            _scrape_site(table, site, cnk_list, product_names, urls, misses)
+        if urls is not None:
+            save_product_urls(urls)
+        if negative is not None:
+            col = table.site_index(site)
+            found = [cnk for cnk in cnk_list if not np.isnan(table.prices[table.index[cnk], col])]
+            found_set = set(found)
+            missing = [cnk for cnk in cnk_list if cnk in misses and cnk not in found_set]
+            negative.record(site, missing, found)
+            unproven = len(cnk_list) - len(found) - len(missing)
+            if unproven:
+                log(f"  • {SITE_LABELS.get(site, site)}: {unproven} CNKs non trouvés sur erreur ou blocage"
+                      f" (non mémorisés comme absents)")
+    finally:
+        if negative is not None:
+            negative.close()
+
+
+# Mode --bulk: listings par marque pour les sites à recherche par nom
+BULK_SETTINGS = {
+    'enabled': False,
+    'min_score': bulk.BULK_MIN_SCORE,
+}
+
+
+def scrape_bulk(site, cnk_list, product_names, medi_names, urls=None):
+    """
+    Récolte les listings NewPharma / Multipharma par marque et matche hors ligne les
+    produits de chaque marque contre le catalogue obtenu.
+    
+    Returns:
+        (prix, scores, sources, CNK à rechercher individuellement: marques trop
+         petites, non détectées ou produits sans match suffisant)
+    """
+    names = {cnk: product_names.get(cnk) or medi_names.get(cnk) or '' for cnk in cnk_list}
+    groups, rest = bulk.group_by_brand(cnk_list, names)
+    if not groups:
+        return {}, {}, {}, list(cnk_list)
+    
+    label = SITE_LABELS.get(site, site)
+    log(f"\n📚 {label} (--bulk): {len(groups)} marques, {sum(len(c) for c in groups.values())} CNKs "
+          f"({len(rest)} recherchés individuellement)")
+    if site == 'newpharma':
         try:
-            cnk_list, cnk_to_row, cnk_to_name = google_sheets.read_cnks(
-                spreadsheet,
-                worksheet_name='resultats_final',
-                cnk_col='CNK',
-                name_col='Nom_Produit'
-            )
+            session = get_cloudscraper()
+        except ImportError:
+            log("❌ cloudscraper non installé - --bulk ignoré pour NewPharma")
+            return {}, {}, {}, list(cnk_list)
+        harvest = bulk.harvest_newpharma
+        sources = ("grid", "medi-market")
+    else:
+        session = get_http_session()
+        harvest = bulk.harvest_multipharma
+        sources = ("Fichier Source", "MediMarket")
+    
+    prices, scores, match_sources = {}, {}, {}
+    total_pages = 0
+    for brand, cnks in groups.items():
+        try:
+            harvested, pages = harvest(session, brand, pause=lambda: shard_delay(human_like_delay(), 2),
+                                     headers=rotate_headers())
         except Exception as e:
-            print(f"\n❌ Erreur lors de la lecture des CNK: {e}")
-            sys.exit(1)
-        
-        # Appliquer un limit si demandé
-        if limit_arg is not None:
-            cnk_list = cnk_list[:limit_arg]
-            # Rebuild cnk_to_row mapping for subset
-            cnk_to_row = {cnk: cnk_to_row[cnk] for cnk in cnk_list}
+            log(f"⚠️ {label} [{brand}] Listing inaccessible: {type(e).__name__}")
+            rest.extend(cnks)
+            continue
+        total_pages += pages
+        if urls is not None:
+            for candidate in harvested:
+                urls.observe(candidate.name, candidate.url, candidate.price)
+        queries = {
+            cnk: [(product_names.get(cnk), sources[0]), (medi_names.get(cnk), sources[1])]
+            for cnk in cnks
+        }
+        matches = bulk.match_catalog(harvested, queries, BULK_SETTINGS['min_score'])
+        for cnk in cnks:
+            if cnk not in matches:
+                rest.append(cnk)
+                continue
+            price, score, source, candidate = matches[cnk]
+            prices[cnk], scores[cnk], match_sources[cnk] = price, score, source
+            events.emit_lookup(site, cnk, price, score, source if site == 'multipharma' else None)
+            if urls is not None and candidate.url and score >= cache.URL_INDEX_MIN_SCORE:
+                urls.resolve(cnk, candidate.url, candidate.name)
+        log(f"  • {brand}: {len(harvested)} produits sur {pages} pages → {sum(c in matches for c in cnks)}/{len(cnks)} matchés")
+    
+    log(f"✅ {label} (--bulk): {len(prices)} CNKs matchés avec {total_pages} pages de listing, "
+          f"{len(rest)} à rechercher individuellement")
+    return prices, scores, match_sources, rest
 
-        # Pour Google Sheets, lire les noms de produit fournis dans la colonne 'Nom_Produit'
-        # (colonne A) et les utiliser comme source 'Grid' pour le fuzzy matching.
-        # read_cnks retourne maintenant (cnk_list, cnk_to_row, cnk_to_name)
-        # Use the names read from the sheet
-        product_names = cnk_to_name
 
-        base_prices = {cnk: "" for cnk in cnk_list}
-        
-        print(f"\n🔍 {len(cnk_list)} CNKs à traiter")
-        
-        # Phase 1: Scrape Medi-Market (retourne prix et noms)
-        medi_prices, medi_names = scrape_medi_market(cnk_list)
-        
-        # Phase 2: Scrape Farmaline (avec anti-détection) 🆕
-        farmaline_prices, farmaline_names = asyncio.run(scrape_farmaline_async(cnk_list))
-        
-        # Phase 3: Scrape NewPharma (avec anti-détection) 🆕
-        newpharma_prices, newpharma_scores = scrape_newpharma(cnk_list, product_names, medi_names)
-        
-        # Phase 4: Scrape Multipharma avec les noms trouvés sur Medi-Market
+def _scrape_site(table, site, cnk_list, product_names, urls=None, misses=None):
+    medi_names = table.names_dict(cnk_list)
+    
+    # --bulk: listings par marque d'abord, recherche individuelle pour le reste
+    if BULK_SETTINGS['enabled'] and site in ('newpharma', 'multipharma'):
+        prices, scores, sources, cnk_list = scrape_bulk(site, cnk_list, product_names, medi_names, urls)
+        table.set_site(site, prices, scores, sources if site == 'multipharma' else None)
+        if not cnk_list:
+            return
+    
+    # Phase 1: Scrape Medi-Market (retourne prix et noms)
+    if site == 'medi_market':
+        medi_prices, medi_names = scrape_medi_market(cnk_list, urls=urls, misses=misses)
+        table.set_site('medi_market', medi_prices)
+        table.set_names(medi_names)
+    
+    # Phase 2: Scrape Farmaline (avec anti-détection)
+    elif site == 'farmaline':
+        farmaline_prices, farmaline_names = asyncio.run(scrape_farmaline_async(cnk_list, urls=urls, misses=misses))
+        table.set_site('farmaline', farmaline_prices)
+    
+    # Phase 3: Scrape NewPharma (avec anti-détection)
+    elif site == 'newpharma':
+        newpharma_prices, newpharma_scores = scrape_newpharma(cnk_list, product_names, medi_names, urls=urls)
+        table.set_site('newpharma', newpharma_prices, newpharma_scores)
+    
+    # Phase 4: Scrape Multipharma avec les noms du grid ET les noms trouvés sur Medi-Market
+    elif site == 'multipharma':
         multipharma_prices, multipharma_scores, multipharma_sources = scrape_multipharma(
-            cnk_list, product_names, medi_names
+            cnk_list, product_names, medi_names, urls=urls
         )
-        
-        # Préparer les résultats pour Google Sheets
-        print("\n" + "="*60)
-        print("📊 PRÉPARATION des résultats pour Google Sheets")
-        print("="*60)
-        
-        def to_numeric(value):
-            """Convertit une valeur en float pour Google Sheets, ou retourne ''."""
-            if not value or value == "NA":
-                return ''
-            try:
-                # Si c'est déjà un nombre, le retourner
-                if isinstance(value, (int, float)):
-                    return float(value)
-                # Si c'est une string, la convertir
-                return float(str(value).replace(',', '.'))
-            except (ValueError, AttributeError):
-                return ''
-        
-        results = {}
-        for cnk in cnk_list:
-            source_val = multipharma_sources.get(cnk, '')
-            # Write source directly without "Source : " prefix
-            formatted_source = source_val if source_val else ''
-            
-            # Convertir les prix et scores en numériques
-            medi_price = to_numeric(medi_prices.get(cnk, ''))
-            farma_price = to_numeric(farmaline_prices.get(cnk, ''))
-            newp_price = to_numeric(newpharma_prices.get(cnk, ''))
-            multi_price = to_numeric(multipharma_prices.get(cnk, ''))
-            
-            multi_score = multipharma_scores.get(cnk, '')
-            newp_score = newpharma_scores.get(cnk, '')
-            
-            # Convertir les scores de pourcentage (0-100) en décimal (0-1)
-            if multi_score:
-                try:
-                    multi_score = float(multi_score) / 100.0
-                except (ValueError, TypeError):
-                    multi_score = ''
+        table.set_site('multipharma', multipharma_prices, multipharma_scores, multipharma_sources)
+
+
+def scrape_sites(cnk_list, product_names, sites=SITES, medi_names=None):
+    """
+    Exécute les phases de scraping des `sites` demandés pour des CNK uniques.
+    
+    Medi-Market passe en premier: les noms trouvés par CNK servent de clé de
+    recherche secondaire à NewPharma et Multipharma. Avec --workers N, les phases
+    sont réparties sur N processus via la file de travail SQLite.
+    
+    Args:
+        medi_names: noms Medi-Market déjà connus (CNK -> nom), clé secondaire quand
+                    Medi-Market n'est pas scrapé dans le même appel (mode daemon)
+    
+    Returns:
+        ResultTable remplie; appeler compute_price_stats après avoir chargé les prix de base
+    """
+    if QUEUE_SETTINGS['workers'] > 1:
+        return run_work_queue(cnk_list, product_names, sites, medi_names)
+    
+    table = ResultTable(cnk_list)
+    table.set_names(medi_names or {})
+    for site in SITES:
+        if site in sites:
+            scrape_site_into(table, site, cnk_list, product_names)
+    return table
+
+
+# File de travail multi-processus (modifié par --workers / --queue / --resume; une file
+# par shard par défaut avec --shard i/N)
+QUEUE_SETTINGS = {
+    'workers': 1,
+    'path': DEFAULT_QUEUE_PATH,
+    'resume': False,
+}
+
+
+def fork_available():
+    import multiprocessing
+    return 'fork' in multiprocessing.get_all_start_methods()
+
+
+def queue_worker(queue_path, worker_id, worker_count):
+    """
+    Processus worker: réclame des lots (site, CNK) dans la file, les scrape et écrit
+    les résultats, jusqu'à ce que la file soit vide.
+    """
+    # Chaque worker prend 1/N de la concurrence interne du shard (--shard i/M: 1/(M×N))
+    SHARD_SETTINGS['workers'] = worker_count
+    worker_id = lease_owner(worker_id)
+    with WorkQueue(queue_path) as queue:
+        while True:
+            claim = queue.claim(worker_id)
+            if claim is None:
+                if queue.remaining() == 0:
+                    break
+                time.sleep(queue.next_wait())
+                continue
             
-            if newp_score:
-                try:
-                    newp_score = float(newp_score) / 100.0
-                except (ValueError, TypeError):
-                    newp_score = ''
+            site, tasks = claim
+            cnks = [cnk for cnk, _, _ in tasks]
+            table = ResultTable(cnks)
+            table.set_names({cnk: medi_name for cnk, _, medi_name in tasks if medi_name})
+            try:
+                scrape_site_into(table, site, cnks, {cnk: name for cnk, name, _ in tasks if name})
+            except Exception as e:
+                log(f"⚠️ [{worker_id}] Erreur {site} ({len(cnks)} CNKs): {e}")
+                queue.release(worker_id, site, cnks)
+                continue
             
-            results[cnk] = {
-                'Prix_MediMarket': medi_price,
-                'Prix_Farmaline': farma_price,
-                'Prix_NewPharma': newp_price,
-                'Prix_Multipharma': multi_price,
-                'Match_Multipharma': multi_score if multi_score else '',  # Score en décimal (0-1)
-                'Match_NewPharma': newp_score if newp_score else '',  # Score en décimal (0-1)
-                'Match_Source_Multipharma': formatted_source,
-            }
-        
-        # Calculer Prix Moyen et Prix Min
-        results = google_sheets.calculate_stats(results)
+            col = table.site_index(site)
+            queue.complete(worker_id, site, [
+                (
+                    cnk,
+                    None if np.isnan(table.prices[i, col]) else float(table.prices[i, col]),
+                    None if np.isnan(table.scores[i, col]) else float(table.scores[i, col]),
+                    table.source(cnk) or None if site == 'multipharma' else None,
+                    table.names[i] or None if site == 'medi_market' else None,
+                )
+                for i, cnk in enumerate(cnks)
+            ])
+
+
+def run_work_queue(cnk_list, product_names, sites, medi_names=None):
+    """
+    Coordinateur: charge les tâches (site, CNK) dans la file SQLite, lance les workers,
+    relance ceux qui plantent tant qu'il reste du travail, puis relit les résultats.
+
+    Les workers sont démarrés par fork: ils héritent des réglages lus sur la ligne de
+    commande (shard, cache, --bulk, archive / cassette, sortie), qu'un processus démarré
+    par spawn réimporterait avec leurs valeurs par défaut.
+    """
+    import multiprocessing
+    
+    context = multiprocessing.get_context('fork')
+    workers = QUEUE_SETTINGS['workers']
+    with WorkQueue(QUEUE_SETTINGS['path']) as queue:
+        if not QUEUE_SETTINGS['resume']:
+            queue.reset()
+        # Débit de chaque site partagé entre les shards (1/N chacun, comme le daemon)
+        budgets = {site: rate / SHARD_SETTINGS['count'] for site, rate in QUEUE_RATE_BUDGETS.items()}
+        queue.load(cnk_list, product_names, sites, budgets=budgets, medi_names=medi_names)
+        counts = queue.counts()
+        log(f"\n🧵 File de travail: {sum(counts.values())} tâches (site, CNK), {workers} workers → {QUEUE_SETTINGS['path']}")
         
-        # Écrire dans Google Sheets
-        try:
-            google_sheets.write_results(
-                spreadsheet,
-                worksheet_name='resultats_final',
-                cnk_to_row=cnk_to_row,
-                results=results
+        def start_worker(n):
+            proc = context.Process(
+                target=queue_worker, args=(str(QUEUE_SETTINGS['path']), f"worker-{n}", workers), daemon=True
             )
-        except Exception as e:
-            print(f"\n❌ Erreur lors de l'écriture dans Google Sheets: {e}")
-            sys.exit(1)
+            proc.start()
+            return proc
         
-        # Afficher le rapport de blocage
-        print_blocking_report()
-        
-        elapsed = time.time() - start_time
-        print(f"\n⏱️ Temps total d'exécution: {elapsed:.2f}s ({elapsed/60:.2f} min)")
-        print(f"\n✅ Scraping terminé et résultats écrits dans Google Sheet!")
-        print(f"🔗 URL: {spreadsheet.url}")
+        procs = {n: start_worker(n) for n in range(1, workers + 1)}
+        restarts = 0
+        while procs:
+            time.sleep(2)
+            for n, proc in list(procs.items()):
+                if proc.is_alive():
+                    continue
+                del procs[n]
+                # Worker planté avec du travail restant: ses baux sont repris au prochain claim, on le remplace
+                if proc.exitcode != 0 and queue.remaining() and restarts < workers * MAX_ATTEMPTS:
+                    restarts += 1
+                    log(f"⚠️ worker-{n} arrêté (code {proc.exitcode}), redémarrage")
+                    procs[n] = start_worker(n)
         
-        return
-    
-    # Mode fichier CSV (comportement original)
-    run_flag = "--run" in sys.argv
-    # Collect positional args (ignore flags like --run, --sheet, etc.)
-    pos_args = [a for a in sys.argv[1:] if not a.startswith("--")]
+        counts = queue.counts()
+        log(f"🧵 File terminée: {counts['done']} tâches terminées, {counts['failed']} en échec")
+        if queue.remaining():
+            log(f"⚠️ {queue.remaining()} tâches non traitées (workers arrêtés)")
+        return queue.result_table(cnk_list, sites)
 
-    if len(pos_args) == 0:
-        # No positional args: show defaults and exit unless --run is provided
-        print("\n⚠️  Aucun fichier d'entrée fourni. Valeurs par défaut proposées:")
-        print(f"  • Input (par défaut): {default_input}")
-        print(f"  • Output (par défaut): {default_output}")
-        print("\nPour lancer le scraper avec ces valeurs, relancez avec --run:\n  python src/scraper.py --run\nou utilisez le script ./run_scraper.sh\n")
-        if run_flag:
-            grid_file = str(default_input)
-            output_file = str(default_output)
+
+def scrape_csv_sites(cnk_list, product_names):
+    """Phases du mode fichier (Medi-Market puis Multipharma) pour des CNK uniques."""
+    return scrape_sites(cnk_list, product_names, CSV_SITES)
+
+
+# Réglages de la validation post-consolidation (modifiés par les options CLI)
+REVIEW_SETTINGS = {
+    'max_ratio': validation.DEFAULT_MAX_RATIO,
+    'min_score': validation.DEFAULT_MIN_SCORE,
+    'recheck': False,
+}
+
+
+def review_path_for(output_file):
+    """Chemin de la liste "à vérifier" associée à un fichier de sortie."""
+    output_path = Path(output_file)
+    return str(output_path.with_name(f"{output_path.stem}_a_verifier.csv"))
+
+
+def recheck_flagged(table, reasons, product_names):
+    """
+    Re-scrape uniquement les (CNK, site) signalés et met à jour la table.
+    Pour les sites à recherche par nom, le nouveau résultat n'est gardé que si
+    son score de match est au moins aussi bon que l'ancien.
+    """
+    for j, site in enumerate(table.sites):
+        cnks = [table.cnks[i] for i in np.nonzero(reasons[:, j])[0].tolist()]
+        if not cnks:
+            continue
+        
+        log(f"\n🔁 Re-vérification {SITE_LABELS.get(site, site)}: {len(cnks)} CNKs signalés")
+        medi_names = table.names_dict(cnks)
+        scores = sources = None
+        if site == 'medi_market':
+            prices, _ = scrape_medi_market(cnks)
+        elif site == 'farmaline':
+            prices, _ = asyncio.run(scrape_farmaline_async(cnks))
+        elif site == 'newpharma':
+            prices, scores = scrape_newpharma(cnks, product_names, medi_names)
+        elif site == 'multipharma':
+            prices, scores, sources = scrape_multipharma(cnks, product_names, medi_names)
         else:
-            sys.exit(0)
-    elif len(pos_args) == 1:
-        grid_file = pos_args[0]
-        output_file = str(default_output)
-    else:
-        grid_file = pos_args[0]
-        output_file = pos_args[1]
-    
-    # Vérifier que le fichier grid existe
-    if not os.path.exists(grid_file):
-        print(f"❌ Erreur: fichier grid '{grid_file}' introuvable")
-        sys.exit(1)
+            continue
+        
+        if scores is not None:
+            previous = {cnk: table.score(cnk, site) for cnk in prices}
+            keep = [cnk for cnk in prices if scores.get(cnk, 0) >= np.nan_to_num(previous[cnk])]
+            prices = {cnk: prices[cnk] for cnk in keep}
+            scores = {cnk: scores[cnk] for cnk in keep if cnk in scores}
+            if sources is not None:
+                sources = {cnk: sources[cnk] for cnk in keep if cnk in sources}
+        
+        table.set_site(site, prices, scores, sources)
+
+
+def review_results(table, product_names, review_file, append=False):
+    """
+    Signale les prix douteux (score faible, écart à la médiane ou au Prix_Base),
+    relance optionnellement les seuls (CNK, site) concernés puis écrit la liste "à vérifier".
     
-    print("="*60)
-    print("🚀 MASTER SCRAPER - 2 Sites Pharma")
-    print("="*60)
-    print(f"📋 Grid file: {grid_file}")
-    print(f"📁 Output: {output_file}")
+    Returns:
+        Liste des validation.ReviewEntry restantes
+    """
+    reasons = validation.flag_for_review(
+        table, max_ratio=REVIEW_SETTINGS['max_ratio'], min_score=REVIEW_SETTINGS['min_score']
+    )
     
-    start_time = time.time()
+    if REVIEW_SETTINGS['recheck'] and reasons.any():
+        log(f"\n🔎 {int(np.count_nonzero(reasons))} prix signalés → re-vérification ciblée")
+        recheck_flagged(table, reasons, product_names)
+        compute_price_stats(table)
+        reasons = validation.flag_for_review(
+            table, max_ratio=REVIEW_SETTINGS['max_ratio'], min_score=REVIEW_SETTINGS['min_score']
+        )
     
-    # Lire les données depuis le fichier grid
-    product_names, cnk_list, base_prices = read_grid_file(grid_file)
+    entries = validation.review_entries(table, reasons)
+    if entries:
+        validation.write_review_list(entries, review_file, append=append)
+        log(f"\n🔎 {len(entries)} prix à vérifier ({len({e.cnk for e in entries})} CNKs) → {review_file}")
+    else:
+        log("\n✅ Aucun prix à vérifier")
+    return entries
+
+
+# Historique des prix (modifié par --history / --no-history)
+HISTORY_SETTINGS = {
+    'enabled': True,
+    'path': DEFAULT_HISTORY_PATH,
+}
+
+
+def open_history(mode, label=''):
+    """
+    Ouvre l'historique des prix et démarre une exécution.
     
-    if not cnk_list:
-        print("❌ Aucun CNK trouvé dans le fichier grid")
+    Returns:
+        (HistoryStore, run_id), ou (None, None) si l'historique est désactivé/inaccessible
+    """
+    if not HISTORY_SETTINGS['enabled']:
+        return None, None
+    try:
+        store = HistoryStore(HISTORY_SETTINGS['path'])
+        run_id = store.start_run(mode, label)
+        return store, run_id
+    except Exception as e:
+        log(f"⚠️ Historique indisponible ({HISTORY_SETTINGS['path']}): {e}")
+        return None, None
+
+
+def record_history(store, run_id, table):
+    """Ajoute les résultats d'une table à l'historique (observations inchangées dédupliquées)."""
+    if store is None:
+        return
+    try:
+        added, unchanged = store.record_table(run_id, table)
+        log(f"🗄️  Historique (run #{run_id}): {added} changements enregistrés, {unchanged} inchangés")
+    except Exception as e:
+        log(f"⚠️ Erreur lors de l'écriture de l'historique: {e}")
+
+
+def print_changes(history_path, run_id=None):
+    """Affiche les changements de prix enregistrés par la dernière exécution."""
+    if not Path(history_path).exists():
+        log(f"❌ Historique introuvable: {history_path}")
         sys.exit(1)
     
-    print(f"\n🔍 {len(cnk_list)} CNKs à traiter")
+    with HistoryStore(history_path) as store:
+        run_id = run_id or store.last_run_id()
+        changes = store.changes_since_last_run(run_id)
     
-    # Phase 1: Scrape Medi-Market (retourne prix et noms)
-    medi_prices, medi_names = scrape_medi_market(cnk_list)
+    log("="*60)
+    log(f"🗄️  CHANGEMENTS DE PRIX - run #{run_id}")
+    log("="*60)
     
-    # Phase 2: Scrape Multipharma avec les noms du grid ET les noms trouvés sur Medi-Market
-    multipharma_prices, multipharma_scores, multipharma_sources = scrape_multipharma(cnk_list, product_names, medi_names)
+    if not changes:
+        log("✅ Aucun changement depuis l'exécution précédente")
+        return
     
-    # NewPharma désactivé (bloque les requêtes avec 403)
-    newpharma_prices = {}
-    newpharma_scores = {}
+    def fmt(price):
+        return "—" if price is None else f"{price:.2f} €"
+    
+    for change in changes:
+        label = SITE_LABELS.get(change.site, change.site)
+        if change.old_price is None:
+            icon = "🆕"
+        elif change.new_price is None:
+            icon = "🚫"
+        elif change.new_price < change.old_price:
+            icon = "📉"
+        elif change.new_price > change.old_price:
+            icon = "📈"
+        else:
+            icon = "🔁"
+        log(f"{icon} [{change.cnk}] {label}: {fmt(change.old_price)} → {fmt(change.new_price)}")
     
-    # Consolidation finale
-    consolidate_results(
-        cnk_list, 
-        product_names, 
-        base_prices, 
-        medi_prices,
-        medi_names,
-        multipharma_prices, 
-        multipharma_scores,
-        multipharma_sources,
-        newpharma_prices,
-        newpharma_scores,
-        output_file
-    )
+    log(f"\n📊 {len(changes)} changement(s)")
+
+
+# Archive des réponses brutes (modifié par --archive / --archive-dir / --reparse)
+ARCHIVE_SETTINGS = {
+    'enabled': False,
+    'path': archive.DEFAULT_ARCHIVE_DIR,
+    'reparse': None,   # run archivé à relire
+}
+
+
+def setup_archive():
+    """
+    Branche l'archive des réponses sur le transport HTTP de tous les scrapers:
+    enregistrement d'un nouveau run (--archive, avec une copie du cache), ou relecture
+    d'un run archivé (--reparse) sans réseau ni pauses, sur la copie du cache du run et
+    sans historique (les prix relus ne sont pas des observations nouvelles).
+    """
+    global _HTTP_STORE
+    reparse = ARCHIVE_SETTINGS['reparse']
+    if not ARCHIVE_SETTINGS['enabled'] and reparse is None:
+        return
+    try:
+        store = archive.ResponseArchive(ARCHIVE_SETTINGS['path'])
+        info = store.open_run(reparse) if reparse is not None else None
+    except KeyError:
+        log(f"❌ Erreur: run #{reparse} absent de l'archive {ARCHIVE_SETTINGS['path']}")
+        runs = store.runs()
+        if runs:
+            log("   Runs archivés récents:")
+            for run_id, started_at, command, responses in runs:
+                log(f"   #{run_id}  {datetime.fromtimestamp(started_at):%Y-%m-%d %H:%M}  {responses} réponses  {command}")
+        sys.exit(1)
+    except Exception as e:
+        log(f"❌ Erreur: archive indisponible ({ARCHIVE_SETTINGS['path']}): {e}")
+        sys.exit(1)
+    
+    if info is not None:
+        enter_replay_mode(store)
+        sites = ", ".join(f"{SITE_LABELS.get(site, site)} {count}" for site, count in sorted(info['sites'].items()))
+        log(f"🗃️  Relecture du run archivé #{reparse} ({datetime.fromtimestamp(info['started_at']):%Y-%m-%d %H:%M}"
+              f": {info['command']}) - aucune requête réseau")
+        log(f"   Réponses archivées: {sites or 'aucune'}")
+        replay_cache(store, info['started_at'])
+    else:
+        run_id = store.start_run(" ".join(sys.argv[1:]))
+        snapshot_cache(store)
+        log(f"🗃️  Archive des réponses: run #{run_id} → {ARCHIVE_SETTINGS['path']}")
+    _HTTP_STORE = store
+    atexit.register(close_archive)
+
+
+def close_archive():
+    """Résumé de l'archive (ou de la relecture) en fin d'exécution."""
+    store = _HTTP_STORE
+    if store is None:
+        return
+    if store.replaying:
+        log(f"🗃️  Relecture: {store.replayed} réponses archivées servies, "
+              f"{store.missed} requêtes sans réponse archivée (traitées comme inaccessibles)")
+        if store.latency:
+            log(f"   Latence enregistrée réimposée: {store.waited:.1f}s cumulées")
+    else:
+        counts = store.site_counts(store.run_id)
+        sites = ", ".join(f"{SITE_LABELS.get(site, site)} {count}" for site, count in sorted(counts.items()))
+        log(f"🗃️  Archive run #{store.run_id}: {sum(counts.values())} réponses ({sites or 'aucune'})"
+              f", {store.stored_bytes / 1024:.0f} Ko compressés ajoutés"
+              f" - relecture: --reparse {store.run_id}")
+    store.close()
+
+
+def enter_replay_mode(store):
+    """
+    Relecture (--reparse, --replay): pas de pauses de politesse, pas d'historique (les
+    prix relus ne sont pas des observations nouvelles), latences enregistrées
+    réimposées si --replay-latency.
+    """
+    PACING_SETTINGS['enabled'] = False
+    HISTORY_SETTINGS['enabled'] = False
+    store.latency = 1.0 if CASSETTE_SETTINGS['latency'] else 0.0
+
+
+def snapshot_cache(store):
+    """
+    Enregistrement: copie du cache prise au début du run et gardée avec ses réponses,
+    pour que la relecture parte du même état (rien si le cache est désactivé).
+    """
+    if not CACHE_SETTINGS['enabled']:
+        return
+    try:
+        store.store_cache(cache.snapshot(CACHE_SETTINGS['path']))
+    except Exception as e:
+        log(f"⚠️ Copie du cache impossible ({CACHE_SETTINGS['path']}): {e} - relecture sans cache")
+
+
+def replay_cache(store, recorded_at):
+    """
+    Relecture: le cache est remplacé par la copie enregistrée avec le run, dans un
+    fichier temporaire modifiable comme pendant le run d'origine (supprimé en fin
+    d'exécution), horloge des expirations ramenée à la date d'enregistrement. Le
+    cache réel n'est ni lu ni modifié. Run enregistré sans cache: relecture sans cache.
+    """
+    if not CACHE_SETTINGS['enabled']:
+        return
+    data = store.cache_snapshot()
+    if data is None:
+        CACHE_SETTINGS['enabled'] = False
+        log("   Cache: aucun (run enregistré sans cache)")
+        return
+    path = TEMP_DIR / f"cache_replay_{os.getpid()}.sqlite3"
+    remove_replay_cache(path)
+    if data:
+        path.write_bytes(data)
+    CACHE_SETTINGS['path'] = path
+    cache.CLOCK['offset'] = max(0.0, time.time() - recorded_at)
+    atexit.register(remove_replay_cache, path)
+    log(f"   Cache: copie enregistrée avec le run ({len(data) / 1024:.0f} Ko)")
+
+
+def remove_replay_cache(path):
+    for suffix in ('', '-wal', '-shm'):
+        Path(f"{path}{suffix}").unlink(missing_ok=True)
+
+
+# Cassette HTTP d'un run complet (modifié par --record / --replay / --replay-latency)
+CASSETTE_SETTINGS = {
+    'record': None,    # cassette à enregistrer
+    'replay': None,    # cassette à rejouer
+    'latency': False,  # réimposer les durées enregistrées en relecture
+}
+
+
+def setup_cassette():
+    """
+    Branche une cassette sur le transport HTTP de tous les scrapers: enregistrement
+    ordonné de chaque échange avec sa durée et d'une copie du cache (--record), ou
+    relecture du run sans réseau sur cette copie (--replay), avec ses latences
+    d'origine si --replay-latency.
+    """
+    global _HTTP_STORE
+    path = CASSETTE_SETTINGS['record'] or CASSETTE_SETTINGS['replay']
+    if not path:
+        return
+    try:
+        store = cassette.Cassette(path)
+        if CASSETTE_SETTINGS['replay']:
+            info = store.open_replay()
+        else:
+            store.record_to(" ".join(sys.argv[1:]))
+            info = None
+    except FileNotFoundError:
+        log(f"❌ Erreur: cassette introuvable: {path}")
+        sys.exit(1)
+    except Exception as e:
+        log(f"❌ Erreur: cassette inutilisable ({path}): {e}")
+        sys.exit(1)
+    
+    if info is not None:
+        enter_replay_mode(store)
+        sites = ", ".join(f"{SITE_LABELS.get(site, site)} {count} ({seconds:.1f}s)"
+                          for site, (count, seconds) in sorted(info['sites'].items()))
+        mode = "latences d'origine réimposées" if store.latency else "réponses immédiates"
+        log(f"📼 Relecture de la cassette {path} ({datetime.fromtimestamp(info['recorded_at']):%Y-%m-%d %H:%M}"
+              f": {info['command']}) - aucune requête réseau, {mode}")
+        log(f"   Échanges enregistrés: {sites or 'aucun'}")
+        replay_cache(store, info['recorded_at'])
+    else:
+        snapshot_cache(store)
+        log(f"📼 Enregistrement de la cassette → {path}")
+    _HTTP_STORE = store
+    atexit.register(close_cassette)
+
+
+def close_cassette():
+    """Résumé de la cassette (enregistrement ou relecture) en fin d'exécution."""
+    store = _HTTP_STORE
+    if store is None:
+        return
+    if store.replaying:
+        log(f"📼 Relecture: {store.replayed} réponses servies ({store.repeated} répétées au-delà de "
+              f"l'enregistrement), {store.missed} requêtes absentes de la cassette (traitées comme inaccessibles)")
+        if store.latency:
+            log(f"   Latence enregistrée réimposée: {store.waited:.1f}s cumulées")
+    else:
+        log(f"📼 Cassette {store.path}: {store.recorded} échanges, {store.recorded_seconds:.1f}s de réseau"
+              f" cumulées - relecture: --replay {store.path}")
+    store.close()
+
+
+# Export typé en plus du CSV / de la Google Sheet (modifié par --parquet)
+EXPORT_SETTINGS = {
+    'parquet': None,
+}
+
+
+def open_parquet_export():
+    """Ouvre l'export Parquet demandé par --parquet (None si absent ou pyarrow manquant)."""
+    if not EXPORT_SETTINGS['parquet']:
+        return None
+    try:
+        return ParquetResultWriter(EXPORT_SETTINGS['parquet'])
+    except ImportError as e:
+        log(f"❌ {e}")
+    except Exception as e:
+        log(f"⚠️ Export Parquet impossible ({EXPORT_SETTINGS['parquet']}): {e}")
+    return None
+
+
+def export_parquet(writer, table, product_names):
+    """Ajoute une table à l'export Parquet ouvert (un row group par appel)."""
+    if writer is None:
+        return
+    try:
+        writer.write_table(table, product_names)
+    except Exception as e:
+        log(f"⚠️ Erreur lors de l'export Parquet: {e}")
+
+
+def close_parquet_export(writer):
+    if writer is None:
+        return
+    writer.close()
+    log(f"🧱 Export Parquet: {writer.rows_written} lignes (CNK × site) → {writer.path}")
+
+
+def iter_grid_chunks(grid_file, chunk_size):
+    """
+    Lit le fichier grid (Nom;CNK;Prix) de manière paresseuse, par blocs.
+    
+    Yields:
+        Listes d'au plus `chunk_size` lignes (nom, cnk, prix) dans l'ordre du fichier
+    """
+    chunk = []
+    with open(grid_file, newline="", encoding="utf-8") as f:
+        reader = csv.reader(f, delimiter=";")
+        for row in reader:
+            if len(row) >= 3:
+                name = row[0].strip()
+                cnk = row[1].strip()
+                prix = row[2].strip()
+                if name and cnk and in_current_shard(cnk):
+                    chunk.append((name, cnk, prix))
+                    if len(chunk) >= chunk_size:
+                        yield chunk
+                        chunk = []
+    if chunk:
+        yield chunk
+
+
+def run_stream_mode(grid_file, output_file, chunk_size):
+    """
+    Mode streaming (mémoire bornée) pour les très gros catalogues.
+    
+    Le grid est lu par blocs de `chunk_size` lignes; chaque bloc passe par les
+    scrapers puis ses lignes consolidées sont ajoutées au CSV de sortie dans l'ordre
+    d'entrée. Seul le bloc courant est en mémoire: la dédup des CNK se fait par bloc.
+    """
+    stats = {"total": 0, "medi": 0, "multipharma": 0, "newpharma": 0}
+    review_file = review_path_for(output_file)
+    review_written = False
+    history, run_id = open_history('stream', str(grid_file))
+    parquet = open_parquet_export()
+    
+    with open(output_file, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        writer.writerow(OUTPUT_COLUMNS)
+        
+        for chunk_idx, chunk in enumerate(iter_grid_chunks(grid_file, chunk_size), start=1):
+            product_names = {}
+            cnk_list = []
+            for name, cnk, _ in chunk:
+                if cnk not in product_names:
+                    product_names[cnk] = name
+                    cnk_list.append(cnk)
+            
+            log("\n" + "="*60)
+            log(f"📦 BLOC {chunk_idx}: {len(chunk)} lignes, {len(cnk_list)} CNKs uniques")
+            log("="*60)
+            
+            table = scrape_csv_sites(cnk_list, product_names)
+            table.set_base_prices({cnk: prix for _, cnk, prix in reversed(chunk)})
+            compute_price_stats(table)
+            if review_results(table, product_names, review_file, append=review_written):
+                review_written = True
+            record_history(history, run_id, table)
+            export_parquet(parquet, table, product_names)
+            events.emit_rows(table, chunk)
+            rows = iter_output_rows(chunk, table)
+            write_output_rows(writer, rows, stats)
+            f.flush()
+            log(f"💾 {stats['total']} lignes écrites dans {output_file}")
+    
+    if history is not None:
+        history.close()
+    close_parquet_export(parquet)
+    
+    if stats["total"] == 0:
+        log("❌ Aucun CNK trouvé dans le fichier grid")
+        sys.exit(1)
+    
+    print_coverage_stats(stats, output_file)
+
+
+def parse_sites(sites_arg, default=SITES):
+    """Liste de sites '--sites medi_market,multipharma' (quitte si un site est inconnu)."""
+    if not sites_arg:
+        return tuple(default)
+    sites = tuple(site.strip() for site in sites_arg.split(",") if site.strip())
+    unknown = [site for site in sites if site not in SITES]
+    if unknown or not sites:
+        log(f"❌ Erreur: site(s) inconnu(s): {', '.join(unknown)} (choix: {', '.join(SITES)})")
+        sys.exit(1)
+    return sites
+
+
+def run_daemon_mode(grid_file, sites):
+    """
+    Mode daemon: rafraîchit en continu les prix du grid, chaque (site, CNK) selon
+    sa volatilité observée, dans le budget de requêtes de chaque site.
+    """
+    product_names, cnk_list, _, _ = read_grid_file(grid_file)
+    if not cnk_list:
+        log("❌ Aucun CNK trouvé dans le fichier grid")
+        sys.exit(1)
+    
+    try:
+        history = HistoryStore(HISTORY_SETTINGS['path'])
+    except Exception as e:
+        log(f"❌ Erreur: historique indisponible ({HISTORY_SETTINGS['path']}): {e}")
+        sys.exit(1)
+    
+    log(f"🗄️  Historique: {HISTORY_SETTINGS['path']}")
+    with history:
+        # Chaque shard ne consomme que sa part du budget de chaque site
+        budgets = {site: rate / SHARD_SETTINGS['count'] for site, rate in SITE_RATE_BUDGETS.items()}
+        daemon = RefreshDaemon(product_names, sites, daemon_scraper(), history, budgets=budgets, label=str(grid_file))
+        daemon.run()
+
+
+def known_medi_names(cnk_list):
+    """Noms Medi-Market des pages produit connues (index des URLs du cache)."""
+    urls = load_product_urls('medi_market', cnk_list)
+    if urls is None:
+        return {}
+    return {cnk: name for cnk, (_, name) in urls.known.items() if name}
+
+
+def daemon_scraper():
+    """
+    Fonction de scraping du daemon: chaque lot ne porte que sur un site, les recherches
+    par nom (NewPharma, Multipharma) reçoivent donc les noms Medi-Market déjà connus
+    (rafraîchissements Medi-Market du daemon, sinon index des pages produit), comme en
+    batch: sans eux, scores et prix différeraient et gonfleraient la volatilité.
+    """
+    medi_names = {}
+    
+    def scrape(cnk_list, product_names, sites):
+        if 'medi_market' in sites:
+            table = scrape_sites(cnk_list, product_names, sites)
+            medi_names.update(table.names_dict(cnk_list))
+            return table
+        names = known_medi_names(cnk_list)
+        names.update((cnk, medi_names[cnk]) for cnk in cnk_list if cnk in medi_names)
+        return scrape_sites(cnk_list, product_names, sites, medi_names=names)
+    
+    return scrape
+
+
+def run_serve_mode(port, sites, cache_ttl):
+    """Service HTTP local: GET /price/<cnk> (cache frais ou recherche live), GET /metrics."""
+    from comparer import PriceComparer
+    from server import DEFAULT_HOST, PriceService, make_server
+    
+    comparer = PriceComparer(sites=sites, cache_ttl=cache_ttl)
+    history_path = HISTORY_SETTINGS['path'] if HISTORY_SETTINGS['enabled'] else None
+    service = PriceService(comparer, history_path)
+    server = make_server(service, DEFAULT_HOST, port)
+    
+    log(f"🌐 Service de prix: http://{DEFAULT_HOST}:{port}/price/<cnk>  (métriques: /metrics)")
+    log(f"   Sites: {', '.join(sites)} | cache: {cache_ttl:.0f}s | historique: {history_path or 'désactivé'}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        log("\n🛑 Service arrêté")
+    finally:
+        server.server_close()
+        service.close()
+        comparer.close()
+
+
+def run_merge(args):
+    """
+    Sous-commande merge: fusionne les sorties des shards.
+    
+        merge <grid_file> <sortie.csv|.jsonl> <shard_1> <shard_2> ...
+        merge <historique.sqlite3> <shard_1.sqlite3> <shard_2.sqlite3> ...
+    """
+    if len(args) < 2:
+        log("❌ Erreur: merge <grid_file> <sortie.csv|.jsonl> <sorties des shards...>")
+        log("          merge <historique.sqlite3> <historiques des shards...>")
+        sys.exit(1)
+    
+    if Path(args[0]).suffix in (".sqlite3", ".db"):
+        with HistoryStore(args[0]) as store:
+            for path in args[1:]:
+                runs, observations = store.merge_from(path)
+                log(f"🗄️  {path}: {runs} exécutions, {observations} observations importées")
+        log(f"✅ Historique fusionné → {args[0]}")
+        return
+    
+    grid_file, output_file, shard_files = args[0], args[1], args[2:]
+    if not shard_files:
+        log("❌ Erreur: aucune sortie de shard à fusionner")
+        sys.exit(1)
+    
+    grid_rows = (row for chunk in iter_grid_chunks(grid_file, DEFAULT_CHUNK_SIZE) for row in chunk)
+    try:
+        if Path(output_file).suffix in (".jsonl", ".ndjson"):
+            written, missing = shard.merge_jsonl(grid_rows, shard_files, output_file)
+        else:
+            written, missing = shard.merge_csv(grid_rows, shard_files, output_file)
+    except (OSError, ValueError) as e:
+        log(f"❌ Erreur lors de la fusion: {e}")
+        sys.exit(1)
+    
+    log(f"✅ {written} lignes fusionnées ({len(shard_files)} shards) → {output_file}")
+    if missing:
+        log(f"⚠️ {missing} lignes du grid absentes des sorties des shards")
+
+
+def run_sync(sites):
+    """
+    Sous-commande sync: importe les pages produit des sitemaps (Farmaline, Medi-Market)
+    dans l'index des URLs du cache, lu ensuite par les scrapers avant toute recherche.
+    """
+    if not CACHE_SETTINGS['enabled']:
+        log("❌ Erreur: sync écrit dans le cache, incompatible avec --no-cache")
+        sys.exit(1)
+    unsupported = [site for site in sites if site not in sitemap.SITEMAP_ROOTS]
+    if unsupported:
+        log(f"❌ Erreur: pas de sitemap exploitable pour {', '.join(unsupported)} "
+              f"(choix: {', '.join(sitemap.SITEMAP_ROOTS)})")
+        sys.exit(1)
+    
+    session = get_http_session()
+    log(f"🗺️  Synchronisation des sitemaps → {CACHE_SETTINGS['path']}")
+    with cache.UrlIndex(CACHE_SETTINGS['path']) as index:
+        for site in sites:
+            label = SITE_LABELS.get(site, site)
+            files = []
+            
+            def on_file(entry):
+                if ": " in entry:
+                    log(f"⚠️ {label}: sitemap illisible ({entry})")
+                else:
+                    files.append(entry)
+            
+            # Pas de brotli: le flux est décompressé par urllib3 (gzip/deflate)
+            headers = dict(rotate_headers(), **{"Accept-Encoding": "gzip, deflate"})
+            stats = sitemap.sync_site(session, site, index, headers=headers, on_file=on_file)
+            log(f"✅ {label}: {stats['urls']} pages produit dans {len(files)} sitemaps"
+                  f", {stats['written']} ajoutées ou modifiées ({stats['seconds']:.1f}s)")
+        totals = index.stats()
+    log("🔗 Index des URLs produit: " + ", ".join(
+        f"{SITE_LABELS.get(site, site)} {count}" for site, count in sorted(totals.items())
+    ))
+
+
+DEFAULT_WORKSHEET = 'resultats_final'
+
+# Flags suivis d'une valeur (exclus des arguments positionnels)
+FLAGS_WITH_VALUE = (
+    "--sheet", "--tab", "--batch", "--creds", "--limit", "--chunk-size",
+    "--review-ratio", "--review-min-score", "--history", "--parquet", "--jsonl",
+    "--daemon", "--sites", "--port", "--cache-ttl", "--shard", "--workers", "--queue",
+    "--cache", "--negative-ttl", "--bulk-min-score", "--archive-dir", "--reparse", "--record", "--replay",
+)
+
+# Taille de bloc par défaut du mode --stream
+DEFAULT_CHUNK_SIZE = 500
+
+
+def get_arg_value(flag, error_message):
+    """
+    Retourne la valeur qui suit `flag` dans sys.argv, ou None si le flag est absent.
+    Quitte avec `error_message` si le flag est présent sans valeur.
+    """
+    if flag not in sys.argv:
+        return None
+    idx = sys.argv.index(flag)
+    if idx + 1 < len(sys.argv) and not sys.argv[idx + 1].startswith("--"):
+        return sys.argv[idx + 1]
+    log(f"❌ Erreur: {error_message}")
+    sys.exit(1)
+
+
+def get_positional_args():
+    """Arguments positionnels (sans les flags ni leurs valeurs)."""
+    args = []
+    skip_next = False
+    for arg in sys.argv[1:]:
+        if skip_next:
+            skip_next = False
+            continue
+        if arg in FLAGS_WITH_VALUE:
+            skip_next = True
+            continue
+        if not arg.startswith("--"):
+            args.append(arg)
+    return args
+
+
+def import_google_sheets():
+    """Importe le module google_sheets (quitte proprement si les dépendances manquent)."""
+    try:
+        # Add src directory to path if not already there
+        src_dir = Path(__file__).parent
+        if str(src_dir) not in sys.path:
+            sys.path.insert(0, str(src_dir))
+        
+        import google_sheets
+        return google_sheets
+    except ImportError as e:
+        log(f"\n❌ Erreur: module google_sheets introuvable: {e}")
+        log("Installez les dépendances: pip install -r requirements.txt")
+        sys.exit(1)
+
+
+def scrape_for_sheets(cnk_list, product_names, base_prices, google_sheets):
+    """
+    Exécute les 4 phases de scraping pour une liste de CNK uniques et calcule
+    les statistiques de prix (moyenne, min, médiane, écart, site le moins cher, écart vs base).
+    
+    Returns:
+        ResultTable prête pour google_sheets.write_results
+    """
+    table = scrape_sites(cnk_list, product_names, SITES)
+    table.set_base_prices(base_prices)
+    
+    # Statistiques vectorisées (Prix Moyen, Prix Min, Médiane, ...)
+    return google_sheets.calculate_stats(table)
+
+
+def sheet_review_path(label):
+    """Liste "à vérifier" d'une exécution Google Sheets (dans data/output/)."""
+    output_dir = Path(__file__).parents[1] / "data" / "output"
+    return str(output_dir / f"a_verifier_{label}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv")
+
+
+def run_sheet_mode(sheet_name, worksheet_name, creds_path_arg, limit_arg):
+    """Mode Google Sheets: une feuille, un onglet."""
+    log("="*60)
+    log("🚀 MASTER SCRAPER - Mode Google Sheets")
+    log("="*60)
+    log(f"📊 Google Sheet: {sheet_name}")
+    log(f"📋 Onglet: {worksheet_name}")
+    
+    google_sheets = import_google_sheets()
+    
+    start_time = time.time()
+    
+    # Ouvrir la Google Sheet
+    try:
+        # Pass explicit creds path when provided, otherwise google_sheets will fall back to env or default
+        spreadsheet = google_sheets.open_sheet(sheet_name, creds_path=creds_path_arg)
+    except Exception as e:
+        log(f"\n❌ Erreur lors de l'ouverture de la Google Sheet: {e}")
+        sys.exit(1)
+    
+    # Lire les CNK et les noms (colonne Nom_Produit) depuis la feuille
+    try:
+        cnk_list, cnk_to_rows, cnk_to_name, cnk_to_base = google_sheets.read_cnks(
+            spreadsheet,
+            worksheet_name=worksheet_name,
+            cnk_col='CNK',
+            name_col='Nom_Produit'
+        )
+    except Exception as e:
+        log(f"\n❌ Erreur lors de la lecture des CNK: {e}")
+        sys.exit(1)
+    
+    # Appliquer un limit si demandé
+    if limit_arg is not None:
+        cnk_list = cnk_list[:limit_arg]
+        # Rebuild cnk_to_rows mapping for subset
+        cnk_to_rows = {cnk: cnk_to_rows[cnk] for cnk in cnk_list}
+    
+    # Pour Google Sheets, les noms de produit de la colonne 'Nom_Produit'
+    # servent de source 'Grid' pour le fuzzy matching.
+    product_names = cnk_to_name
+    
+    log(f"\n🔍 {len(cnk_list)} CNKs à traiter")
+    
+    results = scrape_for_sheets(cnk_list, product_names, cnk_to_base, google_sheets)
+    review_results(results, product_names, sheet_review_path(sheet_name))
+    history, run_id = open_history('sheet', f"{sheet_name}/{worksheet_name}")
+    record_history(history, run_id, results)
+    if history is not None:
+        history.close()
+    parquet = open_parquet_export()
+    export_parquet(parquet, results, product_names)
+    close_parquet_export(parquet)
+    events.emit_rows(results, sheet_event_rows(cnk_list, product_names, [cnk_to_rows]))
+    
+    # Écrire dans Google Sheets
+    try:
+        google_sheets.write_results(
+            spreadsheet,
+            worksheet_name=worksheet_name,
+            cnk_to_rows=cnk_to_rows,
+            results=results
+        )
+    except Exception as e:
+        log(f"\n❌ Erreur lors de l'écriture dans Google Sheets: {e}")
+        sys.exit(1)
+    
+    # Afficher le rapport de blocage
+    print_blocking_report()
+    
+    elapsed = time.time() - start_time
+    log(f"\n⏱️ Temps total d'exécution: {elapsed:.2f}s ({elapsed/60:.2f} min)")
+    log(f"\n✅ Scraping terminé et résultats écrits dans Google Sheet!")
+    log(f"🔗 URL: {spreadsheet.url}")
+
+
+def run_batch_mode(manifest_path, creds_path_arg, limit_arg):
+    """
+    Mode batch Google Sheets: plusieurs feuilles/onglets listés dans un manifeste.
+    
+    Une seule authentification et une seule passe de scraping: les CNK de toutes les
+    cibles sont dédupliqués, chaque CNK unique est scrapé une fois (mêmes pools HTTP,
+    même découverte des catégories Farmaline), puis les résultats sont répartis sur
+    chaque feuille qui le référence. Le prix de base reste propre à chaque cible:
+    l'Écart Base de chaque onglet est calculé avec ses propres Prix_Base.
+    """
+    log("="*60)
+    log("🚀 MASTER SCRAPER - Mode Batch Google Sheets")
+    log("="*60)
+    log(f"🗂️  Manifeste: {manifest_path}")
+    
+    google_sheets = import_google_sheets()
+    
+    start_time = time.time()
+    
+    try:
+        targets = google_sheets.read_manifest(manifest_path, default_worksheet=DEFAULT_WORKSHEET)
+        client = google_sheets.get_client(creds_path_arg)
+    except Exception as e:
+        log(f"\n❌ Erreur lors de la préparation du batch: {e}")
+        sys.exit(1)
+    
+    log(f"📋 {len(targets)} cible(s) dans le manifeste")
+    
+    # Lecture de toutes les cibles (chaque Spreadsheet n'est ouverte qu'une fois)
+    spreadsheets = {}
+    jobs = []  # (spreadsheet, onglet, mapping CNK -> lignes, mapping CNK -> prix de base)
+    cnk_list = []
+    seen_cnks = set()
+    product_names = {}
+    base_values = {}  # CNK -> prix de base distincts entre les cibles
+    failed = []
+    
+    for sheet_name, worksheet_name in targets:
+        try:
+            if sheet_name not in spreadsheets:
+                spreadsheets[sheet_name] = google_sheets.open_sheet(sheet_name, client=client)
+            spreadsheet = spreadsheets[sheet_name]
+            sheet_cnks, cnk_to_rows, cnk_to_name, cnk_to_base = google_sheets.read_cnks(
+                spreadsheet,
+                worksheet_name=worksheet_name,
+                cnk_col='CNK',
+                name_col='Nom_Produit'
+            )
+        except Exception as e:
+            log(f"\n❌ {sheet_name}/{worksheet_name} ignoré: {e}")
+            failed.append(f"{sheet_name}/{worksheet_name}")
+            continue
+        
+        jobs.append((spreadsheet, worksheet_name, cnk_to_rows, cnk_to_base))
+        for cnk in sheet_cnks:
+            if cnk not in seen_cnks:
+                seen_cnks.add(cnk)
+                cnk_list.append(cnk)
+            # Garder le premier nom non vide pour le fuzzy matching
+            if not product_names.get(cnk):
+                product_names[cnk] = cnk_to_name.get(cnk, '')
+            base = parse_price(cnk_to_base.get(cnk, ''))
+            if not np.isnan(base):
+                base_values.setdefault(cnk, set()).add(base)
+    
+    # Prix de base commun (validation, historique, exports): seulement si les cibles concordent
+    base_prices = {cnk: values.pop() for cnk, values in base_values.items() if len(values) == 1}
+    conflicts = len(base_values) - len(base_prices)
+    if conflicts:
+        log(f"⚠️ {conflicts} CNK(s) avec des Prix_Base différents selon la cible: Écart Base calculé par onglet")
+    
+    if not cnk_list:
+        log("❌ Aucun CNK trouvé dans les feuilles du manifeste")
+        sys.exit(1)
+    
+    total_refs = sum(len(rows) for _, _, cnk_to_rows, _ in jobs for rows in cnk_to_rows.values())
+    log(f"\n🔁 {total_refs} lignes référencées → {len(cnk_list)} CNKs uniques")
+    
+    # Appliquer un limit si demandé (sur les CNK uniques)
+    if limit_arg is not None:
+        cnk_list = cnk_list[:limit_arg]
+    
+    log(f"\n🔍 {len(cnk_list)} CNKs à traiter")
+    
+    results = scrape_for_sheets(cnk_list, product_names, base_prices, google_sheets)
+    review_results(results, product_names, sheet_review_path(Path(manifest_path).stem))
+    history, run_id = open_history('batch', str(manifest_path))
+    record_history(history, run_id, results)
+    if history is not None:
+        history.close()
+    parquet = open_parquet_export()
+    export_parquet(parquet, results, product_names)
+    close_parquet_export(parquet)
+    events.emit_rows(results, sheet_event_rows(cnk_list, product_names, [rows for _, _, rows, _ in jobs]))
+    
+    # Répartir les résultats sur chaque cible (Écart Base recalculé avec les Prix_Base de la cible)
+    for spreadsheet, worksheet_name, cnk_to_rows, cnk_to_base in jobs:
+        if not any(cnk in results.index for cnk in cnk_to_rows):
+            continue
+        results.set_base_prices(cnk_to_base, replace=True)
+        compute_price_stats(results)
+        try:
+            google_sheets.write_results(
+                spreadsheet,
+                worksheet_name=worksheet_name,
+                cnk_to_rows=cnk_to_rows,
+                results=results
+            )
+        except Exception as e:
+            log(f"\n❌ Erreur lors de l'écriture dans {spreadsheet.title}/{worksheet_name}: {e}")
+            failed.append(f"{spreadsheet.title}/{worksheet_name}")
+    
+    # Afficher le rapport de blocage
+    print_blocking_report()
+    
+    elapsed = time.time() - start_time
+    log(f"\n⏱️ Temps total d'exécution: {elapsed:.2f}s ({elapsed/60:.2f} min)")
+    
+    if failed:
+        log(f"\n⚠️ {len(failed)} cible(s) en échec: {', '.join(failed)}")
+        sys.exit(1)
+    log(f"\n✅ Batch terminé: {len(jobs)} onglet(s) mis à jour")
+
+
+def main():
+    # Support -h/--help
+    if len(sys.argv) > 1 and sys.argv[1] in ("-h", "--help"):
+        log("Usage:")
+        log("  Mode fichier CSV:")
+        log("    python src/scraper.py [grid_file] [output_file]")
+        log("    python src/scraper.py --run")
+        log("    python src/scraper.py <grid_file> <output_file> --stream [--chunk-size 500]")
+        log("    (mémoire constante pour les très gros catalogues)")
+        log("")
+        log("  Mode Google Sheets:")
+        log("    python src/scraper.py --sheet <sheet_name> [--tab <onglet>]")
+        log("")
+        log("  Mode batch Google Sheets (plusieurs feuilles/onglets):")
+        log("    python src/scraper.py --batch <manifeste>")
+        log("    (une cible par ligne: nom_sheet;onglet)")
+        log("")
+        log("  Mode daemon (rafraîchissement continu selon la volatilité, vers l'historique):")
+        log("    python src/scraper.py --daemon <grid_file> [--sites medi_market,multipharma]")
+        log("")
+        log("  Service HTTP local (GET /price/<cnk>, /metrics):")
+        log("    python src/scraper.py --serve [--port 8765] [--cache-ttl 3600] [--sites medi_market,multipharma]")
+        log("")
+        log("  Exécution partitionnée (modes fichier et daemon):")
+        log("    python src/scraper.py <grid_file> <shard_i.csv> --shard i/N   (hash stable du CNK, 1/N du débit)")
+        log("    python src/scraper.py merge <grid_file> <sortie.csv|.jsonl> <sorties des shards...>")
+        log("    python src/scraper.py merge <historique.sqlite3> <historiques des shards...>")
+        log("")
+        log("  Catalogue depuis les sitemaps (Farmaline / Medi-Market, index des pages produit):")
+        log("    python src/scraper.py sync [--sites farmaline,medi_market] [--cache <fichier.sqlite3>]")
+        log("")
+        log("  Multi-processus (file de travail SQLite, tous modes de scraping):")
+        log("    --workers <N>            N processus workers (baux, débit partagé par site)")
+        log("    --queue <fichier.sqlite3> --resume   reprendre une file interrompue")
+        log("")
+        log("  Listings par marque (NewPharma / Multipharma):")
+        log("    --bulk                   une récolte de listing par marque au lieu d'une recherche par produit")
+        log("    --bulk-min-score <0-100> score minimal d'un match catalogue (défaut: 85)")
+        log("")
+        log("  Cache négatif (CNK absents de Medi-Market / Farmaline, data/cache.sqlite3):")
+        log("    --negative-ttl <heures>  validité d'une absence (24 h × nb de confirmations, max ×4)")
+        log("    --cache <fichier.sqlite3> | --no-cache  (aussi: index des pages produit connues)")
+        log("")
+        log("  Archive des réponses brutes (tous modes de scraping, data/archive/):")
+        log("    --archive                réponses gardées compressées (zstd/gzip) avec un index")
+        log("    --reparse <run>          relit un run archivé sans réseau (mêmes arguments d'entrée)")
+        log("    --archive-dir <dossier>  autre emplacement de l'archive")
+        log("")
+        log("  Cassette HTTP (runs de performance reproductibles hors ligne):")
+        log("    --record <cassette>      enregistre chaque échange, dans l'ordre, avec sa durée")
+        log("    --replay <cassette>      rejoue le run sans réseau (mêmes arguments d'entrée)")
+        log("    --replay-latency         réimpose les durées enregistrées (aussi avec --reparse)")
+        log("")
+        log("  Export typé (tous modes):")
+        log("    --parquet <fichier.parquet>   prix/scores en float, site/source catégoriels")
+        log("    --jsonl <fichier|fifo|->      événements NDJSON au fil du scraping (- = stdout)")
+        log("")
+        log("  Historique des prix (activé par défaut, data/history.sqlite3):")
+        log("    --history <fichier.sqlite3>   autre fichier d'historique")
+        log("    --no-history                  ne pas enregistrer cette exécution")
+        log("    python src/scraper.py --changes   changements depuis l'exécution précédente")
+        log("")
+        log("  Validation (tous modes):")
+        log("    --review-ratio 0.35     écart toléré vs médiane inter-sites / Prix_Base")
+        log("    --review-min-score 70   score de match minimum")
+        log("    --recheck               re-scrape uniquement les prix signalés")
+        log("")
+        log("Exemples:")
+        log("  python src/scraper.py data/input/grid.csv data/output/resultats.csv")
+        log("  python src/scraper.py --sheet test_pharma_scrap")
+        log("  python src/scraper.py --batch data/input/sheets.txt")
+        sys.exit(0)
+
+    # Sous-commande merge (fusion des sorties des shards)
+    if len(sys.argv) > 1 and sys.argv[1] == "merge":
+        run_merge(sys.argv[2:])
+        return
+
+    # Defaults: data/input/grid.csv and timestamped output in data/output/
+    project_root = Path(__file__).parents[1]
+    default_input = project_root / "data" / "input" / "grid.csv"
+    default_output = project_root / "data" / "output" / f"resultats_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+
+    sheet_name = get_arg_value(
+        "--sheet",
+        "--sheet nécessite un nom de Google Sheet\nExemple: python src/scraper.py --sheet test_pharma_scrap"
+    )
+    worksheet_name = get_arg_value("--tab", "--tab nécessite un nom d'onglet") or DEFAULT_WORKSHEET
+    manifest_path = get_arg_value("--batch", "--batch nécessite un fichier manifeste (nom_sheet;onglet par ligne)")
+
+    # Optional: explicit credentials file path
+    creds_path_arg = get_arg_value("--creds", "--creds nécessite un chemin vers le fichier JSON des credentials")
+
+    # Optional: limit number of CNKs to process (for quick tests)
+    limit_arg = get_arg_value("--limit", "--limit nécessite un entier (ex: --limit 5)")
+    if limit_arg is not None:
+        try:
+            limit_arg = int(limit_arg)
+        except ValueError:
+            log("❌ Erreur: --limit nécessite un entier")
+            sys.exit(1)
+
+    # Historique des prix
+    history_path = get_arg_value("--history", "--history nécessite un chemin vers le fichier SQLite")
+    if history_path:
+        HISTORY_SETTINGS['path'] = history_path
+    HISTORY_SETTINGS['enabled'] = "--no-history" not in sys.argv
+    
+    # Export Parquet typé (en plus du CSV / de la Google Sheet)
+    EXPORT_SETTINGS['parquet'] = get_arg_value("--parquet", "--parquet nécessite un chemin de fichier .parquet")
+    
+    if "--changes" in sys.argv:
+        print_changes(HISTORY_SETTINGS['path'])
+        return
+
+    # Cache négatif des recherches
+    cache_path = get_arg_value("--cache", "--cache nécessite un chemin vers le fichier SQLite")
+    if cache_path:
+        CACHE_SETTINGS['path'] = cache_path
+    CACHE_SETTINGS['enabled'] = "--no-cache" not in sys.argv
+    try:
+        negative_ttl = get_arg_value("--negative-ttl", "--negative-ttl nécessite un nombre d'heures (ex: 24)")
+        if negative_ttl is not None:
+            CACHE_SETTINGS['negative_ttl'] = float(negative_ttl) * 3600
+    except ValueError:
+        log("❌ Erreur: --negative-ttl nécessite un nombre d'heures")
+        sys.exit(1)
+
+    # Sous-commande sync (sitemaps -> index des URLs produit)
+    if len(sys.argv) > 1 and sys.argv[1] == "sync":
+        sync_sites = get_arg_value("--sites", "--sites nécessite une liste (ex: farmaline,medi_market)")
+        run_sync(parse_sites(sync_sites, tuple(sitemap.SITEMAP_ROOTS)))
+        return
+
+    # Listings par marque
+    BULK_SETTINGS['enabled'] = "--bulk" in sys.argv
+    try:
+        bulk_min_score = get_arg_value("--bulk-min-score", "--bulk-min-score nécessite un score (ex: 85)")
+        if bulk_min_score is not None:
+            BULK_SETTINGS['min_score'] = float(bulk_min_score)
+    except ValueError:
+        log("❌ Erreur: --bulk-min-score nécessite un nombre")
+        sys.exit(1)
+
+    # Archive des réponses brutes / relecture sans réseau
+    ARCHIVE_SETTINGS['enabled'] = "--archive" in sys.argv
+    archive_dir = get_arg_value("--archive-dir", "--archive-dir nécessite un dossier")
+    if archive_dir:
+        ARCHIVE_SETTINGS['path'] = archive_dir
+    try:
+        reparse = get_arg_value("--reparse", "--reparse nécessite un numéro de run archivé (ex: --reparse 12)")
+        ARCHIVE_SETTINGS['reparse'] = int(reparse) if reparse is not None else None
+    except ValueError:
+        log("❌ Erreur: --reparse nécessite un numéro de run archivé")
+        sys.exit(1)
+    if ARCHIVE_SETTINGS['enabled'] and ARCHIVE_SETTINGS['reparse'] is not None:
+        log("❌ Erreur: --archive et --reparse sont incompatibles")
+        sys.exit(1)
+
+    # Cassette HTTP (runs de performance reproductibles)
+    CASSETTE_SETTINGS['record'] = get_arg_value("--record", "--record nécessite un fichier cassette")
+    CASSETTE_SETTINGS['replay'] = get_arg_value("--replay", "--replay nécessite un fichier cassette")
+    CASSETTE_SETTINGS['latency'] = "--replay-latency" in sys.argv
+    if CASSETTE_SETTINGS['record'] and CASSETTE_SETTINGS['replay']:
+        log("❌ Erreur: --record et --replay sont incompatibles")
+        sys.exit(1)
+    if (CASSETTE_SETTINGS['record'] or CASSETTE_SETTINGS['replay']) and (
+            ARCHIVE_SETTINGS['enabled'] or ARCHIVE_SETTINGS['reparse'] is not None):
+        log("❌ Erreur: --record / --replay et --archive / --reparse sont incompatibles")
+        sys.exit(1)
+    if CASSETTE_SETTINGS['latency'] and not CASSETTE_SETTINGS['replay'] and ARCHIVE_SETTINGS['reparse'] is None:
+        log("❌ Erreur: --replay-latency nécessite --replay ou --reparse")
+        sys.exit(1)
+    setup_archive()
+    setup_cassette()
+
+    # Partition du catalogue: --shard i/N
+    shard_arg = get_arg_value("--shard", "--shard nécessite i/N (ex: --shard 1/4)")
+    if shard_arg:
+        if sheet_name or manifest_path:
+            log("❌ Erreur: --shard n'est disponible qu'en mode fichier CSV et daemon")
+            sys.exit(1)
+        try:
+            SHARD_SETTINGS['index'], SHARD_SETTINGS['count'] = shard.parse_shard(shard_arg)
+        except ValueError as e:
+            log(f"❌ Erreur: {e}")
+            sys.exit(1)
+
+    daemon_grid = get_arg_value("--daemon", "--daemon nécessite un fichier grid (Nom;CNK;Prix)")
+    if daemon_grid:
+        sites = parse_sites(get_arg_value("--sites", "--sites nécessite une liste (ex: medi_market,multipharma)"), CSV_SITES)
+        run_daemon_mode(daemon_grid, sites)
+        return
+
+    if "--serve" in sys.argv:
+        sites = parse_sites(get_arg_value("--sites", "--sites nécessite une liste (ex: medi_market,multipharma)"), CSV_SITES)
+        try:
+            port = int(get_arg_value("--port", "--port nécessite un entier (ex: 8765)") or 8765)
+            cache_ttl = float(get_arg_value("--cache-ttl", "--cache-ttl nécessite un nombre de secondes") or 3600)
+        except ValueError:
+            log("❌ Erreur: --port et --cache-ttl nécessitent un nombre")
+            sys.exit(1)
+        run_serve_mode(port, sites, cache_ttl)
+        return
+
+    # File de travail multi-processus
+    try:
+        workers = get_arg_value("--workers", "--workers nécessite un entier (ex: --workers 4)")
+        QUEUE_SETTINGS['workers'] = max(1, int(workers)) if workers else 1
+    except ValueError:
+        log("❌ Erreur: --workers nécessite un entier")
+        sys.exit(1)
+    if QUEUE_SETTINGS['workers'] > 1 and not fork_available():
+        log("❌ Erreur: --workers nécessite le démarrage des processus par fork (indisponible sur cette plateforme)")
+        sys.exit(1)
+    queue_path = get_arg_value("--queue", "--queue nécessite un chemin vers le fichier SQLite")
+    if queue_path:
+        QUEUE_SETTINGS['path'] = queue_path
+    elif SHARD_SETTINGS['count'] > 1:
+        # Une file par shard: deux shards sur la même machine ne vident pas la file de l'autre
+        QUEUE_SETTINGS['path'] = shard_queue_path(SHARD_SETTINGS['index'], SHARD_SETTINGS['count'])
+    QUEUE_SETTINGS['resume'] = "--resume" in sys.argv
+
+    # Validation post-consolidation: seuils et re-vérification ciblée
+    try:
+        review_ratio = get_arg_value("--review-ratio", "--review-ratio nécessite un nombre (ex: 0.35)")
+        if review_ratio is not None:
+            REVIEW_SETTINGS['max_ratio'] = float(review_ratio)
+        review_min_score = get_arg_value("--review-min-score", "--review-min-score nécessite un score 0-100 (ex: 70)")
+        if review_min_score is not None:
+            REVIEW_SETTINGS['min_score'] = float(review_min_score)
+    except ValueError:
+        log("❌ Erreur: --review-ratio et --review-min-score nécessitent un nombre")
+        sys.exit(1)
+    REVIEW_SETTINGS['recheck'] = "--recheck" in sys.argv
+
+    # Flux d'événements NDJSON (stdout avec "-": les messages passent alors sur stderr)
+    jsonl_target = get_arg_value("--jsonl", "--jsonl nécessite un fichier, une FIFO ou - (stdout)")
+    if jsonl_target:
+        if jsonl_target == "-":
+            jsonl_target = sys.stdout
+            sys.stdout = sys.stderr
+        if manifest_path:
+            mode, label = 'batch', manifest_path
+        elif sheet_name:
+            mode, label = 'sheet', f"{sheet_name}/{worksheet_name}"
+        else:
+            pos_args = get_positional_args()
+            mode, label = ('stream' if "--stream" in sys.argv else 'csv'), (pos_args[0] if pos_args else str(default_input))
+        try:
+            events.open_stream(jsonl_target, mode=mode, label=label)
+        except OSError as e:
+            log(f"❌ Erreur: impossible d'ouvrir le flux --jsonl: {e}")
+            sys.exit(1)
+
+    try:
+        if manifest_path:
+            run_batch_mode(manifest_path, creds_path_arg, limit_arg)
+        elif sheet_name:
+            run_sheet_mode(sheet_name, worksheet_name, creds_path_arg, limit_arg)
+        else:
+            run_file_mode(default_input, default_output)
+    finally:
+        events.close_stream()
+
+
+def run_file_mode(default_input, default_output):
+    """Mode fichier CSV (grid local -> CSV consolidé), normal ou --stream."""
+    run_flag = "--run" in sys.argv
+    # Collect positional args (ignore flags like --run, --sheet, etc.)
+    pos_args = get_positional_args()
+
+    if len(pos_args) == 0:
+        # No positional args: show defaults and exit unless --run is provided
+        log("\n⚠️  Aucun fichier d'entrée fourni. Valeurs par défaut proposées:")
+        log(f"  • Input (par défaut): {default_input}")
+        log(f"  • Output (par défaut): {default_output}")
+        log("\nPour lancer le scraper avec ces valeurs, relancez avec --run:\n  python src/scraper.py --run\nou utilisez le script ./run_scraper.sh\n")
+        if run_flag:
+            grid_file = str(default_input)
+            output_file = str(default_output)
+        else:
+            sys.exit(0)
+    elif len(pos_args) == 1:
+        grid_file = pos_args[0]
+        output_file = str(default_output)
+    else:
+        grid_file = pos_args[0]
+        output_file = pos_args[1]
+    
+    # Vérifier que le fichier grid existe
+    if not os.path.exists(grid_file):
+        log(f"❌ Erreur: fichier grid '{grid_file}' introuvable")
+        sys.exit(1)
+    
+    log("="*60)
+    log("🚀 MASTER SCRAPER - 2 Sites Pharma")
+    log("="*60)
+    log(f"📋 Grid file: {grid_file}")
+    log(f"📁 Output: {output_file}")
+    
+    start_time = time.time()
+    
+    if "--stream" in sys.argv:
+        chunk_size = get_arg_value("--chunk-size", "--chunk-size nécessite un entier (ex: --chunk-size 500)")
+        try:
+            chunk_size = int(chunk_size) if chunk_size is not None else DEFAULT_CHUNK_SIZE
+        except ValueError:
+            log("❌ Erreur: --chunk-size nécessite un entier")
+            sys.exit(1)
+        log(f"🌊 Mode streaming: blocs de {chunk_size} lignes")
+        
+        run_stream_mode(grid_file, output_file, max(1, chunk_size))
+        
+        elapsed = time.time() - start_time
+        log(f"\n⏱️ Temps total d'exécution: {elapsed:.2f}s ({elapsed/60:.2f} min)")
+        log("\n✅ Scraping terminé avec succès!")
+        return
+    
+    # Lire les données depuis le fichier grid
+    product_names, cnk_list, base_prices, grid_rows = read_grid_file(grid_file)
+    
+    if not cnk_list:
+        log("❌ Aucun CNK trouvé dans le fichier grid")
+        sys.exit(1)
+    
+    log(f"\n🔍 {len(cnk_list)} CNKs à traiter")
+    
+    table = scrape_csv_sites(cnk_list, product_names)
+    table.set_base_prices(base_prices)
+    compute_price_stats(table)
+    
+    # Validation: prix douteux à vérifier (et re-vérification ciblée si --recheck)
+    review_results(table, product_names, review_path_for(output_file))
+    
+    # Historique des prix (seuls les changements sont enregistrés)
+    history, run_id = open_history('csv', str(grid_file))
+    record_history(history, run_id, table)
+    if history is not None:
+        history.close()
+    parquet = open_parquet_export()
+    export_parquet(parquet, table, product_names)
+    close_parquet_export(parquet)
+    events.emit_rows(table, grid_rows)
+    
+    # Consolidation finale
+    consolidate_results(table, grid_rows, output_file)
     
     elapsed = time.time() - start_time
-    print(f"\n⏱️ Temps total d'exécution: {elapsed:.2f}s ({elapsed/60:.2f} min)")
-    print("\n✅ Scraping terminé avec succès!")
+    log(f"\n⏱️ Temps total d'exécution: {elapsed:.2f}s ({elapsed/60:.2f} min)")
+    log("\n✅ Scraping terminé avec succès!")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,250 @@
+#!/usr/bin/env python3
+"""
+Service HTTP local de LP_Pharma (prix à la demande pour les outils internes).
+
+Endpoints:
+    GET /price/<cnk>[?name=<nom produit>]  prix courants du CNK sur les sites configurés
+    GET /metrics                           latences et compteurs par endpoint (JSON)
+    GET /health                            {"status": "ok"}
+
+Un prix est servi depuis le cache (mémoire, puis historique SQLite) s'il a été vérifié
+depuis moins de `cache_ttl` secondes; sinon une recherche live est lancée sur les sites
+configurés. Les requêtes simultanées pour un même CNK partagent la même recherche en
+cours (coalescing) au lieu de déclencher chacune un scraping.
+"""
+
+import json
+import math
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, unquote, urlparse
+
+from comparer import PriceComparer, PriceResult, result_from_lookups
+from history import HistoryStore
+
+
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+# Nombre de latences gardées par endpoint pour les percentiles
+LATENCY_WINDOW = 1000
+
+
+class EndpointMetrics:
+    """Compteurs et latences (fenêtre glissante) d'un endpoint."""
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+
+    def record(self, seconds: float, error: bool = False) -> None:
+        self.count += 1
+        self.errors += error
+        self.latencies.append(seconds * 1000.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        ordered = sorted(self.latencies)
+
+        def percentile(p):
+            if not ordered:
+                return None
+            return round(ordered[min(len(ordered) - 1, int(math.ceil(p * len(ordered))) - 1)], 2)
+
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'avg_ms': round(sum(ordered) / len(ordered), 2) if ordered else None,
+            'p50_ms': percentile(0.50),
+            'p95_ms': percentile(0.95),
+            'p99_ms': percentile(0.99),
+            'max_ms': round(ordered[-1], 2) if ordered else None,
+        }
+
+
+class PriceService:
+    """
+    Logique du service: cache mémoire/historique, recherches live coalescées, métriques.
+
+    Args:
+        comparer: PriceComparer (sites configurés, cache mémoire et TTL)
+        history_path: Historique SQLite (lecture des prix frais, écriture des recherches live),
+                      None pour s'en passer; une seule connexion, fermée par close()
+    """
+
+    def __init__(self, comparer: PriceComparer, history_path=None):
+        self.comparer = comparer
+        self.history_path = history_path
+        self.history = HistoryStore(history_path) if history_path is not None else None
+        self._history_lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self._metrics_lock = threading.Lock()
+        self.metrics: Dict[str, EndpointMetrics] = {}
+        self.counters = {'memory_hits': 0, 'history_hits': 0, 'live_lookups': 0, 'coalesced': 0}
+
+    def close(self) -> None:
+        """Ferme l'historique (à l'arrêt du serveur)."""
+        if self.history is not None:
+            with self._history_lock:
+                self.history.close()
+            self.history = None
+
+    # -- historique (connexion partagée, accès sérialisés) ----------------------
+
+    def _from_history(self, cnk: str, name: str) -> Optional[PriceResult]:
+        """
+        PriceResult depuis l'historique si tous les sites ont été vérifiés depuis moins du
+        TTL (un produit non trouvé lors d'une vérification récente compte comme "non trouvé").
+        """
+        if self.history is None:
+            return None
+        with self._history_lock:
+            latest = self.history.latest_for(cnk)
+        now = time.time()
+        lookups = {}
+        checked = []
+        for site in self.comparer.sites:
+            if site not in latest:
+                return None
+            price, score, checked_at = latest[site]
+            checked_ts = datetime.fromisoformat(checked_at).timestamp()
+            if now - checked_ts > self.comparer.cache_ttl:
+                return None
+            lookups[site] = (price, score, None)
+            checked.append(checked_ts)
+        return result_from_lookups(cnk, lookups, {cnk: name} if name else None, fetched_at=min(checked))
+
+    def _record(self, result: PriceResult) -> None:
+        if self.history is None:
+            return
+        with self._history_lock:
+            run_id = self.history.start_run('serve', result.cnk)
+            self.history.record_observations(run_id, (
+                (result.cnk, site, math.nan if price is None else price,
+                 math.nan if result.scores.get(site) is None else result.scores[site])
+                for site, price in result.prices.items()
+            ))
+
+    # -- recherche ------------------------------------------------------------
+
+    def _live_lookup(self, cnk: str, name: str) -> PriceResult:
+        result = self.comparer.compare([cnk], names={cnk: name} if name else None)[0]
+        try:
+            self._record(result)
+        except Exception as e:
+            print(f"⚠️ Historique: enregistrement impossible pour {cnk}: {e}")
+        return result
+
+    def lookup(self, cnk: str, name: str = '') -> Tuple[PriceResult, str]:
+        """
+        Prix courants d'un CNK.
+
+        Returns:
+            (PriceResult, origine) avec origine 'memory', 'history', 'live' ou 'coalesced'
+        """
+        result = self.comparer.cached(cnk)
+        if result is not None:
+            self._count('memory_hits')
+            return result, 'memory'
+
+        result = self._from_history(cnk, name)
+        if result is not None:
+            self.comparer.store_results({cnk: result})
+            self._count('history_hits')
+            return result, 'history'
+
+        # Coalescing: une seule recherche live en cours par CNK
+        with self._inflight_lock:
+            future = self._inflight.get(cnk)
+            owner = future is None
+            if owner:
+                future = self._inflight[cnk] = Future()
+        if not owner:
+            self._count('coalesced')
+            return future.result(), 'coalesced'
+
+        self._count('live_lookups')
+        try:
+            result = self._live_lookup(cnk, name)
+            future.set_result(result)
+            return result, 'live'
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[cnk]
+
+    # -- métriques ------------------------------------------------------------
+
+    def _count(self, counter: str) -> None:
+        with self._metrics_lock:
+            self.counters[counter] += 1
+
+    def record_latency(self, endpoint: str, seconds: float, error: bool = False) -> None:
+        with self._metrics_lock:
+            self.metrics.setdefault(endpoint, EndpointMetrics()).record(seconds, error)
+
+    def metrics_snapshot(self) -> Dict[str, object]:
+        with self._metrics_lock:
+            return {
+                'endpoints': {name: m.snapshot() for name, m in sorted(self.metrics.items())},
+                'lookups': dict(self.counters),
+                'inflight': len(self._inflight),
+            }
+
+
+class PriceRequestHandler(BaseHTTPRequestHandler):
+    service: PriceService = None  # injecté par make_server
+
+    def _send_json(self, status: int, payload) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        start = time.perf_counter()
+        url = urlparse(self.path)
+        parts = [unquote(p) for p in url.path.split('/') if p]
+        endpoint = f"/{parts[0]}" if parts else '/'
+        status = 500
+        try:
+            if parts[:1] == ['price'] and len(parts) == 2 and parts[1].strip():
+                name = parse_qs(url.query).get('name', [''])[0]
+                result, origin = self.service.lookup(parts[1].strip(), name)
+                payload = result._asdict()
+                payload['origin'] = origin
+                payload['age_s'] = round(time.time() - result.fetched_at, 1)
+                status = 200
+                self._send_json(status, payload)
+            elif parts == ['metrics']:
+                status = 200
+                self._send_json(status, self.service.metrics_snapshot())
+            elif parts == ['health']:
+                status = 200
+                self._send_json(status, {'status': 'ok'})
+            else:
+                endpoint = 'not_found'
+                status = 404
+                self._send_json(status, {'error': 'Endpoints: /price/<cnk>, /metrics, /health'})
+        except Exception as e:
+            status = 500
+            self._send_json(status, {'error': f"{type(e).__name__}: {e}"})
+        finally:
+            self.service.record_latency(endpoint, time.perf_counter() - start, error=status >= 500)
+
+
+def make_server(service: PriceService, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    handler = type('Handler', (PriceRequestHandler,), {'service': service})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Exécution partitionnée (--shard i/N) et fusion des sorties des shards.
+
+Chaque CNK appartient à exactement un shard, choisi par un hash stable du CNK
+(CRC32, identique d'un processus ou d'une machine à l'autre). Toutes les lignes d'un
+même CNK (doublons du grid compris) tombent donc dans le même shard, dans leur ordre
+d'entrée: la fusion reconstruit l'ordre du grid d'origine en reprenant, pour chaque
+ligne d'entrée, la prochaine ligne de son CNK dans les sorties des shards.
+"""
+
+import csv
+import json
+import zlib
+from collections import deque
+from typing import Dict, Iterable, List, Tuple
+
+
+def parse_shard(value: str) -> Tuple[int, int]:
+    """'2/8' -> (1, 8): index 0-based, nombre de shards. ValueError si invalide."""
+    index, _, count = value.partition('/')
+    index, count = int(index), int(count)
+    if count < 1 or not 1 <= index <= count:
+        raise ValueError(f"shard invalide: {value} (attendu i/N avec 1 <= i <= N)")
+    return index - 1, count
+
+
+def shard_of(cnk: str, count: int) -> int:
+    """Shard (0-based) d'un CNK parmi `count` (hash stable)."""
+    return zlib.crc32(cnk.strip().encode('utf-8')) % count
+
+
+def in_shard(cnk: str, index: int, count: int) -> bool:
+    return count <= 1 or shard_of(cnk, count) == index
+
+
+def merge_csv(grid_rows: Iterable[Tuple[str, str, str]], shard_files: List[str], output_file: str) -> Tuple[int, int]:
+    """
+    Fusionne les CSV consolidés des shards dans l'ordre du grid d'origine.
+
+    Args:
+        grid_rows: Lignes (nom, cnk, prix) du grid d'origine, dans l'ordre
+        shard_files: CSV consolidés produits par chaque shard (même en-tête)
+
+    Returns:
+        (lignes écrites, lignes absentes des shards - écrites avec les seules colonnes d'entrée)
+    """
+    header = None
+    rows: Dict[str, deque] = {}
+    for path in shard_files:
+        with open(path, newline='', encoding='utf-8') as f:
+            reader = csv.reader(f, delimiter=';')
+            shard_header = next(reader, None)
+            if shard_header is None:
+                continue
+            if header is None:
+                header = shard_header
+            elif shard_header != header:
+                raise ValueError(f"{path}: colonnes différentes des autres shards")
+            for row in reader:
+                if len(row) > 1:
+                    rows.setdefault(row[1], deque()).append(row)
+    if header is None:
+        raise ValueError("aucune sortie de shard lisible")
+
+    written = missing = 0
+    with open(output_file, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(header)
+        for name, cnk, price in grid_rows:
+            queue = rows.get(cnk)
+            if queue:
+                writer.writerow(queue.popleft())
+            else:
+                missing += 1
+                writer.writerow([name, cnk, price] + [''] * (len(header) - 3))
+            written += 1
+    return written, missing
+
+
+def merge_jsonl(grid_rows: Iterable[Tuple[str, str, str]], shard_files: List[str], output_file: str) -> Tuple[int, int]:
+    """
+    Fusionne les flux --jsonl des shards: les événements row (un par ligne consolidée,
+    doublons du grid compris) dans l'ordre du grid d'origine, comme merge_csv.
+
+    Returns:
+        (événements row écrits, lignes du grid sans événement row)
+    """
+    row_events: Dict[str, deque] = {}
+    for path in shard_files:
+        with open(path, encoding='utf-8') as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                event = json.loads(line)
+                if event.get('event') == 'row':
+                    row_events.setdefault(event['cnk'], deque()).append(line)
+
+    written = missing = 0
+    with open(output_file, 'w', encoding='utf-8') as f:
+        for _, cnk, _ in grid_rows:
+            queue = row_events.get(cnk)
+            if not queue:
+                missing += 1
+                continue
+            f.write(queue.popleft() + '\n')
+            written += 1
+    return written, missing
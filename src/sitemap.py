@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Synchronisation du catalogue depuis les sitemaps (sous-commande sync).
+
+Sur Farmaline et Medi-Market, l'URL d'une page produit contient le CNK (BE0{cnk}):
+le sitemap d'un site est donc un index CNK -> URL complet, récupérable en quelques
+requêtes. L'index de sitemaps et les sitemaps enfants (éventuellement gzippés) sont lus
+en flux: le XML est analysé au fil de la réception (ElementTree.iterparse), chaque
+élément <url> est libéré dès qu'il est lu, et la mémoire reste constante quelle que
+soit la taille des fichiers. Les paires (CNK, URL) alimentent l'index des pages produit
+du cache (cache.UrlIndex), que les scrapers lisent avant toute recherche.
+"""
+
+import gzip
+import re
+import time
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterator, Optional, Set, Tuple
+
+
+# Sitemaps racine par site (Medi-Market: boutique parapharmacie puis pharmacie, la
+# première URL rencontrée pour un CNK est gardée)
+SITEMAP_ROOTS = {
+    'farmaline': ("https://www.farmaline.be/sitemap.xml",),
+    'medi_market': ("https://medi-market.be/sitemap.xml", "https://pharmacy-medi-market.be/sitemap.xml"),
+}
+
+# Seules les pages en français sont indexées (celles que lisent les scrapers)
+SITEMAP_URL_FILTER = '/fr/'
+
+# Sitemaps lus au plus par site (index imbriqués compris)
+SITEMAP_MAX_FILES = 500
+
+# CNK d'une URL produit: BE0 suivi de 7 chiffres, en fin de segment
+_CNK_IN_URL = re.compile(r'BE0(\d{7})(?=[/?#.\-]|$)')
+
+
+def _local(tag: str) -> str:
+    """Nom d'une balise sans espace de noms ('{http://...}loc' -> 'loc')."""
+    return tag.rsplit('}', 1)[-1]
+
+
+def cnk_from_url(url: str) -> Optional[str]:
+    match = _CNK_IN_URL.search(url)
+    return match.group(1) if match else None
+
+
+def _open_stream(session, url: str, timeout: float, headers: Optional[Dict[str, str]] = None):
+    """Réponse HTTP ouverte en flux et fichier binaire décompressé à lire."""
+    resp = session.get(url, headers=headers, stream=True, timeout=timeout)
+    resp.raise_for_status()
+    raw = resp.raw
+    raw.decode_content = True  # Content-Encoding: gzip géré par urllib3
+    content_type = resp.headers.get('Content-Type', '')
+    if url.endswith('.gz') or 'gzip' in content_type:
+        return resp, gzip.GzipFile(fileobj=raw)
+    return resp, raw
+
+
+def iter_sitemap(stream) -> Iterator[Tuple[str, str]]:
+    """
+    Entrées d'un fichier sitemap lu en flux: ('sitemap', url) pour un index de sitemaps,
+    ('url', url) pour une liste de pages.
+    """
+    kind = None
+    root = None
+    for event, elem in ET.iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+                kind = 'sitemap' if _local(elem.tag) == 'sitemapindex' else 'url'
+            continue
+        tag = _local(elem.tag)
+        if tag == 'loc' and elem.text:
+            yield kind, elem.text.strip()
+        elif tag in ('url', 'sitemap'):
+            # Libérer l'entrée lue (et sa référence dans la racine)
+            elem.clear()
+            root.clear()
+
+
+def iter_catalog(session, roots, timeout: float = 60, headers: Optional[Dict[str, str]] = None,
+                 max_files: int = SITEMAP_MAX_FILES,
+                 on_file: Optional[Callable[[str], None]] = None) -> Iterator[Tuple[str, str]]:
+    """
+    Paires (CNK, URL produit) des sitemaps d'un site, sitemaps enfants suivis.
+    Un sitemap illisible est signalé via `on_file` et ignoré (les autres sont lus).
+
+    Args:
+        roots: URLs des sitemaps racine
+        on_file: appelé avec l'URL de chaque sitemap lu, ou 'url: erreur' si illisible
+    """
+    pending = list(reversed(roots))
+    visited: Set[str] = set()
+    seen: Set[str] = set()
+    while pending and len(visited) < max_files:
+        url = pending.pop()
+        if url in visited:
+            continue
+        visited.add(url)
+        children = []
+        try:
+            resp, stream = _open_stream(session, url, timeout, headers)
+            try:
+                for kind, loc in iter_sitemap(stream):
+                    if kind == 'sitemap':
+                        children.append(loc)
+                        continue
+                    if SITEMAP_URL_FILTER and SITEMAP_URL_FILTER not in loc:
+                        continue
+                    cnk = cnk_from_url(loc)
+                    if cnk and cnk not in seen:
+                        seen.add(cnk)
+                        yield cnk, loc
+            finally:
+                resp.close()
+        except Exception as e:
+            if on_file:
+                on_file(f"{url}: {e}")
+            continue
+        if on_file:
+            on_file(url)
+        # Enfants dans l'ordre de l'index
+        pending.extend(reversed(children))
+
+
+def sync_site(session, site: str, index, timeout: float = 60, headers: Optional[Dict[str, str]] = None,
+              on_file: Optional[Callable[[str], None]] = None) -> Dict[str, float]:
+    """
+    Synchronise l'index des pages produit d'un site avec ses sitemaps.
+
+    Args:
+        index: cache.UrlIndex ouvert
+
+    Returns:
+        {'urls': paires lues, 'written': entrées ajoutées ou modifiées, 'seconds': durée}
+    """
+    start = time.time()
+    seen, written = index.sync(site, iter_catalog(session, SITEMAP_ROOTS[site], timeout, headers, on_file=on_file))
+    return {'urls': seen, 'written': written, 'seconds': time.time() - start}
@@ -0,0 +1,256 @@
+#!/usr/bin/env python3
+"""
+Couche de transport HTTP enregistrable / rejouable, commune aux scrapers.
+
+Les sessions requests (Medi-Market, cloudscraper NewPharma, listings --bulk) reçoivent
+un adaptateur, les sessions aiohttp (Farmaline, Multipharma) sont enveloppées. Un
+`store` reçoit chaque réponse complète (enregistrement) ou les fournit à la place du
+réseau (relecture):
+
+    store.replaying                      True en relecture
+    store.record(method, url, Recorded)  réponse reçue (enregistrement)
+    store.replay(method, url)            Recorded, ou None si absente (relecture)
+    store.latency                        facteur de la durée enregistrée attendue avant
+                                         chaque réponse rejouée (0: réponse immédiate)
+
+En relecture, une requête sans réponse enregistrée échoue comme une erreur réseau
+(requests.ConnectionError / aiohttp.ClientConnectionError): les scrapers la traitent
+comme n'importe quelle page inaccessible. Aucune connexion n'est ouverte.
+"""
+
+import asyncio
+import json
+import time
+from http import HTTPStatus
+from typing import Dict, NamedTuple, Optional
+
+import requests
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+
+# En-têtes qui ne décrivent plus le corps enregistré (déjà décompressé, longueur libre)
+_DROPPED_HEADERS = ('content-encoding', 'transfer-encoding', 'content-length')
+
+
+class Recorded(NamedTuple):
+    status: int
+    url: str                     # URL finale (après redirections aiohttp)
+    headers: Dict[str, str]
+    body: bytes
+    elapsed: float = 0.0         # secondes entre l'envoi et la fin de lecture du corps
+
+
+def _headers(headers) -> Dict[str, str]:
+    return {k: v for k, v in headers.items() if k.lower() not in _DROPPED_HEADERS}
+
+
+def _delay(store, recorded: Recorded) -> float:
+    """Attente réimposée avant une réponse rejouée (latence enregistrée × store.latency)."""
+    return recorded.elapsed * store.latency if store.latency > 0 else 0.0
+
+
+def _reason(status: int) -> str:
+    try:
+        return HTTPStatus(status).phrase
+    except ValueError:
+        return ''
+
+
+class ReplayMiss(requests.ConnectionError):
+    """Requête sans réponse enregistrée (relecture)."""
+
+
+# -- requests -----------------------------------------------------------------
+
+class RecordingAdapter(BaseAdapter):
+    """Enveloppe l'adaptateur d'origine d'une session (TLS cloudscraper conservé)."""
+
+    def __init__(self, inner, store):
+        super().__init__()
+        self.inner = inner
+        self.store = store
+
+    def send(self, request, stream=False, **kwargs):
+        start = time.perf_counter()
+        resp = self.inner.send(request, stream=stream, **kwargs)
+        # Réponses lues en flux (sitemaps): corps non lu ici, non enregistrées
+        if not stream:
+            body = resp.content
+            self.store.record(request.method, request.url, Recorded(
+                resp.status_code, request.url, _headers(resp.headers), body, time.perf_counter() - start
+            ))
+        return resp
+
+    def close(self):
+        self.inner.close()
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, store):
+        super().__init__()
+        self.store = store
+
+    def send(self, request, stream=False, **kwargs):
+        recorded = self.store.replay(request.method, request.url)
+        if recorded is None:
+            raise ReplayMiss(f"aucune réponse enregistrée pour {request.method} {request.url}", request=request)
+        delay = _delay(self.store, recorded)
+        if delay:
+            time.sleep(delay)
+        resp = requests.Response()
+        resp.status_code = recorded.status
+        resp.headers = CaseInsensitiveDict(recorded.headers)
+        resp.encoding = get_encoding_from_headers(resp.headers)
+        resp._content = recorded.body
+        resp.url = request.url
+        resp.request = request
+        resp.reason = _reason(recorded.status)
+        return resp
+
+    def close(self):
+        pass
+
+
+def install(session: requests.Session, store) -> requests.Session:
+    """Branche le store sur tous les préfixes montés de la session requests."""
+    for prefix, adapter in list(session.adapters.items()):
+        if isinstance(adapter, (RecordingAdapter, ReplayAdapter)):
+            continue
+        session.mount(prefix, ReplayAdapter(store) if store.replaying else RecordingAdapter(adapter, store))
+    return session
+
+
+# -- aiohttp ------------------------------------------------------------------
+
+class _RequestContext:
+    """Résultat de session.get(): attendu directement ou utilisé en `async with`."""
+
+    def __init__(self, coro):
+        self._coro = coro
+        self._resp = None
+
+    def __await__(self):
+        return self._coro.__await__()
+
+    async def __aenter__(self):
+        self._resp = await self._coro
+        return self._resp
+
+    async def __aexit__(self, *exc):
+        self._resp.release()
+
+
+class ReplayResponse:
+    """Réponse aiohttp reconstituée (sous-ensemble utilisé par les scrapers et aiohttp_retry)."""
+
+    def __init__(self, method: str, recorded: Recorded):
+        from multidict import CIMultiDictProxy, CIMultiDict
+        from yarl import URL
+        self.method = method
+        self.status = recorded.status
+        self.url = URL(recorded.url)
+        self.headers = CIMultiDictProxy(CIMultiDict(recorded.headers))
+        self.reason = _reason(recorded.status)
+        self.closed = False
+        self._body = recorded.body
+
+    @property
+    def ok(self) -> bool:
+        return self.status < 400
+
+    @property
+    def content_type(self) -> str:
+        return self.headers.get('Content-Type', 'application/octet-stream').split(';')[0].strip()
+
+    def _charset(self) -> str:
+        content_type = self.headers.get('Content-Type', '')
+        if 'charset=' in content_type:
+            return content_type.split('charset=')[-1].split(';')[0].strip()
+        return 'utf-8'
+
+    async def read(self) -> bytes:
+        return self._body
+
+    async def text(self, encoding: Optional[str] = None, errors: str = 'strict') -> str:
+        return self._body.decode(encoding or self._charset(), errors)
+
+    async def json(self, *, encoding: Optional[str] = None, loads=json.loads, content_type=None):
+        return loads(self._body.decode(encoding or self._charset()))
+
+    def raise_for_status(self) -> None:
+        if self.status >= 400:
+            import aiohttp
+            raise aiohttp.ClientResponseError(None, (), status=self.status, message=self.reason)
+
+    def release(self) -> None:
+        pass
+
+    def close(self) -> None:
+        self.closed = True
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        self.release()
+
+
+class ClientSessionWrapper:
+    """
+    Session aiohttp enveloppée: même interface que ClientSession pour les scrapers
+    (get/request attendus ou en `async with`, close, contexte async) et RetryClient.
+    """
+
+    def __init__(self, session, store):
+        self._session = session
+        self.store = store
+
+    def request(self, method: str, url, **kwargs) -> _RequestContext:
+        return _RequestContext(self._request(method.upper(), str(url), **kwargs))
+
+    def get(self, url, **kwargs) -> _RequestContext:
+        return self.request('GET', url, **kwargs)
+
+    def post(self, url, **kwargs) -> _RequestContext:
+        return self.request('POST', url, **kwargs)
+
+    async def _request(self, method: str, url: str, **kwargs):
+        if self.store.replaying:
+            recorded = self.store.replay(method, url)
+            if recorded is None:
+                import aiohttp
+                raise aiohttp.ClientConnectionError(f"aucune réponse enregistrée pour {method} {url}")
+            delay = _delay(self.store, recorded)
+            if delay:
+                await asyncio.sleep(delay)
+            return ReplayResponse(method, recorded)
+        start = time.perf_counter()
+        resp = await self._session.request(method, url, **kwargs)
+        body = await resp.read()  # corps gardé par la réponse: les lectures suivantes le réutilisent
+        self.store.record(method, url, Recorded(
+            resp.status, str(resp.url), _headers(resp.headers), body, time.perf_counter() - start
+        ))
+        return resp
+
+    @property
+    def closed(self) -> bool:
+        return self._session.closed
+
+    async def close(self) -> None:
+        await self._session.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    def __getattr__(self, name):
+        return getattr(self._session, name)
+
+
+def wrap_client_session(session, store):
+    """Session aiohttp branchée sur le store (inchangée si store est None)."""
+    return session if store is None else ClientSessionWrapper(session, store)
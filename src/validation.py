@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Validation post-consolidation pour LP_Pharma.
+
+Repère, sur toute la table de résultats en une passe vectorielle, les prix à faire
+vérifier par un humain:
+  - match par nom peu fiable (score < seuil, les lignes ❓)
+  - prix d'un site trop éloigné de la médiane des autres sites
+  - prix d'un site trop éloigné du Prix_Base
+
+Produit une liste compacte "à vérifier" (CNK, site, prix, raisons) et le masque des
+(CNK, site) concernés, utilisable pour ne re-scraper que ces lignes.
+"""
+
+import csv
+from typing import List, NamedTuple
+
+import numpy as np
+
+from results import ResultTable, SITE_LABELS, compute_price_stats
+
+
+# Seuils par défaut
+DEFAULT_MAX_RATIO = 0.35   # ±35% autour de la médiane ou du Prix_Base
+DEFAULT_MIN_SCORE = 70.0   # En dessous: match ❓ (faible confiance)
+
+# Raisons (bitmask int8 par CNK × site)
+REASON_LOW_SCORE = 1
+REASON_MEDIAN = 2
+REASON_BASE = 4
+
+REASON_LABELS = {
+    REASON_LOW_SCORE: "score faible",
+    REASON_MEDIAN: "écart médiane",
+    REASON_BASE: "écart Prix_Base",
+}
+
+REVIEW_COLUMNS = ["CNK", "Site", "Prix", "Prix Médian", "Prix_Base", "Score", "Raisons"]
+
+
+class ReviewEntry(NamedTuple):
+    cnk: str
+    site: str
+    price: float
+    median: float
+    base: float
+    score: float
+    reasons: int
+
+
+def flag_for_review(
+    table: ResultTable,
+    max_ratio: float = DEFAULT_MAX_RATIO,
+    min_score: float = DEFAULT_MIN_SCORE
+) -> np.ndarray:
+    """
+    Calcule le masque des raisons de vérification pour chaque (CNK, site).
+
+    Args:
+        table: Table de résultats (matrice CNK × site des prix et des scores)
+        max_ratio: Écart relatif toléré par rapport à la médiane inter-sites et au Prix_Base
+        min_score: Score de match (0-100) en dessous duquel un prix est douteux
+
+    Returns:
+        Matrice int8 (n_cnk, n_sites), 0 = rien à signaler, sinon combinaison de REASON_*
+    """
+    prices = table.prices
+    valid = ~np.isnan(prices)
+    count = valid.sum(axis=1)
+
+    # Médiane inter-sites: celle de compute_price_stats si déjà calculée
+    median = table.stats.get('Prix Médian')
+    if median is None:
+        median = compute_price_stats(table)['Prix Médian']
+
+    with np.errstate(invalid='ignore', divide='ignore'):
+        gap_median = np.abs(prices / median[:, None] - 1.0)
+        gap_base = np.abs(prices / table.base_prices[:, None] - 1.0)
+
+    reasons = np.zeros(prices.shape, dtype=np.int8)
+    # NaN < seuil est False: les sites sans score (recherche par CNK) ne sont jamais "score faible"
+    reasons |= np.where(valid & (table.scores < min_score), REASON_LOW_SCORE, 0).astype(np.int8)
+    # L'écart à la médiane n'a de sens qu'à partir de 2 sites
+    reasons |= np.where(valid & (count >= 2)[:, None] & (gap_median > max_ratio), REASON_MEDIAN, 0).astype(np.int8)
+    reasons |= np.where(valid & (gap_base > max_ratio), REASON_BASE, 0).astype(np.int8)
+    return reasons
+
+
+def review_entries(table: ResultTable, reasons: np.ndarray) -> List[ReviewEntry]:
+    """Liste compacte des (CNK, site) signalés, dans l'ordre de la table."""
+    median = table.stats.get('Prix Médian', np.full(len(table), np.nan))
+    rows, cols = np.nonzero(reasons)
+    return [
+        ReviewEntry(
+            cnk=table.cnks[i],
+            site=table.sites[j],
+            price=float(table.prices[i, j]),
+            median=float(median[i]),
+            base=float(table.base_prices[i]),
+            score=float(table.scores[i, j]),
+            reasons=int(reasons[i, j]),
+        )
+        for i, j in zip(rows.tolist(), cols.tolist())
+    ]
+
+
+def describe_reasons(reasons: int) -> str:
+    """Libellé lisible d'un bitmask de raisons (ex: 'score faible, écart médiane')."""
+    return ", ".join(label for bit, label in REASON_LABELS.items() if reasons & bit)
+
+
+def write_review_list(entries: List[ReviewEntry], output_file: str, append: bool = False) -> None:
+    """
+    Écrit la liste "à vérifier" en CSV (séparateur ';', décimales à virgule).
+    Avec append=True, ajoute les lignes à un fichier existant (mode streaming par blocs).
+    """
+    def fmt(value):
+        return "" if value != value else f"{value:.2f}".replace('.', ',')
+
+    with open(output_file, "a" if append else "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f, delimiter=";")
+        if not append:
+            writer.writerow(REVIEW_COLUMNS)
+        for e in entries:
+            writer.writerow([
+                e.cnk,
+                SITE_LABELS.get(e.site, e.site),
+                fmt(e.price),
+                fmt(e.median),
+                fmt(e.base),
+                "" if e.score != e.score else f"{e.score:.0f}%",
+                describe_reasons(e.reasons),
+            ])
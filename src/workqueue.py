@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+"""
+File de travail SQLite pour LP_Pharma (mode --workers N).
+
+Un coordinateur charge les tâches (site, CNK) dans une table SQLite; plusieurs processus
+workers les réclament par lots avec un bail (lease), écrivent leurs résultats et se
+terminent quand la file est vide. Un bail expiré (worker lent) ou détenu par un processus
+mort de la même machine (worker planté) remet ses tâches en attente pour un autre
+worker, jusqu'à MAX_ATTEMPTS tentatives.
+
+Le débit de chaque site est limité pour l'ensemble des workers par un seau à jetons
+stocké dans la même base (réservation des jetons dans la transaction du claim).
+
+Les sites à recherche par nom (NewPharma, Multipharma) utilisent le nom trouvé sur
+Medi-Market: leurs tâches ne sont réclamées qu'une fois la tâche Medi-Market du même
+CNK terminée (si Medi-Market fait partie des sites).
+"""
+
+import os
+import socket
+import sqlite3
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from results import ResultTable, SITES
+
+
+DEFAULT_QUEUE_PATH = Path(__file__).parents[1] / "data" / "queue.sqlite3"
+
+
+# Débit partagé par tous les workers (recherches par minute et par site)
+QUEUE_RATE_BUDGETS = {
+    'medi_market': 300.0,
+    'farmaline': 10.0,
+    'newpharma': 6.0,
+    'multipharma': 300.0,
+}
+
+# Taille des lots réclamés par un worker
+BATCH_SIZES = {
+    'medi_market': 20,
+    'farmaline': 4,
+    'newpharma': 4,
+    'multipharma': 20,
+}
+
+# Durée d'un bail (secondes) et nombre maximal de tentatives par tâche
+LEASE_SECONDS = 15 * 60
+MAX_ATTEMPTS = 3
+
+# Sites dont le score de match est significatif (recherche par nom)
+NAME_SEARCH_SITES = ('newpharma', 'multipharma')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS tasks (
+    site TEXT NOT NULL,
+    cnk TEXT NOT NULL,
+    name TEXT NOT NULL DEFAULT '',
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    lease_owner TEXT,
+    lease_expires REAL,
+    price REAL,
+    score REAL,
+    source TEXT,
+    found_name TEXT,
+    updated_at REAL,
+    PRIMARY KEY (site, cnk)
+);
+CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks(site, status);
+CREATE TABLE IF NOT EXISTS rate_limits (
+    site TEXT PRIMARY KEY,
+    rate REAL NOT NULL,
+    capacity REAL NOT NULL,
+    tokens REAL NOT NULL,
+    updated REAL NOT NULL
+);
+"""
+
+
+def shard_queue_path(index: int, count: int) -> Path:
+    """File par défaut du shard `index` (0-based) parmi `count`: data/queue_shard_2_of_4.sqlite3."""
+    return DEFAULT_QUEUE_PATH.with_name(f"queue_shard_{index + 1}_of_{count}.sqlite3")
+
+
+def lease_owner(worker_id: str) -> str:
+    """Identifiant de bail d'un worker: nom, machine et PID du processus."""
+    return f"{worker_id}@{socket.gethostname()}:{os.getpid()}"
+
+
+def owner_alive(owner: str) -> bool:
+    """
+    False si le bail appartient à un processus mort de cette machine. Un propriétaire
+    d'une autre machine (ou sans PID) est supposé vivant: seul son bail expire.
+    """
+    _, _, location = owner.rpartition('@')
+    host, _, pid = location.rpartition(':')
+    if host != socket.gethostname() or not pid.isdigit():
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class WorkQueue:
+    """File de tâches (site, CNK) partagée entre processus via un fichier SQLite."""
+
+    def __init__(self, path=DEFAULT_QUEUE_PATH):
+        self.path = Path(path).expanduser()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        # Transactions explicites (BEGIN IMMEDIATE) pour les claims concurrents
+        self.conn = sqlite3.connect(str(self.path), timeout=60, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def _transaction(self):
+        return _Immediate(self.conn)
+
+    # -- coordinateur ---------------------------------------------------------
+
+    def reset(self) -> None:
+        with self._transaction():
+            self.conn.execute("DELETE FROM tasks")
+            self.conn.execute("DELETE FROM rate_limits")
+
+    def load(self, cnk_list: Iterable[str], product_names: Dict[str, str], sites: Iterable[str],
+             budgets: Optional[Dict[str, float]] = None,
+             medi_names: Optional[Dict[str, str]] = None) -> None:
+        """
+        Ajoute les tâches (site, CNK) manquantes et configure le débit de chaque site.
+        `medi_names` (noms Medi-Market déjà connus) est gardé avec les tâches des sites
+        à recherche par nom, pour les CNK sans tâche Medi-Market dans la file.
+        """
+        budgets = budgets or QUEUE_RATE_BUDGETS
+        medi_names = medi_names or {}
+        now = time.time()
+        sites = [site for site in SITES if site in sites]
+        with self._transaction():
+            self.conn.executemany(
+                "INSERT OR IGNORE INTO tasks (site, cnk, name, found_name, updated_at) VALUES (?, ?, ?, ?, ?)",
+                [(site, cnk, product_names.get(cnk, '') or '',
+                  medi_names.get(cnk) if site in NAME_SEARCH_SITES else None, now)
+                 for site in sites for cnk in cnk_list]
+            )
+            for site in sites:
+                per_minute = budgets.get(site, 60.0)
+                self.conn.execute(
+                    """INSERT INTO rate_limits (site, rate, capacity, tokens, updated) VALUES (?, ?, ?, ?, ?)
+                       ON CONFLICT(site) DO UPDATE SET rate = excluded.rate, capacity = excluded.capacity""",
+                    (site, per_minute / 60.0, max(1.0, BATCH_SIZES.get(site, 10)), max(1.0, BATCH_SIZES.get(site, 10)), now)
+                )
+
+    def counts(self) -> Dict[str, int]:
+        """Nombre de tâches par statut (pending, leased, done, failed)."""
+        counts = {'pending': 0, 'leased': 0, 'done': 0, 'failed': 0}
+        for status, count in self.conn.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"):
+            counts[status] = count
+        return counts
+
+    def remaining(self) -> int:
+        counts = self.counts()
+        return counts['pending'] + counts['leased']
+
+    def result_table(self, cnk_list: List[str], sites: Iterable[str]) -> ResultTable:
+        """ResultTable des tâches terminées (une tâche en échec = non trouvé)."""
+        table = ResultTable(cnk_list)
+        wanted = set(cnk_list)
+        for site in [site for site in SITES if site in sites]:
+            prices, scores, sources, names = {}, {}, {}, {}
+            for cnk, price, score, source, found_name in self.conn.execute(
+                "SELECT cnk, price, score, source, found_name FROM tasks WHERE site = ? AND status = 'done'",
+                (site,)
+            ):
+                if cnk not in wanted:
+                    continue
+                if price is not None:
+                    prices[cnk] = price
+                if score is not None:
+                    scores[cnk] = score
+                if source:
+                    sources[cnk] = source
+                if found_name:
+                    names[cnk] = found_name
+            table.set_site(site, prices, scores if site in NAME_SEARCH_SITES else None, sources or None)
+            if site == 'medi_market':
+                table.set_names(names)
+        return table
+
+    # -- workers --------------------------------------------------------------
+
+    def _take_tokens(self, site: str, wanted: int, now: float) -> int:
+        row = self.conn.execute(
+            "SELECT rate, capacity, tokens, updated FROM rate_limits WHERE site = ?", (site,)
+        ).fetchone()
+        if row is None:
+            return wanted
+        rate, capacity, tokens, updated = row
+        tokens = min(capacity, tokens + max(0.0, now - updated) * rate)
+        granted = min(wanted, int(tokens))
+        self.conn.execute(
+            "UPDATE rate_limits SET tokens = ?, updated = ? WHERE site = ?",
+            (tokens - granted, now, site)
+        )
+        return granted
+
+    def claim(self, worker_id: str, lease_seconds: Optional[float] = None) -> Optional[Tuple[str, List[Tuple[str, str, str]]]]:
+        """
+        Réclame un lot de tâches d'un site (le premier, dans l'ordre des phases, qui a
+        des tâches prêtes et des jetons de débit disponibles).
+
+        Returns:
+            (site, [(cnk, nom grid, nom Medi-Market)]) ou None si rien n'est réclamable
+        """
+        lease_seconds = lease_seconds or LEASE_SECONDS
+        now = time.time()
+        with self._transaction():
+            # Baux expirés ou de workers morts: retour en file (ou échec après MAX_ATTEMPTS)
+            self.conn.execute(
+                """UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                   WHERE status = 'leased' AND lease_expires < ?""",
+                (MAX_ATTEMPTS, now, now)
+            )
+            dead = [owner for (owner,) in self.conn.execute(
+                "SELECT DISTINCT lease_owner FROM tasks WHERE status = 'leased' AND lease_owner IS NOT NULL"
+            ) if not owner_alive(owner)]
+            self.conn.executemany(
+                """UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                   WHERE status = 'leased' AND lease_owner = ?""",
+                [(MAX_ATTEMPTS, now, owner) for owner in dead]
+            )
+            sites = [row[0] for row in self.conn.execute("SELECT DISTINCT site FROM tasks WHERE status = 'pending'")]
+            for site in [site for site in SITES if site in sites]:
+                dependency = ""
+                if site in NAME_SEARCH_SITES:
+                    dependency = """AND NOT EXISTS (SELECT 1 FROM tasks m WHERE m.site = 'medi_market'
+                                                    AND m.cnk = t.cnk AND m.status IN ('pending', 'leased'))"""
+                # Nom Medi-Market: celui de la tâche Medi-Market, sinon celui fourni au chargement
+                rows = self.conn.execute(
+                    f"""SELECT t.cnk, t.name,
+                               COALESCE((SELECT m.found_name FROM tasks m
+                                          WHERE m.site = 'medi_market' AND m.cnk = t.cnk), t.found_name)
+                          FROM tasks t WHERE t.site = ? AND t.status = 'pending' {dependency}
+                         ORDER BY t.rowid LIMIT ?""",
+                    (site, BATCH_SIZES.get(site, 10))
+                ).fetchall()
+                if not rows:
+                    continue
+                granted = self._take_tokens(site, len(rows), now)
+                if not granted:
+                    continue
+                rows = rows[:granted]
+                self.conn.executemany(
+                    """UPDATE tasks SET status = 'leased', lease_owner = ?, lease_expires = ?,
+                                        attempts = attempts + 1, updated_at = ?
+                       WHERE site = ? AND cnk = ?""",
+                    [(worker_id, now + lease_seconds, now, site, cnk) for cnk, _, _ in rows]
+                )
+                return site, [(cnk, name or '', medi_name or '') for cnk, name, medi_name in rows]
+        return None
+
+    def complete(self, worker_id: str, site: str, results: Iterable[Tuple[str, Optional[float], Optional[float], Optional[str], Optional[str]]]) -> int:
+        """
+        Enregistre les résultats (cnk, prix, score, source, nom trouvé) d'un lot.
+        Une tâche déjà terminée par un autre worker (bail expiré entre-temps) n'est pas écrasée.
+        """
+        now = time.time()
+        with self._transaction():
+            cur = self.conn.executemany(
+                """UPDATE tasks SET status = 'done', price = ?, score = ?, source = ?, found_name = ?,
+                                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                   WHERE site = ? AND cnk = ? AND status != 'done'""",
+                [(price, score, source, found_name, now, site, cnk) for cnk, price, score, source, found_name in results]
+            )
+        return cur.rowcount
+
+    def release(self, worker_id: str, site: str, cnks: Iterable[str]) -> None:
+        """Rend les tâches d'un lot en erreur (nouvelle tentative, ou échec après MAX_ATTEMPTS)."""
+        now = time.time()
+        with self._transaction():
+            self.conn.executemany(
+                """UPDATE tasks SET status = CASE WHEN attempts >= ? THEN 'failed' ELSE 'pending' END,
+                                    lease_owner = NULL, lease_expires = NULL, updated_at = ?
+                   WHERE site = ? AND cnk = ? AND lease_owner = ?""",
+                [(MAX_ATTEMPTS, now, site, cnk, worker_id) for cnk in cnks]
+            )
+
+    def next_wait(self) -> float:
+        """Secondes à attendre avant qu'un claim ait une chance d'aboutir (jetons ou baux)."""
+        now = time.time()
+        waits = [
+            max(0.0, (1.0 - tokens - (now - updated) * rate) / rate)
+            for rate, tokens, updated in self.conn.execute("SELECT rate, tokens, updated FROM rate_limits WHERE rate > 0")
+        ]
+        return min([w for w in waits if w > 0] + [2.0])
+
+
+class _Immediate:
+    """Transaction BEGIN IMMEDIATE (verrou d'écriture pris dès le début)."""
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, *exc):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
@@ -0,0 +1,5 @@
+import sys
+from pathlib import Path
+
+# Modules du scraper importés directement (src/ à plat, comme scraper.py le fait)
+sys.path.insert(0, str(Path(__file__).parents[1] / "src"))
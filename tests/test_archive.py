@@ -0,0 +1,49 @@
+"""Archive des réponses brutes: enregistrement d'un run puis relecture (archive.ResponseArchive)."""
+
+import pytest
+
+from archive import ResponseArchive
+from transport import Recorded
+
+
+SEARCH = "https://www.newpharma.be/fr/search-results/index.html?key=4862482"
+PRODUCT = "https://www.newpharma.be/fr/caudalie/vinosource/p12345.html"
+HEADERS = {'Content-Type': 'text/html; charset=utf-8'}
+
+
+def page(url, body, status=200):
+    return Recorded(status, url, HEADERS, body, 0.25)
+
+
+def test_recorded_run_is_replayed(tmp_path):
+    with ResponseArchive(tmp_path) as archive:
+        run_id = archive.start_run('scraper.py grid.csv')
+        archive.record('GET', SEARCH, page(SEARCH, b"<html>recherche</html>"))
+        archive.record('GET', PRODUCT, page(PRODUCT, b"<html>produit</html>"))
+        archive.record('GET', SEARCH, page(SEARCH, b"<html>recherche (2)</html>"))
+        assert archive.recorded == 3
+
+    with ResponseArchive(tmp_path) as archive:
+        info = archive.open_run(run_id)
+        assert info['command'] == 'scraper.py grid.csv' and info['sites'] == {'newpharma': 3}
+        assert archive.replay('GET', PRODUCT) == page(PRODUCT, b"<html>produit</html>")
+        assert archive.replay('GET', SEARCH).body == b"<html>recherche (2)</html>"
+        assert archive.replay('GET', PRODUCT + "?page=2") is None
+        assert (archive.replayed, archive.missed) == (2, 1)
+
+
+def test_identical_bodies_share_one_blob(tmp_path):
+    with ResponseArchive(tmp_path) as archive:
+        archive.start_run()
+        archive.record('GET', SEARCH, page(SEARCH, b"<html>identique</html>"))
+        stored = archive.stored_bytes
+        archive.start_run()
+        archive.record('GET', PRODUCT, page(PRODUCT, b"<html>identique</html>"))
+        assert archive.stored_bytes == stored
+    assert len([p for p in (tmp_path / "blobs").rglob("*") if p.is_file()]) == 1
+
+
+def test_unknown_run_cannot_be_opened(tmp_path):
+    with ResponseArchive(tmp_path) as archive:
+        with pytest.raises(KeyError):
+            archive.open_run(42)
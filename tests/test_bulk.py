@@ -0,0 +1,35 @@
+"""Matching hors ligne d'une marque contre son listing (bulk.match_catalog)."""
+
+import bulk
+from bulk import Candidate
+
+
+LISTING = [
+    Candidate("Caudalie Vinosource Crème Sorbet 40ml", 20.5, "https://example.test/sorbet-40"),
+    Candidate("Caudalie Vinoperfect Sérum Éclat 30ml", 39.9, "https://example.test/serum-30"),
+]
+
+
+def test_clear_match_is_accepted():
+    matches = bulk.match_catalog(LISTING, {"1": [("Caudalie Vinosource Crème Sorbet 40ml", "grid")]})
+    price, score, source, candidate = matches["1"]
+    assert (price, score, source, candidate.url) == (20.5, 100.0, "grid", "https://example.test/sorbet-40")
+
+
+def test_other_pack_size_only_is_rejected():
+    matches = bulk.match_catalog(LISTING, {"1": [("Caudalie Vinosource Crème Sorbet 50ml", "grid")]})
+    assert matches == {}
+
+
+def test_near_tie_between_two_products_is_rejected():
+    listing = [
+        Candidate("Caudalie Vinosource Crème Sorbet", 20.5, "https://example.test/a"),
+        Candidate("Caudalie Vinosource Crème Sorbets", 16.9, "https://example.test/b"),
+    ]
+    matches = bulk.match_catalog(listing, {"1": [("Caudalie Vinosource Crème Sorbet x", "grid")]})
+    assert matches == {}
+
+
+def test_quantities_are_normalized():
+    assert bulk.quantities("Eau thermale 1,5 L") == {"1.5l"}
+    assert bulk.quantities("Crème 30 ml") == bulk.quantities("Crème 30ml") == {"30ml"}
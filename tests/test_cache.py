@@ -0,0 +1,56 @@
+"""Cache persistant: validité du cache négatif, copie enregistrée avec un run (cache.py)."""
+
+import sqlite3
+
+import cache
+
+
+HOUR = 3600.0
+
+
+def later(monkeypatch, hours):
+    """Avance l'horloge du cache de `hours` heures."""
+    monkeypatch.setitem(cache.CLOCK, 'offset', cache.CLOCK['offset'] - hours * HOUR)
+
+
+def test_ttl_grows_with_each_proof_up_to_the_cap(tmp_path, monkeypatch):
+    with cache.NegativeCache(tmp_path / "cache.sqlite3", ttl=HOUR) as negative:
+        negative.record('medi_market', ['1'])
+        assert negative.absent('medi_market', ['1', '2']) == {'1'}
+        later(monkeypatch, 1.01)
+        assert negative.absent('medi_market', ['1']) == set()
+
+        # Deuxième preuve: 2 h de validité à partir de cette recherche
+        negative.record('medi_market', ['1'])
+        later(monkeypatch, 1.5)
+        assert negative.absent('medi_market', ['1']) == {'1'}
+        later(monkeypatch, 0.6)
+        assert negative.absent('medi_market', ['1']) == set()
+
+        for _ in range(6):
+            negative.record('medi_market', ['1'])
+        later(monkeypatch, cache.NEGATIVE_TTL_MAX_FACTOR - 0.1)
+        assert negative.absent('medi_market', ['1']) == {'1'}
+        later(monkeypatch, 0.2)
+        assert negative.absent('medi_market', ['1']) == set()
+
+
+def test_found_product_is_forgotten(tmp_path):
+    with cache.NegativeCache(tmp_path / "cache.sqlite3") as negative:
+        negative.record('farmaline', ['1', '2'])
+        negative.record('farmaline', [], found=['1'])
+        assert negative.absent('farmaline', ['1', '2']) == {'2'}
+        assert negative.absent('medi_market', ['2']) == set()
+        assert negative.stats() == {'farmaline': 1}
+
+
+def test_snapshot_is_a_readable_copy(tmp_path):
+    path = tmp_path / "cache.sqlite3"
+    assert cache.snapshot(path) == b''
+    with cache.NegativeCache(path) as negative:
+        negative.record('medi_market', ['1'])
+        copy = tmp_path / "copy.sqlite3"
+        copy.write_bytes(cache.snapshot(path))
+    conn = sqlite3.connect(str(copy))
+    assert conn.execute("SELECT cnk, attempts FROM negative").fetchall() == [('1', 1)]
+    conn.close()
@@ -0,0 +1,125 @@
+"""Cassette HTTP: enregistrement via le transport puis relecture ordonnée hors ligne."""
+
+import asyncio
+
+import aiohttp
+import pytest
+import requests
+
+import transport
+from cassette import Cassette
+
+
+URL = "https://www.multipharma.be/fr/search?q=dafalgan"
+
+
+class FakeResponse:
+    def __init__(self, url, body):
+        self.status = 200
+        self.url = url
+        self.headers = {'Content-Type': 'text/html; charset=utf-8', 'Content-Encoding': 'gzip'}
+        self._body = body
+
+    async def read(self):
+        return self._body
+
+    def release(self):
+        pass
+
+
+class FakeSession:
+    """Session aiohttp minimale: une réponse différente à chaque requête."""
+
+    def __init__(self):
+        self.sent = 0
+        self.closed = False
+
+    async def request(self, method, url, **kwargs):
+        self.sent += 1
+        return FakeResponse(url, f"page {self.sent}".encode())
+
+    async def close(self):
+        self.closed = True
+
+
+def record(path, urls):
+    async def run():
+        async with transport.ClientSessionWrapper(FakeSession(), store) as session:
+            for url in urls:
+                async with session.get(url) as resp:
+                    await resp.read()
+
+    with Cassette(path) as store:
+        store.record_to('test')
+        asyncio.run(run())
+        return store.recorded
+
+
+def replay_bodies(path, urls):
+    async def run(session):
+        bodies = []
+        for url in urls:
+            async with session.get(url) as resp:
+                assert isinstance(resp, transport.ReplayResponse) and resp.ok
+                bodies.append(await resp.text())
+        return bodies
+
+    store = Cassette(path)
+    store.open_replay()
+    session = transport.ClientSessionWrapper(FakeSession(), store)
+    bodies = asyncio.run(run(session))
+    assert session._session.sent == 0
+    return store, bodies
+
+
+def test_replay_follows_recorded_order(tmp_path):
+    path = tmp_path / "run.cassette"
+    assert record(path, [URL, URL, URL + "&page=2"]) == 3
+    store, bodies = replay_bodies(path, [URL, URL + "&page=2", URL])
+    assert bodies == ["page 1", "page 3", "page 2"]
+    assert (store.replayed, store.repeated, store.missed) == (3, 0, 0)
+    store.close()
+
+
+def test_last_response_is_repeated_beyond_recorded_count(tmp_path):
+    path = tmp_path / "run.cassette"
+    record(path, [URL, URL])
+    store, bodies = replay_bodies(path, [URL, URL, URL, URL])
+    assert bodies == ["page 1", "page 2", "page 2", "page 2"]
+    assert (store.replayed, store.repeated) == (4, 2)
+    store.close()
+
+
+def test_recorded_headers_drop_content_encoding(tmp_path):
+    path = tmp_path / "run.cassette"
+    record(path, [URL])
+    with Cassette(path) as store:
+        store.open_replay()
+        recorded = store.replay('GET', URL)
+    assert recorded.headers == {'Content-Type': 'text/html; charset=utf-8'}
+    assert recorded.url == URL and recorded.body == b"page 1"
+
+
+def test_replay_miss_is_a_connection_error(tmp_path):
+    path = tmp_path / "run.cassette"
+    record(path, [URL])
+    with Cassette(path) as store:
+        store.open_replay()
+        session = transport.ClientSessionWrapper(FakeSession(), store)
+
+        async def get(url):
+            return await session.get(url)  # attendue directement, sans `async with`
+
+        with pytest.raises(aiohttp.ClientConnectionError):
+            asyncio.run(get(URL + "&page=9"))
+
+        http = transport.install(requests.Session(), store)
+        with pytest.raises(transport.ReplayMiss):
+            http.get(URL + "&page=9")
+        assert http.get(URL).text == "page 1"
+        assert store.missed == 2
+
+
+def test_missing_cassette_cannot_be_replayed(tmp_path):
+    with pytest.raises(FileNotFoundError):
+        Cassette(tmp_path / "absente.cassette").open_replay()
@@ -0,0 +1,57 @@
+"""Catalogue local: matching hors ligne et mise à jour en mémoire (catalog.Catalog)."""
+
+import cache
+import catalog
+
+
+def entries(*products):
+    return [(url, name, None, cnk, price) for url, name, cnk, price in products]
+
+
+SORBET_40 = ("https://example.test/sorbet-40", "Caudalie Vinosource Crème Sorbet 40ml", None, 20.5)
+SORBET_50 = ("https://example.test/sorbet-50", "Caudalie Vinosource Crème Sorbet 50ml", None, 26.9)
+SERUM = ("https://example.test/serum-30", "Caudalie Vinoperfect Sérum Éclat 30ml", "4001234", 39.9)
+
+
+def test_known_cnk_matches_directly():
+    local = catalog.Catalog("newpharma", entries(SORBET_40, SERUM))
+    assert local.match("4001234", []) == (100.0, local.entries[1])
+
+
+def test_quantity_spacing_does_not_matter():
+    local = catalog.Catalog("newpharma", entries(SORBET_40, SERUM))
+    score, entry = local.match("1", ["Caudalie Vinosource creme sorbet 40 ml"])
+    assert score == 100 and entry.url == SORBET_40[0]
+
+
+def test_two_pack_sizes_without_margin_are_rejected():
+    local = catalog.Catalog("newpharma", entries(SORBET_40, SORBET_50))
+    assert local.match("1", ["Caudalie Vinosource Crème Sorbet"]) is None
+
+
+def test_stored_tokens_are_used_as_loaded(tmp_path):
+    urls = cache.ProductUrls("newpharma")
+    urls.observe(SORBET_40[1], SORBET_40[0], SORBET_40[3])
+    with cache.ProductCatalog(tmp_path / "cache.sqlite3") as store:
+        store.save(urls, catalog.tokens)
+        rows = store.load("newpharma")
+    assert rows == [(SORBET_40[0], SORBET_40[1], "caudalie vinosource creme sorbet 40ml", None, 20.5)]
+    local = catalog.Catalog("newpharma", rows)
+    assert local.normalized == ["caudalie vinosource creme sorbet 40ml"]
+
+
+def test_apply_keeps_the_catalog_in_step_with_a_saved_batch():
+    local = catalog.Catalog("newpharma", entries(SORBET_40, SERUM))
+    urls = cache.ProductUrls("newpharma", {"4001234": (SERUM[0], SERUM[1])})
+    urls.observe(SORBET_50[1], SORBET_50[0], SORBET_50[3])
+    urls.resolve("2", SORBET_40[0], SORBET_40[1])
+    urls.invalidate("4001234", gone=True)
+
+    local.apply(urls)
+
+    assert len(local) == 2
+    assert local.match("2", []) == (100.0, local.entries[0])
+    assert local.match("4001234", []) is None
+    assert local.match("9", ["Caudalie Vinoperfect Sérum Éclat 30ml"]) is None
+    score, entry = local.match("3", ["Caudalie Vinosource Crème Sorbet 50ml"])
+    assert entry.url == SORBET_50[0] and entry.price == 26.9
@@ -0,0 +1,72 @@
+"""API embarquable (comparer.PriceComparer) avec un scraping simulé, sans réseau."""
+
+import asyncio
+
+import pytest
+
+import comparer
+import events
+import scraper
+from comparer import PriceComparer
+from results import ResultTable
+
+SITES = ('medi_market', 'multipharma')
+
+# Prix simulés par site; le CNK '2' n'a pas de réponse Multipharma (jamais de lookup)
+PRICES = {'medi_market': {'1': 10.0, '2': 7.5}, 'multipharma': {'1': 12.0}}
+
+
+@pytest.fixture
+def scrape_calls(monkeypatch):
+    calls = []
+
+    def fake_scrape_sites(cnk_list, product_names, sites=scraper.SITES, medi_names=None):
+        calls.append((list(cnk_list), scraper.OUTPUT_SETTINGS['quiet']))
+        scraper.log("progression masquée en mode quiet")
+        table = ResultTable(cnk_list)
+        for site in sites:
+            prices = {cnk: price for cnk, price in PRICES[site].items() if cnk in cnk_list}
+            table.set_site(site, prices)
+            for cnk, price in prices.items():
+                events.emit_lookup(site, cnk, price)
+        return table
+
+    monkeypatch.setattr(scraper, "scrape_sites", fake_scrape_sites)
+    monkeypatch.setattr(events, "_STREAM", None)
+    monkeypatch.setattr(events, "_LISTENERS", [])
+    return calls
+
+
+def test_compare_scrapes_quietly_then_uses_the_cache(scrape_calls, capsys):
+    price_comparer = PriceComparer(sites=SITES)
+    first = price_comparer.compare(['1', '2', '1'], base_prices={'1': '8,00'})
+    assert [result.cnk for result in first] == ['1', '2']
+    assert first[0].prices == {'medi_market': 10.0, 'multipharma': 12.0}
+    assert first[0].stats['Prix Min'] == 10.0 and first[0].stats['Écart Base'] == 0.375
+    assert first[1].prices == {'medi_market': 7.5, 'multipharma': None}
+
+    assert price_comparer.compare(['2']) == [first[1]]
+    assert scrape_calls == [(['1', '2'], True)]
+    assert capsys.readouterr().out == ''
+    assert scraper.OUTPUT_SETTINGS['quiet'] is False
+
+
+def test_verbose_comparer_keeps_scraper_output(scrape_calls, capsys):
+    PriceComparer(sites=SITES, cache_ttl=0, quiet=False).compare(['1'])
+    assert scrape_calls == [(['1'], False)]
+    assert "progression masquée" in capsys.readouterr().out
+
+
+def test_stream_yields_cached_then_complete_cnks(scrape_calls):
+    price_comparer = PriceComparer(sites=SITES)
+    price_comparer.compare(['2'])
+
+    async def collect():
+        return [result async for result in price_comparer.stream(['2', '1', '3'], names={'1': 'Dafalgan 1g'})]
+
+    results = asyncio.run(collect())
+    assert [result.cnk for result in results] == ['2', '1', '3']
+    assert results[1].name == 'Dafalgan 1g' and results[1].stats['Prix Moyen'] == 11.0
+    assert results[2].prices == {'medi_market': None, 'multipharma': None}
+    assert [cnks for cnks, _ in scrape_calls] == [['2'], ['1', '3']]
+    assert events._LISTENERS == [] and not comparer._SCRAPE_LOCK.locked()
@@ -0,0 +1,22 @@
+"""Daemon: noms Medi-Market transmis aux lots des sites à recherche par nom."""
+
+import scraper
+from results import ResultTable
+
+
+def test_name_search_batches_get_medi_market_names(monkeypatch):
+    calls = []
+
+    def fake_scrape(cnk_list, product_names, sites, medi_names=None):
+        calls.append((tuple(sites), dict(medi_names or {})))
+        table = ResultTable(cnk_list)
+        if 'medi_market' in sites:
+            table.set_names({'1': 'Dafalgan 1g'})
+        return table
+
+    monkeypatch.setattr(scraper, "scrape_sites", fake_scrape)
+    monkeypatch.setattr(scraper, "known_medi_names", lambda cnks: {'2': 'Nurofen 400'} if '2' in cnks else {})
+    scrape = scraper.daemon_scraper()
+    scrape(['1'], {}, ('medi_market',))
+    scrape(['1', '2', '3'], {}, ('newpharma',))
+    assert calls[-1] == (('newpharma',), {'1': 'Dafalgan 1g', '2': 'Nurofen 400'})
@@ -0,0 +1,51 @@
+"""Flux d'événements NDJSON (--jsonl) et abonnés in-process (events)."""
+
+import io
+import json
+
+import events
+from results import ResultTable, compute_price_stats
+
+
+def read(buffer):
+    return [json.loads(line) for line in buffer.getvalue().splitlines()]
+
+
+def test_stream_has_one_row_per_input_line(monkeypatch):
+    monkeypatch.setattr(events, "_STREAM", None)
+    buffer = io.StringIO()
+    events.open_stream(buffer, mode='csv', label='grid.csv')
+    events.emit_lookup('medi_market', '1', 10.0)
+    events.emit_lookup('medi_market', '2', float('nan'))
+
+    table = ResultTable(['1', '2'], sites=('medi_market',))
+    table.set_site('medi_market', {'1': 10.0})
+    compute_price_stats(table)
+    events.emit_rows(table, [('Dafalgan 1g', '1', '8,00'), ('Dafalgan (bis)', '1', '10,00'), ('Inconnu', '3', '')])
+    events.close_stream()
+
+    start, found, missing, first, second, end = read(buffer)
+    assert (start['event'], start['mode'], start['label']) == ('start', 'csv', 'grid.csv')
+    assert (found['found'], found['prix']) == (True, 10.0)
+    assert (missing['found'], missing['prix']) == (False, None)
+    assert (first['nom_produit'], first['prix_base'], second['prix_base']) == ('Dafalgan 1g', 8.0, 10.0)
+    assert first['prix'] == {'medi_market': 10.0} and first['prix_min'] == 10.0
+    assert (end['event'], end['lookups'], end['rows']) == ('end', 2, 2)
+    assert events._STREAM is None
+
+
+def test_listeners_receive_lookups_without_stream(monkeypatch):
+    monkeypatch.setattr(events, "_STREAM", None)
+    monkeypatch.setattr(events, "_LISTENERS", [])
+    received = []
+
+    def failing(*args):
+        raise RuntimeError("abonné en panne")
+
+    for callback in (failing, lambda *args: received.append(args)):
+        events.add_listener(callback)
+    events.emit_lookup('multipharma', '1', 5.49, 97.0, 'MediMarket')
+    events.remove_listener(failing)
+    events.emit_lookup('multipharma', '2')
+    assert len(events._LISTENERS) == 1
+    assert received == [('multipharma', '1', 5.49, 97.0, 'MediMarket'), ('multipharma', '2', None, None, None)]
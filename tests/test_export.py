@@ -0,0 +1,36 @@
+"""Export Parquet typé (export.ParquetResultWriter), une ligne par CNK × site scrapé."""
+
+import pytest
+
+pa = pytest.importorskip("pyarrow")
+import pyarrow.parquet as pq
+
+from export import ParquetResultWriter
+from results import ResultTable
+
+
+def test_parquet_columns_are_typed(tmp_path):
+    table = ResultTable(['1', '2'])
+    table.set_site('medi_market', {'1': 4.99})
+    table.set_site('multipharma', {'1': 5.49, '2': '6,10'}, scores={'1': 97.0}, sources={'1': 'MediMarket'})
+    table.set_base_prices({'2': '6,00'})
+    path = tmp_path / "resultats.parquet"
+    with ParquetResultWriter(path) as writer:
+        assert writer.write_table(table, {'1': 'Dafalgan 1g'}) == 4
+        assert writer.write_table(ResultTable([])) == 0
+
+    written = pq.read_table(path)
+    assert written.num_rows == 4
+    for column in ('prix', 'score', 'prix_base'):
+        assert written.schema.field(column).type == pa.float64()
+    for column in ('site', 'source'):
+        assert pa.types.is_dictionary(written.schema.field(column).type)
+
+    rows = written.to_pylist()
+    assert [(row['cnk'], row['site'], row['prix']) for row in rows] == [
+        ('1', 'medi_market', 4.99), ('1', 'multipharma', 5.49),
+        ('2', 'medi_market', None), ('2', 'multipharma', 6.10),
+    ]
+    assert rows[0]['nom_produit'] == 'Dafalgan 1g' and rows[1]['score'] == 97.0
+    assert (rows[0]['source'], rows[1]['source']) == ('', 'MediMarket')
+    assert rows[0]['prix_base'] is None and rows[3]['prix_base'] == 6.0
@@ -0,0 +1,39 @@
+"""Identifiants des produits JSON-LD comparés au CNK (extract.StructuredProduct.mentions)."""
+
+import json
+
+import extract
+
+
+def page(*products) -> bytes:
+    blocks = "".join(
+        f'<script type="application/ld+json">{json.dumps(product)}</script>' for product in products
+    )
+    return f"<html><head>{blocks}</head><body></body></html>".encode()
+
+
+def product(**ids):
+    return {"@type": "Product", "name": "Dafalgan 1g", "offers": {"price": "4.99"}, **ids}
+
+
+def test_gtin_containing_the_cnk_is_not_a_match():
+    [found] = extract.json_ld_products(page(product(gtin13="5413001234567")))
+    assert not found.mentions("3001234")
+
+
+def test_codes_compared_whole_with_leading_zeros():
+    [found] = extract.json_ld_products(page(product(sku="03001234")))
+    assert found.mentions("3001234")
+    assert not found.mentions("300123")
+
+
+def test_url_matches_the_be0_segment_only():
+    [found] = extract.json_ld_products(page(product(url="https://medi-market.be/fr/dafalgan-BE03001234")))
+    assert found.mentions("3001234")
+    [longer] = extract.json_ld_products(page(product(url="https://medi-market.be/fr/dafalgan-BE030012345")))
+    assert not longer.mentions("3001234")
+
+
+def test_search_page_returns_the_product_carrying_the_cnk():
+    body = page(product(gtin13="5413001234567", name="Autre"), product(sku="3001234"))
+    assert [p.name for p in extract.json_ld_products(body) if p.mentions("3001234")] == ["Dafalgan 1g"]
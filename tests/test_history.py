@@ -0,0 +1,64 @@
+"""Historique des prix: détection des changements et fusion de shards (history.HistoryStore)."""
+
+import math
+
+from history import HistoryStore
+
+NAN = math.nan
+
+
+def record(store, *observations, mode='csv'):
+    run_id = store.start_run(mode)
+    return run_id, store.record_observations(run_id, observations)
+
+
+def test_only_changes_are_written(tmp_path):
+    with HistoryStore(tmp_path / "history.sqlite3") as store:
+        _, counts = record(store, ('1', 'medi_market', 4.99, 100.0), ('2', 'medi_market', NAN, NAN))
+        assert counts == (1, 0)
+
+        _, counts = record(store, ('1', 'medi_market', 4.991, 100.0), ('2', 'medi_market', NAN, NAN))
+        assert counts == (0, 1)
+
+        run_id, counts = record(store, ('1', 'medi_market', 5.49, 100.0))
+        assert counts == (1, 0)
+        [change] = store.changes_since_last_run()
+        assert (change.cnk, change.old_price, change.new_price) == ('1', 4.99, 5.49)
+
+        # Produit disparu: enregistré (prix NULL)
+        _, counts = record(store, ('1', 'medi_market', NAN, NAN))
+        assert counts == (1, 0)
+        assert store.latest_for('1')['medi_market'][0] is None
+
+
+def test_never_found_keeps_its_last_check(tmp_path):
+    with HistoryStore(tmp_path / "history.sqlite3") as store:
+        record(store, ('2', 'farmaline', NAN, NAN))
+        record(store, ('2', 'farmaline', NAN, NAN))
+        assert store.conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0] == 0
+        checked_at, count, _ = store.refresh_state(['2'])[('2', 'farmaline')]
+        assert count == 0 and store.latest_for('2') == {'farmaline': (None, None, checked_at)}
+
+        record(store, ('2', 'farmaline', 7.5, 100.0))
+        assert store.latest_for('2')['farmaline'][0] == 7.5
+        assert store.conn.execute("SELECT COUNT(*) FROM misses").fetchone()[0] == 0
+
+
+def test_merge_keeps_the_most_recent_state(tmp_path):
+    with HistoryStore(tmp_path / "a.sqlite3") as a, HistoryStore(tmp_path / "b.sqlite3") as b:
+        record(a, ('1', 'medi_market', 4.99, 100.0), ('3', 'medi_market', NAN, NAN))
+        record(b, ('1', 'medi_market', 3.99, 100.0), ('2', 'multipharma', 12.0, 91.0),
+               ('3', 'medi_market', 6.0, 100.0))
+        # Dans b: '1' observé avant a, '3' trouvé après la vérification sans résultat de a
+        for table in ('observations', 'latest'):
+            b.conn.execute(f"UPDATE {table} SET observed_at = '2000-01-01T00:00:00' WHERE cnk = '1'")
+            b.conn.execute(f"UPDATE {table} SET observed_at = '2999-01-01T00:00:00' WHERE cnk = '3'")
+        b.conn.commit()
+
+        assert a.merge_from(b.path) == (1, 3)
+
+        assert a.latest_for('1')['medi_market'][0] == 4.99
+        assert a.latest_for('2')['multipharma'][:2] == (12.0, 91.0)
+        assert a.latest_for('3')['medi_market'][0] == 6.0
+        assert a.conn.execute("SELECT COUNT(*) FROM misses").fetchone()[0] == 0
+        assert a.conn.execute("SELECT COUNT(*) FROM observations").fetchone()[0] == 4
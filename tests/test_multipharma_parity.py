@@ -0,0 +1,104 @@
+"""
+Parité des endpoints légers Multipharma (fragment de grille, JSON produit) avec les
+pages complètes (Search-Show, page produit): mêmes prix et mêmes pages produit, rejoués
+hors ligne depuis une cassette construite à partir des réponses enregistrées.
+"""
+
+from pathlib import Path
+from urllib.parse import quote_plus
+
+import pytest
+
+import cache
+import cassette
+import scraper
+from transport import Recorded
+
+
+FIXTURES = Path(__file__).parent / "fixtures" / "multipharma"
+
+CNK = "4862482"
+NAME = "Caudalie Vinosource-Hydra Crème Sorbet Hydratante 40ml"
+SLUG = "caudalie-vinosource-hydra-creme-sorbet-hydratante-40ml-1003487"
+PRODUCT_URL = f"https://www.multipharma.be/fr/{SLUG}.html"
+
+STORE_URL = "https://www.multipharma.be/on/demandware.store/Sites-Multipharma-Webshop-BE-Site/fr_BE"
+GRID_URL = f"{STORE_URL}/Search-UpdateGrid?start=0&sz=3&q={quote_plus(NAME)}"
+SEARCH_URL = f"{STORE_URL}/Search-Show?q={quote_plus(NAME)}"
+JSON_URL = f"{STORE_URL}/Product-Variation?quantity=1&pid={SLUG}"
+
+HTML = "text/html; charset=utf-8"
+JSON = "application/json; charset=utf-8"
+
+
+def fixture(name: str) -> bytes:
+    return (FIXTURES / name).read_bytes()
+
+
+@pytest.fixture
+def replay(tmp_path, monkeypatch):
+    """Rejoue les échanges donnés ((url, statut, fichier, type)) pour les scrapers."""
+    monkeypatch.setitem(scraper.PACING_SETTINGS, 'enabled', False)
+
+    def install(exchanges):
+        store = cassette.Cassette(tmp_path / f"multipharma_{len(list(tmp_path.iterdir()))}.cassette")
+        store.record_to("fixtures")
+        for url, status, name, content_type in exchanges:
+            body = fixture(name) if name else b""
+            store.record("GET", url, Recorded(status, url, {"Content-Type": content_type}, body))
+        store.open_replay()
+        monkeypatch.setattr(scraper, "_HTTP_STORE", store)
+        return store
+
+    return install
+
+
+def run(urls=None):
+    urls = urls if urls is not None else cache.ProductUrls('multipharma')
+    prices, scores, _ = scraper.scrape_multipharma([CNK], {CNK: NAME}, {}, urls=urls)
+    return prices, scores, urls
+
+
+def test_grid_fragment_matches_search_page(replay):
+    replay([(GRID_URL, 200, "grid.html", HTML)])
+    grid_prices, grid_scores, grid_urls = run()
+
+    # Fragment refusé: repli sur la page Search-Show complète
+    store = replay([(GRID_URL, 404, None, HTML), (SEARCH_URL, 200, "search.html", HTML)])
+    page_prices, page_scores, page_urls = run()
+
+    assert store.missed == 0
+    assert float(grid_prices[CNK]) == float(page_prices[CNK]) == 20.5
+    assert grid_scores[CNK] == page_scores[CNK] == 100
+    assert grid_urls.resolved[CNK][0] == page_urls.resolved[CNK][0] == PRODUCT_URL
+
+
+def test_product_json_matches_product_page(replay):
+    known = {CNK: (PRODUCT_URL, NAME)}
+
+    store = replay([(JSON_URL, 200, "product.json", JSON)])
+    json_prices, json_scores, _ = run(cache.ProductUrls('multipharma', known))
+    assert store.replayed == 1  # JSON seul, pas de page produit
+
+    # JSON refusé: lecture de la page produit complète
+    replay([(JSON_URL, 404, None, JSON), (PRODUCT_URL, 200, "product.html", HTML)])
+    page_prices, page_scores, urls = run(cache.ProductUrls('multipharma', known))
+
+    assert float(json_prices[CNK]) == float(page_prices[CNK]) == 20.5
+    assert json_scores[CNK] == page_scores[CNK] == 100
+    assert urls.direct_hits == 1 and not urls.stale
+
+
+def test_product_json_disabled_after_repeated_4xx(replay):
+    cnks = [f"48624{i:02d}" for i in range(40)]
+    known = {cnk: (PRODUCT_URL, NAME) for cnk in cnks}
+    store = replay([(JSON_URL, 404, None, JSON), (PRODUCT_URL, 200, "product.html", HTML)])
+
+    prices, _, _ = scraper.scrape_multipharma(
+        cnks, {cnk: NAME for cnk in cnks}, {}, urls=cache.ProductUrls('multipharma', known)
+    )
+
+    assert all(float(prices[cnk]) == 20.5 for cnk in cnks)
+    # JSON_MAX_FAILURES (3) refus, plus les requêtes déjà en vol (fenêtre initiale)
+    json_requests = store.replayed - len(cnks)
+    assert 3 <= json_requests <= 3 + scraper.shard_workers(10)
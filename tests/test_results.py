@@ -0,0 +1,67 @@
+"""Statistiques de prix vectorisées sur la table CNK × site (results.compute_price_stats)."""
+
+import math
+
+from results import ResultTable, compute_price_stats
+
+
+def table_with(prices, base_prices=None):
+    """Table dont chaque site reçoit ses prix {cnk: prix} (sites absents = non trouvés)."""
+    cnks = sorted({cnk for site_prices in prices.values() for cnk in site_prices} | set(base_prices or {}))
+    table = ResultTable(cnks)
+    for site, site_prices in prices.items():
+        table.set_site(site, site_prices)
+    table.set_base_prices(base_prices or {})
+    compute_price_stats(table)
+    return table
+
+
+def row(table, cnk):
+    i = table.index[cnk]
+    return {column: values[i] for column, values in table.stats.items()}
+
+
+def test_median_of_an_even_count_is_the_middle_average():
+    table = table_with({
+        'medi_market': {'1': 10.0},
+        'farmaline': {'1': 14.0},
+        'newpharma': {'1': 11.0},
+        'multipharma': {'1': 20.0},
+    })
+    stats = row(table, '1')
+    assert stats['Prix Médian'] == 12.5
+    assert stats['Prix Moyen'] == 13.75
+    assert stats['Prix Min'] == 10.0 and stats['Écart Prix'] == 10.0
+
+
+def test_missing_prices_are_ignored():
+    table = table_with({
+        'medi_market': {'1': 'NA', '2': '9,90'},
+        'farmaline': {'1': 12.0},
+        'multipharma': {'1': 8.0, '2': ''},
+    })
+    one, two = row(table, '1'), row(table, '2')
+    assert (one['Prix Moyen'], one['Prix Médian'], one['Prix Min']) == (10.0, 10.0, 8.0)
+    assert one['Site Moins Cher'] == 'Multipharma'
+    assert (two['Prix Moyen'], two['Prix Médian'], two['Écart Prix']) == (9.9, 9.9, 0.0)
+    assert two['Site Moins Cher'] == 'MediMarket'
+
+
+def test_cnk_without_any_price():
+    table = table_with({'medi_market': {'1': 5.0}}, base_prices={'2': '4.00'})
+    stats = row(table, '2')
+    assert all(math.isnan(stats[column]) for column in ('Prix Moyen', 'Prix Min', 'Prix Médian', 'Écart Prix', 'Écart Base'))
+    assert stats['Site Moins Cher'] == ''
+
+
+def test_base_gap_is_a_fraction_of_the_base_price():
+    table = table_with({'medi_market': {'1': 11.0}, 'farmaline': {'1': 9.0}}, base_prices={'1': '8,00'})
+    assert row(table, '1')['Écart Base'] == 0.25
+
+
+def test_base_gap_follows_each_target_base_prices():
+    table = table_with({'medi_market': {'1': 10.0, '2': 10.0}}, base_prices={'1': '8,00', '2': '5,00'})
+    table.set_base_prices({'1': '10,00'}, replace=True)
+    compute_price_stats(table)
+    assert row(table, '1')['Écart Base'] == 0.0
+    assert math.isnan(row(table, '2')['Écart Base'])
@@ -0,0 +1,72 @@
+"""Partition --shard i/N et fusion des sorties des shards (shard.py)."""
+
+import json
+
+import pytest
+
+import shard
+
+
+GRID = [("Dafalgan 1g", "1234567", "4,99"), ("Sorbet", "7654321", ""), ("Dafalgan 1g x2", "1234567", "9,50")]
+HEADER = ["Nom", "CNK", "Prix_Base", "Prix_MediMarket"]
+
+
+def test_each_cnk_is_in_exactly_one_shard():
+    cnks = [f"{n:07d}" for n in range(0, 5000, 7)]
+    for cnk in cnks:
+        assert sum(shard.in_shard(cnk, index, 4) for index in range(4)) == 1
+    assert all(shard.in_shard(cnk, 0, 1) for cnk in cnks)
+    assert shard.shard_of(" 1234567 ", 8) == shard.shard_of("1234567", 8)
+
+
+def test_parse_shard():
+    assert shard.parse_shard("2/8") == (1, 8)
+    for value in ("0/4", "5/4", "1/0", "x"):
+        with pytest.raises(ValueError):
+            shard.parse_shard(value)
+
+
+def write_csv(path, rows):
+    path.write_text("\n".join(";".join(row) for row in [HEADER] + rows) + "\n", encoding="utf-8")
+    return str(path)
+
+
+def test_merge_csv_restores_grid_order_and_duplicates(tmp_path):
+    first = write_csv(tmp_path / "shard_1.csv", [["Dafalgan 1g", "1234567", "4,99", "4,50"],
+                                                 ["Dafalgan 1g x2", "1234567", "9,50", "4,50"]])
+    second = write_csv(tmp_path / "shard_2.csv", [])
+    output = tmp_path / "merged.csv"
+
+    assert shard.merge_csv(GRID, [second, first], str(output)) == (3, 1)
+
+    lines = output.read_text(encoding="utf-8").splitlines()
+    assert lines == [
+        ";".join(HEADER),
+        "Dafalgan 1g;1234567;4,99;4,50",
+        "Sorbet;7654321;;",
+        "Dafalgan 1g x2;1234567;9,50;4,50",
+    ]
+
+
+def test_merge_csv_rejects_different_headers(tmp_path):
+    first = write_csv(tmp_path / "shard_1.csv", [])
+    (tmp_path / "shard_2.csv").write_text("Nom;CNK\n", encoding="utf-8")
+    with pytest.raises(ValueError):
+        shard.merge_csv(GRID, [first, str(tmp_path / "shard_2.csv")], str(tmp_path / "merged.csv"))
+
+
+def test_merge_jsonl_keeps_one_row_per_grid_line(tmp_path):
+    events = [
+        {"event": "start", "mode": "csv"},
+        {"event": "row", "cnk": "1234567", "nom_produit": "Dafalgan 1g"},
+        {"event": "lookup", "cnk": "1234567", "site": "medi_market"},
+        {"event": "row", "cnk": "1234567", "nom_produit": "Dafalgan 1g x2"},
+    ]
+    path = tmp_path / "shard_1.jsonl"
+    path.write_text("\n".join(json.dumps(event) for event in events) + "\n", encoding="utf-8")
+    output = tmp_path / "merged.jsonl"
+
+    assert shard.merge_jsonl(GRID, [str(path)], str(output)) == (2, 1)
+
+    names = [json.loads(line)["nom_produit"] for line in output.read_text(encoding="utf-8").splitlines()]
+    assert names == ["Dafalgan 1g", "Dafalgan 1g x2"]
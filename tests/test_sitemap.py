@@ -0,0 +1,83 @@
+"""Lecture en flux des sitemaps et paires (CNK, URL) du catalogue (sitemap.py)."""
+
+import gzip
+import io
+
+import sitemap
+
+
+NS = 'xmlns="http://www.sitemaps.org/schemas/sitemap/0.9"'
+
+
+def urlset(*locs):
+    entries = "".join(f"<url><loc> {loc} </loc><lastmod>2026-01-01</lastmod></url>" for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><urlset {NS}>{entries}</urlset>'.encode()
+
+
+def index(*locs):
+    entries = "".join(f"<sitemap><loc>{loc}</loc></sitemap>" for loc in locs)
+    return f'<?xml version="1.0" encoding="UTF-8"?><sitemapindex {NS}>{entries}</sitemapindex>'.encode()
+
+
+class Response:
+    def __init__(self, body: bytes, status: int = 200):
+        self.raw = io.BytesIO(body)
+        self.status_code = status
+        self.headers = {}
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise OSError(f"HTTP {self.status_code}")
+
+    def close(self):
+        pass
+
+
+class Session:
+    def __init__(self, pages):
+        self.pages = pages
+        self.requested = []
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        self.requested.append(url)
+        body, status = self.pages.get(url, (b"", 404))
+        return Response(body, status)
+
+
+def test_iter_sitemap_reads_both_kinds():
+    assert list(sitemap.iter_sitemap(io.BytesIO(urlset("https://a.test/fr/x-BE01234567")))) == [
+        ('url', "https://a.test/fr/x-BE01234567"),
+    ]
+    assert list(sitemap.iter_sitemap(io.BytesIO(index("https://a.test/1.xml", "https://a.test/2.xml.gz")))) == [
+        ('sitemap', "https://a.test/1.xml"), ('sitemap', "https://a.test/2.xml.gz"),
+    ]
+
+
+def test_cnk_from_url_needs_a_full_segment():
+    assert sitemap.cnk_from_url("https://a.test/fr/dafalgan-BE01234567.html") == "1234567"
+    assert sitemap.cnk_from_url("https://a.test/fr/dafalgan-BE012345678") is None
+
+
+def test_catalog_follows_children_in_order_and_skips_unreadable_ones():
+    session = Session({
+        "https://a.test/sitemap.xml": (index("https://a.test/p1.xml.gz", "https://a.test/broken.xml",
+                                             "https://a.test/p2.xml"), 200),
+        "https://a.test/p1.xml.gz": (gzip.compress(urlset(
+            "https://a.test/fr/dafalgan-BE01234567",
+            "https://a.test/nl/dafalgan-BE01234567",
+            "https://a.test/fr/categorie/sante",
+        )), 200),
+        "https://a.test/p2.xml": (urlset(
+            "https://a.test/fr/dafalgan-forte-BE01234567",
+            "https://a.test/fr/sorbet-BE07654321",
+        ), 200),
+    })
+    files = []
+
+    pairs = list(sitemap.iter_catalog(session, ["https://a.test/sitemap.xml"], on_file=files.append))
+
+    assert pairs == [("1234567", "https://a.test/fr/dafalgan-BE01234567"),
+                     ("7654321", "https://a.test/fr/sorbet-BE07654321")]
+    assert session.requested == ["https://a.test/sitemap.xml", "https://a.test/p1.xml.gz",
+                                 "https://a.test/broken.xml", "https://a.test/p2.xml"]
+    assert files[2].startswith("https://a.test/broken.xml: ")
@@ -0,0 +1,44 @@
+"""Masque des raisons de vérification par (CNK, site) (validation.flag_for_review)."""
+
+from results import ResultTable
+import validation
+from validation import REASON_BASE, REASON_LOW_SCORE, REASON_MEDIAN
+
+
+def flags(table):
+    reasons = validation.flag_for_review(table)
+    return {
+        (entry.cnk, entry.site): entry.reasons
+        for entry in validation.review_entries(table, reasons)
+    }
+
+
+def test_outlier_low_score_and_base_gap_combine_in_one_mask():
+    table = ResultTable(['1'])
+    table.set_site('medi_market', {'1': 10.0})
+    table.set_site('farmaline', {'1': 10.5})
+    table.set_site('multipharma', {'1': 25.0}, {'1': 55.0})
+    table.set_base_prices({'1': '10,00'})
+
+    assert flags(table) == {('1', 'multipharma'): REASON_LOW_SCORE | REASON_MEDIAN | REASON_BASE}
+
+
+def test_single_site_is_never_a_median_outlier():
+    table = ResultTable(['1'])
+    table.set_site('medi_market', {'1': 30.0})
+    table.set_base_prices({'1': '10'})
+
+    assert flags(table) == {('1', 'medi_market'): REASON_BASE}
+
+
+def test_cnk_searches_and_missing_prices_are_not_flagged():
+    table = ResultTable(['1', '2'])
+    table.set_site('medi_market', {'1': 10.0, '2': 'NA'})
+    table.set_site('multipharma', {'1': 11.0, '2': 12.0}, {'1': 92.0, '2': 88.0})
+
+    assert flags(table) == {}
+
+
+def test_reason_labels():
+    assert validation.describe_reasons(REASON_LOW_SCORE | REASON_BASE) == "score faible, écart Prix_Base"
+    assert validation.describe_reasons(0) == ""
@@ -0,0 +1,82 @@
+"""File de travail SQLite: baux, reprise et dépendances (workqueue.WorkQueue)."""
+
+import socket
+import subprocess
+import sys
+import time
+
+import workqueue
+from workqueue import WorkQueue
+
+
+BUDGETS = {site: 6000.0 for site in workqueue.QUEUE_RATE_BUDGETS}
+
+
+def queue_with(tmp_path, cnks, sites=('medi_market',)):
+    queue = WorkQueue(tmp_path / "queue.sqlite3")
+    queue.load(cnks, {}, sites, budgets=BUDGETS)
+    return queue
+
+
+def dead_owner():
+    proc = subprocess.Popen([sys.executable, "-c", "pass"])
+    proc.wait()
+    return f"worker-1@{socket.gethostname()}:{proc.pid}"
+
+
+def test_expired_lease_is_claimed_again(tmp_path):
+    with queue_with(tmp_path, ['1', '2']) as queue:
+        owner = workqueue.lease_owner('worker-1')
+        assert queue.claim(owner, lease_seconds=0.01)[1] == [('1', '', ''), ('2', '', '')]
+        assert queue.claim(owner) is None
+        time.sleep(0.05)
+        site, tasks = queue.claim(workqueue.lease_owner('worker-2'))
+        assert site == 'medi_market' and len(tasks) == 2
+
+
+def test_task_fails_after_max_attempts(tmp_path):
+    with queue_with(tmp_path, ['1']) as queue:
+        for _ in range(workqueue.MAX_ATTEMPTS):
+            assert queue.claim('worker-1', lease_seconds=0.01) is not None
+            time.sleep(0.05)
+        assert queue.claim('worker-1') is None
+        assert queue.counts()['failed'] == 1 and queue.remaining() == 0
+
+
+def test_dead_worker_lease_is_reclaimed_at_once(tmp_path):
+    with queue_with(tmp_path, ['1']) as queue:
+        assert queue.claim(dead_owner()) is not None
+        assert queue.claim(workqueue.lease_owner('worker-2')) is not None
+        assert queue.counts()['leased'] == 1
+
+
+def test_remote_or_live_owner_keeps_its_lease(tmp_path):
+    assert workqueue.owner_alive(workqueue.lease_owner('worker-1'))
+    assert workqueue.owner_alive('worker-1@autre-machine:1')
+    assert not workqueue.owner_alive(dead_owner())
+    with queue_with(tmp_path, ['1']) as queue:
+        assert queue.claim('worker-1@autre-machine:1') is not None
+        assert queue.claim('worker-2') is None
+
+
+def test_name_search_waits_for_medi_market(tmp_path):
+    with queue_with(tmp_path, ['1'], sites=('medi_market', 'multipharma')) as queue:
+        owner = workqueue.lease_owner('worker-1')
+        site, _ = queue.claim(owner)
+        assert site == 'medi_market' and queue.claim(owner) is None
+        queue.complete(owner, 'medi_market', [('1', 4.99, None, None, 'Dafalgan 1g')])
+        site, tasks = queue.claim(owner)
+        assert (site, tasks) == ('multipharma', [('1', '', 'Dafalgan 1g')])
+
+
+def test_name_search_without_medi_market_uses_loaded_names(tmp_path):
+    with WorkQueue(tmp_path / "queue.sqlite3") as queue:
+        queue.load(['1', '2'], {}, ('multipharma',), budgets=BUDGETS, medi_names={'1': 'Dafalgan 1g'})
+        site, tasks = queue.claim(workqueue.lease_owner('worker-1'))
+        assert (site, tasks) == ('multipharma', [('1', '', 'Dafalgan 1g'), ('2', '', '')])
+
+
+def test_each_shard_has_its_own_default_queue():
+    paths = {workqueue.shard_queue_path(index, 4) for index in range(4)}
+    assert len(paths) == 4 and workqueue.DEFAULT_QUEUE_PATH not in paths
+    assert workqueue.shard_queue_path(1, 4).name == "queue_shard_2_of_4.sqlite3"